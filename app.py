@@ -1,10 +1,11 @@
 import os
 import sqlite3
 import json
+import time
 from datetime import datetime
 from io import BytesIO
 from typing import Optional, Dict, Any
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context, g
 from werkzeug.utils import secure_filename
 
 # 使用硬编码的绝对路径避免编码问题
@@ -56,11 +57,16 @@ def init_db():
             jd_id INTEGER,
             result_type TEXT,
             result_data TEXT NOT NULL,
+            pending_enrichment INTEGER DEFAULT 0,
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (resume_id) REFERENCES resumes(id),
             FOREIGN KEY (jd_id) REFERENCES job_descriptions(id)
         )
     ''')
+    # 旧数据库补充列：本地规则结果等待AI补全
+    columns = {row[1] for row in cursor.execute('PRAGMA table_info(analysis_results)')}
+    if 'pending_enrichment' not in columns:
+        cursor.execute('ALTER TABLE analysis_results ADD COLUMN pending_enrichment INTEGER DEFAULT 0')
     
     # 用户表
     cursor.execute('''
@@ -122,9 +128,60 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
 from utils.file_parser import parse_resume, allowed_file, extract_skills, parse_resume_full, resume_to_dict
-from utils.analyzer import ResumeAnalyzer
+from utils.analyzer import ResumeAnalyzer, get_speculation_stats
+from utils.deadline import set_deadline, reset_deadline
+from utils.similarity import get_similarity_index, schedule_index
+from utils.usage_tracker import get_usage_tracker, current_user, set_current_user, reset_current_user, user_scope
+from utils.resume_summary import schedule_summary, remove_resume_summary
+from config import AI_WARMUP_ON_START, REQUEST_DEADLINE, REQUEST_DEADLINE_MARGIN, ANALYSIS_SLA_SECONDS
+from config import SIMILARITY_REUSE_ENABLED, ADMIN_USER_IDS, SPECULATIVE_ANALYSIS, RESUME_SUMMARY_ENABLED
+from config import METRICS_TOKEN
 analyzer = ResumeAnalyzer()
 
+# 后台预热AI连接池，不阻塞启动
+if AI_WARMUP_ON_START:
+    import threading
+    threading.Thread(target=analyzer.ai.warm_up, daemon=True).start()
+
+def no_request_deadline(view):
+    """不设置延迟预算的接口（如逐条推送结果的批量分析，总耗时随数量增长）"""
+    view.no_request_deadline = True
+    return view
+
+@app.before_request
+def apply_request_deadline():
+    """为API请求设置延迟预算，AI调用按剩余时间设置超时；客户端可用X-Request-Timeout请求头缩短"""
+    view = app.view_functions.get(request.endpoint)
+    if not request.path.startswith('/api/') or getattr(view, 'no_request_deadline', False):
+        return
+    budget = REQUEST_DEADLINE
+    try:
+        budget = min(budget, float(request.headers.get('X-Request-Timeout', budget)))
+    except ValueError:
+        pass
+    g.deadline_token = set_deadline(max(0.0, budget - REQUEST_DEADLINE_MARGIN))
+
+@app.teardown_request
+def clear_request_deadline(exc=None):
+    token = g.pop('deadline_token', None)
+    if token is not None:
+        reset_deadline(token)
+
+@app.before_request
+def apply_usage_user():
+    """带登录令牌的请求，期间的LLM用量记到该用户（未登录时记为匿名）"""
+    auth_header = request.headers.get('Authorization', '')
+    payload = decode_token(auth_header[7:]) if auth_header.startswith('Bearer ') else None
+    if payload:
+        g.usage_user_id = payload['user_id']
+        g.usage_user_token = set_current_user(payload['user_id'])
+
+@app.teardown_request
+def clear_usage_user(exc=None):
+    token = g.pop('usage_user_token', None)
+    if token is not None:
+        reset_current_user(token)
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -161,13 +218,22 @@ def upload_resume():
         conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute(
-            'INSERT INTO resumes (filename, file_type, raw_text, parsed_data, skills) VALUES (?, ?, ?, ?, ?)',
-            (filename, filename.rsplit('.', 1)[-1], raw_text, parsed_data_json, json.dumps(skills))
+            'INSERT INTO resumes (filename, file_type, raw_text, parsed_data, skills, user_id) VALUES (?, ?, ?, ?, ?, ?)',
+            (filename, filename.rsplit('.', 1)[-1], raw_text, parsed_data_json, json.dumps(skills), current_user())
         )
         resume_id = cursor.lastrowid
         conn.commit()
         conn.close()
         
+        # 用户上传后几乎都会马上点击分析，提前在后台开始；近似重复简历的结果可直接复用时不需要，
+        # 因此在后台建立相似度索引后再决定
+        speculative = SPECULATIVE_ANALYSIS and request.form.get('speculate', '1') != '0'
+        index_resume(resume_id, raw_text, speculative)
+        
+        # 匹配、面试题等后续任务使用的简历摘要，每份简历文本只生成一次
+        if RESUME_SUMMARY_ENABLED:
+            schedule_summary(raw_text)
+        
         return jsonify({
             'success': True,
             'data': {
@@ -175,21 +241,313 @@ def upload_resume():
                 'filename': filename,
                 'skills': skills,
                 'parsed_data': resume_dict,
-                'text_preview': raw_text[:500] + '...' if len(raw_text) > 500 else raw_text
+                'text_preview': raw_text[:500] + '...' if len(raw_text) > 500 else raw_text,
+                'speculative_analysis': speculative
             }
         })
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+def index_resume(resume_id: int, raw_text: str, speculate: bool = False):
+    """
+    在后台计算并保存简历的MinHash签名（CPU密集，不放在上传请求中）；
+    speculate为True时，当前用户没有可复用分析结果的近似重复简历才开始预先分析
+    """
+    future = schedule_index('resume', [resume_id], raw_text)
+    if not speculate:
+        return
+    user_id = current_user()
+    
+    def _speculate(done):
+        try:
+            with user_scope(user_id):
+                similar = find_similar_resume(resume_id, done.result())
+                if not (SIMILARITY_REUSE_ENABLED and similar and 'analyze' in similar['result_types']):
+                    analyzer.speculate(resume_id, raw_text)
+        except Exception as e:
+            print(f"Speculative analysis of resume {resume_id} failed to start: {e}")
+    
+    future.add_done_callback(_speculate)
+
+def find_similar_resume(resume_id: int, signature: list) -> Optional[dict]:
+    """
+    找出当前用户与该简历近似重复、已有分析结果的历史简历
+    
+    Returns:
+        最相似的历史简历信息，没有时返回None；未登录时不查找
+    """
+    user_id = current_user()
+    matches = get_similarity_index('resume').find(signature=signature, exclude={resume_id})
+    if user_id is None or not matches:
+        return None
+    
+    similarities = dict(matches)
+    placeholders = ','.join('?' * len(similarities))
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    # 只在同一用户的简历中查找，其他用户的简历ID和文件名不能返回给调用方
+    cursor.execute(
+        f'SELECT r.id, r.filename, GROUP_CONCAT(DISTINCT a.result_type) AS result_types '
+        f'FROM resumes r JOIN analysis_results a ON a.resume_id = r.id '
+        f'WHERE r.id IN ({placeholders}) AND r.user_id = ? GROUP BY r.id',
+        list(similarities) + [user_id]
+    )
+    rows = cursor.fetchall()
+    conn.close()
+    if not rows:
+        return None
+    
+    best = max(rows, key=lambda row: (similarities[row['id']], row['id']))
+    return {
+        'resume_id': best['id'],
+        'filename': best['filename'],
+        'similarity': round(similarities[best['id']], 3),
+        'result_types': sorted(best['result_types'].split(','))
+    }
+
+def find_reusable_result(task: str, resume_id: int, raw_text: str, jd_text: str = '') -> Optional[dict]:
+    """
+    查找当前用户近似重复的其他简历（及JD）已有的AI分析结果
+    
+    只处理analyze和match：面试题和自我介绍的结果没有记录所用的JD，无法判断是否可以复用。
+    跳过本地规则结果和待补全的结果；请求的简历本身不参与复用，重新分析时总会调用AI。
+    简历使用上传时在后台保存的签名，尚未建立索引时不复用
+    
+    Returns:
+        可复用的结果（带reused_from说明来源），没有时返回None；未登录时不复用
+    """
+    user_id = current_user()
+    if task not in ('analyze', 'match') or user_id is None:
+        return None
+    
+    index = get_similarity_index('resume')
+    signature = index.signature(resume_id)
+    if signature is None:
+        # 功能上线前上传的简历补建索引，之后的请求即可复用
+        schedule_index('resume', [resume_id], raw_text)
+        return None
+    resume_similarity = dict(index.find(signature=signature, exclude={resume_id}))
+    if not resume_similarity:
+        return None
+    # 只复用同一用户的简历，其他用户的分析结果不能返回给调用方
+    query = (
+        'SELECT a.resume_id, a.jd_id, a.result_data FROM analysis_results a '
+        'JOIN resumes r ON r.id = a.resume_id '
+        'WHERE a.result_type = ? AND r.user_id = ? AND a.resume_id IN ({}) '
+        'AND a.pending_enrichment = 0'
+    ).format(','.join('?' * len(resume_similarity)))
+    params = [task, user_id] + list(resume_similarity)
+    
+    jd_similarity = {}
+    if task == 'match':
+        jd_similarity = dict(get_similarity_index('jd').find(jd_text))
+        if not jd_similarity:
+            return None
+        query += ' AND a.jd_id IN ({})'.format(','.join('?' * len(jd_similarity)))
+        params += list(jd_similarity)
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(query + ' ORDER BY a.id DESC', params)
+    rows = cursor.fetchall()
+    conn.close()
+    # AI失败时保存的本地规则结果不复用
+    candidates = []
+    for row in rows:
+        data = json.loads(row['result_data'])
+        if data.get('source') != 'local':
+            candidates.append((row, data))
+    if not candidates:
+        return None
+    
+    # 最相似的优先，相似度相同时取最新的
+    best, result = max(candidates, key=lambda item: (resume_similarity[item[0]['resume_id']], jd_similarity.get(item[0]['jd_id'], 1.0)))
+    if task == 'analyze':
+        # 只复用AI分析部分，联系方式、技能和推荐岗位按当前简历重新提取
+        result = analyzer.rebuild_analysis(raw_text, result)
+    result['reused_from'] = {
+        'resume_id': best['resume_id'],
+        'resume_similarity': round(resume_similarity[best['resume_id']], 3)
+    }
+    if task == 'match':
+        result['reused_from']['jd_similarity'] = round(jd_similarity[best['jd_id']], 3)
+    return result
+
+# 可提交到后台队列的分析任务
+ANALYSIS_TASKS = ('analyze', 'match', 'interview', 'self-intro')
+
+def run_analysis_task(task: str, params: dict, sla: Optional[float] = ANALYSIS_SLA_SECONDS) -> dict:
+    """
+    执行单项分析并保存结果（同步接口和后台worker共用）
+    
+    Args:
+        task: analyze / match / interview / self-intro
+        params: 请求参数，包含resume_id和可选的jd_text；reuse为false时不复用近似重复简历的结果
+        sla: 简历分析的响应时限（秒），超时先保存本地分析结果，AI完成后补全；None表示等待AI结果
+    
+    Returns:
+        分析结果
+    
+    Raises:
+        ValueError: 参数错误或简历不存在
+    """
+    resume_id = params.get('resume_id')
+    jd_text = params.get('jd_text') or ''
+    
+    if not resume_id:
+        raise ValueError('缺少resume_id')
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM resumes WHERE id = ?', (resume_id,))
+    resume = cursor.fetchone()
+    conn.close()
+    
+    if not resume:
+        raise ValueError('简历不存在')
+    
+    enrichment = None
+    result = None
+    # 上传时已开始的预先分析：已完成则直接使用，进行中则等待同一个调用
+    speculation = analyzer.take_speculation(resume_id) if task == 'analyze' else None
+    if speculation is None and SIMILARITY_REUSE_ENABLED and params.get('reuse', True):
+        result = find_reusable_result(task, resume_id, resume['raw_text'], jd_text)
+    
+    if result is not None:
+        print(f"Reusing {task} result of resume {result['reused_from']['resume_id']} for resume {resume_id}")
+    elif task == 'analyze':
+        result, enrichment = analyzer.analyze_within_sla(resume['raw_text'], sla, future=speculation)
+    elif task == 'match':
+        if not jd_text:
+            raise ValueError('请提供岗位JD')
+        result = analyzer.match_with_jd(resume['raw_text'], jd_text)
+    elif task == 'interview':
+        result = analyzer.generate_interview_questions(resume['raw_text'], jd_text)
+    elif task == 'self-intro':
+        result = analyzer.generate_self_introduction(resume['raw_text'], jd_text)
+    else:
+        raise ValueError(f'不支持的任务类型: {task}')
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    jd_id = None
+    if task == 'match':
+        cursor.execute(
+            'INSERT INTO job_descriptions (raw_text, resume_id) VALUES (?, ?)',
+            (jd_text, resume_id)
+        )
+        jd_id = cursor.lastrowid
+    # 待补全标记单独存列，result_data中不保存
+    stored = {key: value for key, value in result.items() if key != 'pending_enrichment'}
+    cursor.execute(
+        'INSERT INTO analysis_results (resume_id, jd_id, result_type, result_data, pending_enrichment) '
+        'VALUES (?, ?, ?, ?, ?)',
+        (resume_id, jd_id, task, json.dumps(stored, ensure_ascii=False), int(enrichment is not None))
+    )
+    result_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    
+    if jd_id is not None:
+        schedule_index('jd', [jd_id], jd_text)
+    
+    if enrichment is not None:
+        schedule_enrichment(result_id, enrichment)
+    
+    return result
+
+def schedule_enrichment(result_id: int, enrichment):
+    """AI分析在后台完成后，用完整结果替换待补全的本地分析结果；AI失败时保留本地结果并清除待补全标记"""
+    def _save(future):
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Enrichment of analysis result {result_id} failed, keeping local result: {e}")
+            result = None
+        try:
+            conn = get_db_connection()
+            if result is not None:
+                conn.execute(
+                    'UPDATE analysis_results SET result_data = ?, pending_enrichment = 0 WHERE id = ?',
+                    (json.dumps(result, ensure_ascii=False), result_id)
+                )
+            else:
+                conn.execute('UPDATE analysis_results SET pending_enrichment = 0 WHERE id = ?', (result_id,))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            print(f"Failed to save enriched analysis result {result_id}: {e}")
+    
+    enrichment.add_done_callback(_save)
+
+def submit_analysis_task(task: str, params: dict):
+    """提交到后台队列，立即返回任务ID"""
+    from utils.job_queue import get_job_backend
+    
+    if not params.get('resume_id'):
+        return jsonify({'success': False, 'error': '缺少resume_id'})
+    
+    if task == 'match' and not params.get('jd_text'):
+        return jsonify({'success': False, 'error': '请提供岗位JD'})
+    
+    job_id = get_job_backend().enqueue(task, {
+        'user_id': g.get('usage_user_id'),
+        'resume_id': params.get('resume_id'),
+        'jd_text': params.get('jd_text') or '',
+        'reuse': params.get('reuse', True)
+    })
+    return jsonify({
+        'success': True,
+        'data': {'job_id': job_id, 'task': task, 'status': 'queued'}
+    })
+
+def run_analysis_endpoint(task: str):
+    """单项分析接口：请求中带 async=true 时改为提交后台任务"""
+    try:
+        data = request.json
+        if data.get('async'):
+            return submit_analysis_task(task, data)
+        
+        result = run_analysis_task(task, data)
+        
+        return jsonify({
+            'success': True,
+            'data': result
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze_resume():
+    return run_analysis_endpoint('analyze')
+
+@app.route('/api/match', methods=['POST'])
+def match_jd():
+    return run_analysis_endpoint('match')
+
+@app.route('/api/match/multi', methods=['POST'])
+def match_multiple_jds():
+    """一份简历与多个岗位JD匹配，按匹配度排序（jds为JD文本列表，或包含title和jd_text的对象列表）"""
     try:
+        from config import MULTI_MATCH_MAX_JDS
+        
         data = request.json
         resume_id = data.get('resume_id')
+        jds = data.get('jds')
         
         if not resume_id:
             return jsonify({'success': False, 'error': '缺少resume_id'})
+        if not isinstance(jds, list) or not jds:
+            return jsonify({'success': False, 'error': '请提供岗位JD列表'})
+        if len(jds) > MULTI_MATCH_MAX_JDS:
+            return jsonify({'success': False, 'error': f'单次最多匹配{MULTI_MATCH_MAX_JDS}个岗位'})
+        
+        titles = [jd.get('title') or '' if isinstance(jd, dict) else '' for jd in jds]
+        jd_texts = [str((jd.get('jd_text') if isinstance(jd, dict) else jd) or '').strip() for jd in jds]
+        if not all(jd_texts):
+            return jsonify({'success': False, 'error': '岗位JD不能为空'})
         
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -200,77 +558,168 @@ def analyze_resume():
         if not resume:
             return jsonify({'success': False, 'error': '简历不存在'})
         
-        result = analyzer.analyze(resume['raw_text'])
+        results = analyzer.match_with_jds(resume['raw_text'], jd_texts)
         
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO analysis_results (resume_id, result_type, result_data) VALUES (?, ?, ?)',
-            (resume_id, 'analyze', json.dumps(result, ensure_ascii=False))
-        )
-        conn.commit()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            jd_ids = []
+            for result in results:
+                result['title'] = titles[result['index']]
+                cursor.execute(
+                    'INSERT INTO job_descriptions (title, raw_text, resume_id) VALUES (?, ?, ?)',
+                    (result['title'] or None, jd_texts[result['index']], resume_id)
+                )
+                jd_id = cursor.lastrowid
+                jd_ids.append((jd_id, jd_texts[result['index']]))
+                cursor.execute(
+                    'INSERT INTO analysis_results (resume_id, jd_id, result_type, result_data) VALUES (?, ?, ?, ?)',
+                    (resume_id, jd_id, 'match', json.dumps(result, ensure_ascii=False))
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        for jd_id, jd_text in jd_ids:
+            schedule_index('jd', [jd_id], jd_text)
         
         return jsonify({
             'success': True,
-            'data': result
+            'data': {'results': results, 'count': len(results)}
         })
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
-@app.route('/api/match', methods=['POST'])
-def match_jd():
+@app.route('/api/interview', methods=['POST'])
+def generate_interview():
+    return run_analysis_endpoint('interview')
+
+@app.route('/api/self-intro', methods=['POST'])
+def generate_self_intro():
+    return run_analysis_endpoint('self-intro')
+
+@app.route('/api/tasks', methods=['POST'])
+def submit_task():
+    """提交后台分析任务（task: analyze/match/interview/self-intro）"""
     try:
         data = request.json
-        resume_id = data.get('resume_id')
-        jd_text = data.get('jd_text')
+        task = data.get('task')
         
-        if not resume_id:
-            return jsonify({'success': False, 'error': '缺少resume_id'})
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM resumes WHERE id = ?', (resume_id,))
-        resume = cursor.fetchone()
-        conn.close()
+        if task not in ANALYSIS_TASKS:
+            return jsonify({'success': False, 'error': f'task必须是以下之一: {", ".join(ANALYSIS_TASKS)}'})
         
-        if not resume:
-            return jsonify({'success': False, 'error': '简历不存在'})
+        return submit_analysis_task(task, data)
         
-        if not jd_text:
-            return jsonify({'success': False, 'error': '请提供岗位JD'})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/tasks/<job_id>', methods=['GET'])
+def get_task(job_id):
+    """查询后台任务状态和结果，wait参数（秒）开启长轮询"""
+    try:
+        from utils.job_queue import get_job_backend, wait_for_job
+        from config import JOB_LONG_POLL_MAX
         
-        result = analyzer.match_with_jd(resume['raw_text'], jd_text)
+        wait = min(max(request.args.get('wait', 0, type=float), 0), JOB_LONG_POLL_MAX)
+        if wait:
+            job = wait_for_job(job_id, wait)
+        else:
+            job = get_job_backend().get(job_id)
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO job_descriptions (raw_text, resume_id) VALUES (?, ?)',
-            (jd_text, resume_id)
-        )
-        jd_id = cursor.lastrowid
-        cursor.execute(
-            'INSERT INTO analysis_results (resume_id, jd_id, result_type, result_data) VALUES (?, ?, ?, ?)',
-            (resume_id, jd_id, 'match', json.dumps(result, ensure_ascii=False))
-        )
-        conn.commit()
-        conn.close()
+        if not job:
+            return jsonify({'success': False, 'error': '任务不存在'})
         
         return jsonify({
             'success': True,
-            'data': result
+            'data': {
+                'job_id': job['id'],
+                'task': job['task'],
+                'status': job['status'],
+                'result': job['result'],
+                'error': job['error'],
+                'attempts': job['attempts'],
+                'created_at': job['created_at'],
+                'finished_at': job['finished_at']
+            }
         })
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
-@app.route('/api/interview', methods=['POST'])
-def generate_interview():
+# analyze_all任务名 -> analysis_results.result_type
+RESULT_TYPES = {
+    'analyze': 'analyze',
+    'match': 'match',
+    'interview': 'interview',
+    'self_intro': 'self-intro'
+}
+
+def save_analysis_results(entries: list, jd_text: str = ''):
+    """
+    在同一事务中保存多份简历的analyze_all结果
+    
+    Args:
+        entries: [(resume_id, {任务名: 结果}), ...]
+        jd_text: 岗位JD文本，有匹配结果时为每份简历记录一条JD
+    
+    Returns:
+        {(resume_id, 任务名): 结果ID}，只包含等待AI补全的结果（用于 schedule_enrichment）
+    """
+    conn = get_db_connection()
+    pending = {}
+    try:
+        cursor = conn.cursor()
+        rows = []
+        jd_ids = []
+        for resume_id, results in entries:
+            jd_id = None
+            if 'match' in results:
+                cursor.execute(
+                    'INSERT INTO job_descriptions (raw_text, resume_id) VALUES (?, ?)',
+                    (jd_text, resume_id)
+                )
+                jd_id = cursor.lastrowid
+                jd_ids.append(jd_id)
+            for name, result in results.items():
+                row = (resume_id, jd_id if name == 'match' else None, RESULT_TYPES[name])
+                if isinstance(result, dict) and result.get('pending_enrichment'):
+                    # 待补全的结果单独插入以取得结果ID，标记存在pending_enrichment列
+                    stored = {key: value for key, value in result.items() if key != 'pending_enrichment'}
+                    cursor.execute(
+                        'INSERT INTO analysis_results (resume_id, jd_id, result_type, result_data, pending_enrichment) '
+                        'VALUES (?, ?, ?, ?, 1)',
+                        row + (json.dumps(stored, ensure_ascii=False),)
+                    )
+                    pending[(resume_id, name)] = cursor.lastrowid
+                else:
+                    rows.append(row + (json.dumps(result, ensure_ascii=False),))
+        cursor.executemany(
+            'INSERT INTO analysis_results (resume_id, jd_id, result_type, result_data) VALUES (?, ?, ?, ?)',
+            rows
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    if jd_ids:
+        schedule_index('jd', jd_ids, jd_text)
+    return pending
+
+@app.route('/api/analyze-all', methods=['POST'])
+def analyze_all():
+    """一键分析：并发执行简历分析、岗位匹配、面试题、自我介绍"""
     try:
         data = request.json
         resume_id = data.get('resume_id')
         jd_text = data.get('jd_text', '')
+        tasks = data.get('tasks')
         
         if not resume_id:
             return jsonify({'success': False, 'error': '缺少resume_id'})
@@ -284,27 +733,125 @@ def generate_interview():
         if not resume:
             return jsonify({'success': False, 'error': '简历不存在'})
         
-        result = analyzer.generate_interview_questions(resume['raw_text'], jd_text)
+        speculation = analyzer.take_speculation(resume_id) if tasks is None or 'analyze' in tasks else None
+        outcome = analyzer.analyze_all(resume['raw_text'], jd_text, tasks, speculation=speculation)
+        results = outcome['results']
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO analysis_results (resume_id, result_type, result_data) VALUES (?, ?, ?)',
-            (resume_id, 'interview', json.dumps(result, ensure_ascii=False))
-        )
-        conn.commit()
-        conn.close()
+        pending = save_analysis_results([(resume_id, results)], jd_text)
+        for name, enrichment in outcome['enrichments'].items():
+            if (resume_id, name) in pending:
+                schedule_enrichment(pending[(resume_id, name)], enrichment)
         
         return jsonify({
             'success': True,
-            'data': result
+            'data': results,
+            'errors': outcome['errors']
         })
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
-@app.route('/api/self-intro', methods=['POST'])
-def generate_self_intro():
+def sse_event(event: str, data) -> str:
+    """格式化一条Server-Sent Events消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def sse_response(events) -> Response:
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/analyze/batch', methods=['POST'])
+@no_request_deadline
+def analyze_batch():
+    """批量分析多份简历（SSE），每份简历完成即推送，结果分批写入数据库"""
+    try:
+        from config import BATCH_MAX_RESUMES, BATCH_WRITE_SIZE
+        
+        data = request.json
+        resume_ids = data.get('resume_ids') or []
+        jd_text = data.get('jd_text', '')
+        tasks = data.get('tasks') or (['analyze', 'match'] if jd_text else ['analyze'])
+        
+        if not isinstance(resume_ids, list) or not resume_ids:
+            return jsonify({'success': False, 'error': '缺少resume_ids'})
+        
+        resume_ids = list(dict.fromkeys(resume_ids))
+        if len(resume_ids) > BATCH_MAX_RESUMES:
+            return jsonify({'success': False, 'error': f'单次最多分析{BATCH_MAX_RESUMES}份简历'})
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        placeholders = ','.join('?' * len(resume_ids))
+        cursor.execute(f'SELECT id, raw_text FROM resumes WHERE id IN ({placeholders})', resume_ids)
+        texts = {row['id']: row['raw_text'] for row in cursor.fetchall()}
+        conn.close()
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+    
+    resumes = [(rid, texts[rid]) for rid in resume_ids if texts.get(rid)]
+    
+    def events():
+        started = time.time()
+        total = len(resume_ids)
+        completed = 0
+        failed = 0
+        pending = []
+        
+        yield sse_event('start', {
+            'total': total,
+            'unique': len({text for _, text in resumes}),
+            'tasks': tasks
+        })
+        
+        for rid in resume_ids:
+            if not texts.get(rid):
+                completed += 1
+                failed += 1
+                error = '简历不存在' if rid not in texts else '简历内容为空'
+                yield sse_event('item', {'resume_id': rid, 'success': False, 'error': error,
+                                         'completed': completed, 'total': total})
+        
+        try:
+            for ids, outcome in analyzer.analyze_batch(resumes, jd_text, tasks):
+                results = outcome['results']
+                for rid in ids:
+                    completed += 1
+                    if not results:
+                        failed += 1
+                    else:
+                        pending.append((rid, results))
+                    yield sse_event('item', {
+                        'resume_id': rid,
+                        'success': bool(results),
+                        'data': results,
+                        'errors': outcome['errors'],
+                        'completed': completed,
+                        'total': total
+                    })
+                
+                if len(pending) >= BATCH_WRITE_SIZE:
+                    save_analysis_results(pending, jd_text)
+                    pending = []
+        finally:
+            # 客户端中途断开时也保存已完成的结果
+            if pending:
+                save_analysis_results(pending, jd_text)
+        
+        yield sse_event('done', {
+            'total': total,
+            'succeeded': completed - failed,
+            'failed': failed,
+            'elapsed': round(time.time() - started, 1)
+        })
+    
+    return sse_response(events())
+
+@app.route('/api/interview/stream', methods=['POST'])
+def generate_interview_stream():
+    """流式生成面试题（SSE），每道题生成完成即推送"""
     try:
         data = request.json
         resume_id = data.get('resume_id')
@@ -322,24 +869,75 @@ def generate_self_intro():
         if not resume:
             return jsonify({'success': False, 'error': '简历不存在'})
         
-        result = analyzer.generate_self_introduction(resume['raw_text'], jd_text)
+        raw_text = resume['raw_text']
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+    
+    def generate():
+        try:
+            for kind, key, value in analyzer.stream_interview_questions(raw_text, jd_text):
+                if kind == 'item' and key == 'interview_questions':
+                    yield sse_event('question', value)
+                elif kind == 'done':
+                    conn = get_db_connection()
+                    cursor = conn.cursor()
+                    cursor.execute(
+                        'INSERT INTO analysis_results (resume_id, result_type, result_data) VALUES (?, ?, ?)',
+                        (resume_id, 'interview', json.dumps(value, ensure_ascii=False))
+                    )
+                    conn.commit()
+                    conn.close()
+                    yield sse_event('done', value)
+        except Exception as e:
+            yield sse_event('error', {'error': str(e)})
+    
+    return sse_response(generate())
+
+@app.route('/api/self-intro/stream', methods=['POST'])
+def generate_self_intro_stream():
+    """流式生成自我介绍（SSE），每个部分生成完成即推送"""
+    try:
+        data = request.json
+        resume_id = data.get('resume_id')
+        jd_text = data.get('jd_text', '')
+        
+        if not resume_id:
+            return jsonify({'success': False, 'error': '缺少resume_id'})
         
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO analysis_results (resume_id, result_type, result_data) VALUES (?, ?, ?)',
-            (resume_id, 'self-intro', json.dumps(result, ensure_ascii=False))
-        )
-        conn.commit()
+        cursor.execute('SELECT * FROM resumes WHERE id = ?', (resume_id,))
+        resume = cursor.fetchone()
         conn.close()
         
-        return jsonify({
-            'success': True,
-            'data': result
-        })
+        if not resume:
+            return jsonify({'success': False, 'error': '简历不存在'})
+        
+        raw_text = resume['raw_text']
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
+    
+    def generate():
+        try:
+            for kind, key, value in analyzer.stream_self_introduction(raw_text, jd_text):
+                if kind == 'field':
+                    yield sse_event('section', {'key': key, 'value': value})
+                elif kind == 'done':
+                    conn = get_db_connection()
+                    cursor = conn.cursor()
+                    cursor.execute(
+                        'INSERT INTO analysis_results (resume_id, result_type, result_data) VALUES (?, ?, ?)',
+                        (resume_id, 'self-intro', json.dumps(value, ensure_ascii=False))
+                    )
+                    conn.commit()
+                    conn.close()
+                    yield sse_event('done', value)
+        except Exception as e:
+            yield sse_event('error', {'error': str(e)})
+    
+    return sse_response(generate())
 
 @app.route('/api/resumes', methods=['GET'])
 def list_resumes():
@@ -367,17 +965,65 @@ def list_resumes():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/resumes/<int:resume_id>/results', methods=['GET'])
+def get_resume_results(resume_id):
+    """获取简历最近一次的分析结果，type参数指定结果类型（默认analyze）；pending_enrichment表示AI结果仍在补全"""
+    try:
+        result_type = request.args.get('type', 'analyze')
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT result_data, pending_enrichment, created_at FROM analysis_results '
+            'WHERE resume_id = ? AND result_type = ? ORDER BY id DESC LIMIT 1',
+            (resume_id, result_type)
+        )
+        row = cursor.fetchone()
+        conn.close()
+        
+        if not row:
+            return jsonify({'success': False, 'error': '暂无分析结果'})
+        
+        data = json.loads(row['result_data'])
+        if row['pending_enrichment']:
+            data['pending_enrichment'] = True
+        return jsonify({
+            'success': True,
+            'data': data,
+            'pending_enrichment': bool(row['pending_enrichment']),
+            'created_at': row['created_at']
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
 @app.route('/api/resumes/<int:resume_id>', methods=['DELETE'])
 def delete_resume(resume_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
+        cursor.execute('SELECT id FROM job_descriptions WHERE resume_id = ?', (resume_id,))
+        jd_ids = [row['id'] for row in cursor.fetchall()]
+        cursor.execute('SELECT raw_text FROM resumes WHERE id = ?', (resume_id,))
+        row = cursor.fetchone()
         cursor.execute('DELETE FROM analysis_results WHERE resume_id = ?', (resume_id,))
         cursor.execute('DELETE FROM job_descriptions WHERE resume_id = ?', (resume_id,))
         cursor.execute('DELETE FROM resumes WHERE id = ?', (resume_id,))
+        # 摘要按简历文本共享，没有其他简历使用相同文本时才删除
+        shared = False
+        if row is not None:
+            cursor.execute('SELECT 1 FROM resumes WHERE raw_text = ? LIMIT 1', (row['raw_text'],))
+            shared = cursor.fetchone() is not None
         conn.commit()
         conn.close()
         
+        if row is not None and not shared:
+            remove_resume_summary(row['raw_text'])
+        
+        get_similarity_index('resume').remove([resume_id])
+        get_similarity_index('jd').remove(jd_ids)
+        analyzer.cancel_speculation(resume_id)
+        
         return jsonify({'success': True})
         
     except Exception as e:
@@ -600,6 +1246,7 @@ def get_status():
     """获取API使用状态"""
     try:
         from utils.ai_client import get_api_stats, reset_api_stats, get_ai_client
+        from utils.job_queue import get_job_backend
         from config import get_api_config, save_user_config
         
         stats = get_api_stats()
@@ -615,7 +1262,23 @@ def get_status():
                 'completion_tokens': stats['total_completion_tokens'],
                 'total_tokens': stats['total_tokens'],
                 'last_call_time': stats['last_call_time'],
-                'is_custom_key': config['is_custom']
+                'is_custom_key': config['is_custom'],
+                'cache': stats['cache'],
+                'retries': {
+                    'retries': stats['resilience']['retries'],
+                    'failovers': stats['resilience']['failovers'],
+                    'retries_exhausted': stats['resilience']['retries_exhausted'],
+                    'circuit_rejections': stats['resilience']['circuit_rejections'],
+                    'rate_limit_rejections': stats['resilience']['rate_limit_rejections'],
+                    'deadline_exceeded': stats['resilience']['deadline_exceeded']
+                },
+                'circuit_breakers': stats['resilience']['circuit_breakers'],
+                'providers': stats['providers'],
+                'tasks': stats['tasks'],
+                'inflight_requests': stats['inflight_requests'],
+                'jobs': get_job_backend().get_stats(),
+                'speculation': get_speculation_stats(),
+                'usage': stats['usage_tracker']
             }
         })
         
@@ -716,12 +1379,14 @@ def save_api_config():
                 'error': f'API Key测试失败: {test_result["message"]}'
             })
         
-        user_config = {
+        # 保留providers等其他配置项
+        user_config = load_user_config()
+        user_config.update({
             'api_key': api_key,
             'api_base_url': api_base_url,
             'model_name': model_name,
             'provider_name': provider_name
-        }
+        })
         
         if save_user_config(user_config):
             get_ai_client()
@@ -835,6 +1500,7 @@ def parse_jd():
 # ============================================
 
 import hashlib
+import hmac
 import jwt
 import re
 from datetime import datetime, timedelta
@@ -883,6 +1549,17 @@ def login_required(f):
     return decorated
 
 
+def admin_required(f):
+    """管理员验证装饰器（ADMIN_USER_IDS中的用户）"""
+    @wraps(f)
+    @login_required
+    def decorated(*args, **kwargs):
+        if request.user_id not in ADMIN_USER_IDS:
+            return jsonify({'success': False, 'error': '没有权限'})
+        return f(*args, **kwargs)
+    return decorated
+
+
 @app.route('/api/user/register', methods=['POST'])
 def register():
     """用户注册"""
@@ -1219,6 +1896,79 @@ def record_usage():
         return jsonify({'success': False, 'error': str(e)})
 
 
+# ============================================
+# 管理员 API
+# ============================================
+
+@app.route('/api/admin/usage', methods=['GET'])
+@admin_required
+def get_token_usage():
+    """
+    查询LLM token用量和费用
+    
+    参数：days（最近天数，默认7）、group_by（user/date/task/model，默认user）、user_id（只看某个用户）、limit
+    """
+    try:
+        days = max(1, request.args.get('days', 7, type=int))
+        group_by = request.args.get('group_by', 'user')
+        user_id = request.args.get('user_id', type=int)
+        limit = min(1000, request.args.get('limit', 100, type=int))
+        
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=days - 1)
+        rows = get_usage_tracker().query(
+            start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'),
+            group_by=group_by, user_id=user_id, limit=limit
+        )
+        
+        if group_by == 'user' and rows:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            user_ids = [row['user_id'] for row in rows]
+            cursor.execute(
+                f'SELECT id, username FROM users WHERE id IN ({",".join("?" * len(user_ids))})',
+                user_ids
+            )
+            usernames = {row['id']: row['username'] for row in cursor.fetchall()}
+            conn.close()
+            for row in rows:
+                row['username'] = usernames.get(row['user_id'], '匿名用户' if row['user_id'] == 0 else '')
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'start_date': start_date.strftime('%Y-%m-%d'),
+                'end_date': end_date.strftime('%Y-%m-%d'),
+                'group_by': group_by,
+                'rows': rows
+            }
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+
+def _render_metrics():
+    from utils.metrics import get_llm_metrics
+    from utils.llm_scheduler import render_scheduler_prometheus
+    
+    return Response(get_llm_metrics().render_prometheus() + render_scheduler_prometheus(),
+                    mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    LLM调用指标（Prometheus文本格式）
+    
+    包含各任务的token用量和provider名称，Authorization为 Bearer METRICS_TOKEN（供Prometheus抓取）或管理员登录后才能访问
+    """
+    auth_header = request.headers.get('Authorization', '')
+    if METRICS_TOKEN and hmac.compare_digest(auth_header.encode(), f'Bearer {METRICS_TOKEN}'.encode()):
+        return _render_metrics()
+    return admin_required(_render_metrics)()
+
+
 # ============================================
 # 支付系统 API
 # ============================================
@@ -1,36 +1,98 @@
 import os
+import copy
 import json
+import threading
+import time
 
 # 应用根目录 - 使用os.path.abspath确保路径正确
 APP_DIR = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
 CONFIG_FILE = os.path.join(APP_DIR, 'user_config.json')
 
 # 默认API配置
-DEFAULT_API_BASE_URL = "https://api.siliconflow.cn/v1"
+DEFAULT_API_BASE_URL = os.environ.get('API_BASE_URL', "https://api.siliconflow.cn/v1")  # 压测时可指向 llm_stub_server.py
 DEFAULT_MODEL_NAME = "Qwen/Qwen2.5-72B-Instruct"
 DEFAULT_PROVIDER_NAME = "硅基流动 (SiliconFlow)"
 
+# 用户配置缓存：解析结果常驻内存，按文件签名（inode/mtime/大小）失效；
+# 其他进程（如worker.py）保存配置后，最多CONFIG_RELOAD_INTERVAL秒内生效
+_user_config_cache = {'path': None, 'signature': None, 'data': {}, 'checked_at': 0.0, 'version': 0}
+_user_config_lock = threading.Lock()
+
+def _config_file_signature():
+    try:
+        stat = os.stat(CONFIG_FILE)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+def _refresh_user_config():
+    """检查配置文件是否变化，变化时重新加载；返回 (配置, 版本号)"""
+    now = time.monotonic()
+    with _user_config_lock:
+        cache = _user_config_cache
+        same_path = cache['path'] == CONFIG_FILE
+        if same_path and now - cache['checked_at'] < CONFIG_RELOAD_INTERVAL:
+            return cache['data'], cache['version']
+        cache['checked_at'] = now
+        
+        signature = _config_file_signature()
+        if same_path and signature == cache['signature']:
+            return cache['data'], cache['version']
+        
+        data = {}
+        if signature is not None:
+            try:
+                with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"加载配置文件失败: {e}")
+                if same_path:
+                    # 保留上一次成功加载的配置，文件修复后重新加载
+                    cache['signature'] = signature
+                    return cache['data'], cache['version']
+        
+        if not same_path or data != cache['data']:
+            cache['version'] += 1
+        cache.update(path=CONFIG_FILE, signature=signature, data=data)
+        return data, cache['version']
+
 # 读取用户配置
 def load_user_config():
-    """加载用户配置"""
-    try:
-        if os.path.exists(CONFIG_FILE):
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-    except Exception as e:
-        print(f"加载配置文件失败: {e}")
-    return {}
+    """加载用户配置（返回副本，修改后需调用save_user_config保存）"""
+    data, _ = _refresh_user_config()
+    return copy.deepcopy(data)
+
+def get_config_version():
+    """配置版本号，每次配置内容变化时加1"""
+    _, version = _refresh_user_config()
+    return version
 
 # 保存用户配置
 def save_user_config(config):
-    """保存用户配置"""
+    """保存用户配置：写入临时文件后原子替换，其他进程不会读到写了一半的文件"""
+    tmp_path = f"{CONFIG_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
     try:
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             json.dump(config, f, ensure_ascii=False, indent=2)
-        return True
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, CONFIG_FILE)
     except Exception as e:
         print(f"保存配置文件失败: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         return False
+    
+    with _user_config_lock:
+        cache = _user_config_cache
+        cache.update(
+            path=CONFIG_FILE,
+            signature=_config_file_signature(),
+            data=copy.deepcopy(config),
+            checked_at=time.monotonic(),
+            version=cache['version'] + 1
+        )
+    return True
 
 # 获取当前API配置
 def get_api_config():
@@ -56,6 +118,62 @@ def get_api_config():
         'is_custom': False
     }
 
+# 获取provider池配置
+def get_provider_configs():
+    """
+    获取所有可用的provider配置
+
+    user_config.json 中的 providers 为OpenAI兼容接口列表：
+        [{"api_base_url": ..., "api_key": ..., "model_name": ..., "provider_name": ...,
+          "rpm": 可选, "tpm": 可选, "models": 可选}, ...]
+    设置页保存的API配置排在最前；两者都没有时使用默认配置
+    
+    models 为该provider还能提供的模型路由（MODEL_ROUTES）中的模型，每个模型展开为独立的
+    provider条目（routed=True），单独限流和熔断；默认接口地址的provider默认提供全部路由模型
+    """
+    user_config = load_user_config()
+    providers = []
+    
+    if user_config.get('api_key') or not user_config.get('providers'):
+        primary = get_api_config()
+        primary['rpm'] = user_config.get('rpm', AI_RATE_LIMIT_RPM)
+        primary['tpm'] = user_config.get('tpm', AI_RATE_LIMIT_TPM)
+        default_models = MODEL_ROUTE_MODELS if primary['api_base_url'] == DEFAULT_API_BASE_URL else []
+        primary['models'] = user_config.get('models', default_models)
+        providers.append(primary)
+    
+    for item in user_config.get('providers') or []:
+        if not item.get('api_key'):
+            continue
+        providers.append({
+            'api_base_url': item.get('api_base_url', DEFAULT_API_BASE_URL),
+            'api_key': item['api_key'],
+            'model_name': item.get('model_name', DEFAULT_MODEL_NAME),
+            'provider_name': item.get('provider_name', DEFAULT_PROVIDER_NAME),
+            'is_custom': True,
+            'rpm': item.get('rpm', AI_RATE_LIMIT_RPM),
+            'tpm': item.get('tpm', AI_RATE_LIMIT_TPM),
+            'models': item.get('models', [])
+        })
+    
+    # 同一provider的多个key各自独立统计和限流，用key尾号区分
+    seen = set()
+    unique = []
+    for provider in providers:
+        provider_id = f"{provider['provider_name']}#{provider['api_key'][-4:]}"
+        if provider_id in seen:
+            continue
+        seen.add(provider_id)
+        provider['id'] = provider_id
+        unique.append(provider)
+    
+    routed = []
+    for provider in unique:
+        for model in provider.pop('models', None) or []:
+            if model != provider['model_name']:
+                routed.append(dict(provider, id=f"{provider['id']}@{model}", model_name=model, routed=True))
+    return unique + routed
+
 # 应用配置
 SECRET_KEY = os.urandom(24)
 DEBUG = True
@@ -68,6 +186,141 @@ ALLOWED_EXTENSIONS = {'txt', 'pdf', 'docx', 'doc', 'jpg', 'jpeg', 'png'}
 # 数据库配置
 DATABASE_PATH = os.path.join(APP_DIR, 'data', 'jobhelper.db')
 
+# 用户配置热加载
+CONFIG_RELOAD_INTERVAL = 2  # 检查user_config.json是否变化的最短间隔（秒）
+
 # AI配置
 AI_TIMEOUT = 60  # API超时时间（秒）
 AI_MAX_TOKENS = 4000
+
+# AI连接池配置（每个provider base URL一个keep-alive会话）
+AI_POOL_CONNECTIONS = 4  # 每个会话缓存的主机连接池数量
+AI_POOL_MAXSIZE = int(os.environ.get('AI_POOL_MAXSIZE', 20))  # 单个主机最多保持的连接数，应不小于并发线程数
+AI_WARMUP_ON_START = os.environ.get('AI_WARMUP_ON_START', '1') == '1'  # 启动时预热连接
+AI_WARMUP_CONNECTIONS = 2  # 预热时提前建立的连接数
+
+# AI重试与熔断配置
+AI_CONNECT_TIMEOUT = 5  # 建立连接超时（秒），读取超时使用AI_TIMEOUT
+AI_MAX_RETRIES = int(os.environ.get('AI_MAX_RETRIES', 2))  # 429/5xx及连接失败的最大重试次数
+AI_RETRY_BASE_DELAY = 0.5  # 指数退避基础等待（秒）
+AI_RETRY_MAX_DELAY = 8  # 单次退避上限（秒），Retry-After超过该值时不再重试
+AI_CIRCUIT_FAILURE_THRESHOLD = 5  # 连续失败多少次后熔断
+AI_CIRCUIT_RESET_TIMEOUT = 30  # 熔断后多久放行探测请求（秒）
+
+# 请求截止时间与自适应超时配置
+REQUEST_DEADLINE = int(os.environ.get('REQUEST_DEADLINE', 90))  # 每个API请求的延迟预算（秒），客户端可用X-Request-Timeout请求头缩短
+REQUEST_DEADLINE_MARGIN = 1  # 预留给保存结果和返回响应的时间（秒）
+AI_ADAPTIVE_TIMEOUT_MIN = 15  # 自适应读取超时下限（秒），上限为AI_TIMEOUT
+AI_ADAPTIVE_TIMEOUT_MULTIPLIER = 2  # 读取超时 = 该任务近期p99延迟 × 倍数
+AI_ADAPTIVE_TIMEOUT_MIN_SAMPLES = 20  # 样本数不足时使用AI_TIMEOUT
+
+# 多provider路由配置
+PROVIDER_STATS_WINDOW = 50  # 计算p95延迟和错误率的最近请求数
+PROVIDER_DEFAULT_LATENCY = 2.0  # 尚无样本的provider按此延迟（秒）参与排序
+
+# 客户端限流配置（providers中可单独配置rpm/tpm，0表示不限制）
+AI_RATE_LIMIT_RPM = int(os.environ.get('AI_RATE_LIMIT_RPM', 0))  # 每分钟请求数
+AI_RATE_LIMIT_TPM = int(os.environ.get('AI_RATE_LIMIT_TPM', 0))  # 每分钟token数（按预估值预扣，返回后按实际用量校正）
+AI_RATE_LIMIT_MAX_WAIT = 10  # 排队等待上限（秒），超过则换provider或直接拒绝
+AI_RATE_LIMIT_BURST_SECONDS = 10  # 令牌桶容量相当于多少秒的额度，用于平滑突发
+
+# LLM请求调度配置：每个模型的并发名额用完后，请求按会员等级加权公平排队
+AI_SCHEDULER_CONCURRENCY = int(os.environ.get('AI_SCHEDULER_CONCURRENCY', 16))  # 每个模型同时发往provider的请求数，0表示不排队
+AI_SCHEDULER_TIER_WEIGHTS = {0: 1, 1: 4, 2: 16}  # 会员等级权重：积压时免费/专业版/尊享版按1:4:16获得空出的名额
+AI_SCHEDULER_USER_LIMITS = {0: 4, 1: 8, 2: 12}  # 单个用户同时占用的名额上限（未登录请求不限）
+AI_SCHEDULER_STARVATION_SECONDS = 20  # 排队超过该时间的请求不论等级优先放行
+AI_SCHEDULER_MAX_WAIT = 60  # 最多排队等待（秒），超过则放弃该次调用；请求设置了截止时间时取剩余时间
+
+# LLM响应缓存配置（内存LRU + SQLite持久化）
+LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', '1') == '1'
+LLM_CACHE_MEMORY_ENTRIES = 256  # 内存层最大条目数
+LLM_CACHE_DISK_ENTRIES = 5000  # 磁盘层最大条目数
+LLM_CACHE_TTL = 7 * 24 * 3600  # 缓存有效期（秒）
+LLM_CACHE_DB_PATH = os.path.join(APP_DIR, 'data', 'llm_cache.db')
+
+# 并发分析配置
+AI_TASK_WORKERS = int(os.environ.get('AI_TASK_WORKERS', 8))  # 一键分析共享线程池大小（所有请求共用）
+AI_BATCH_CONCURRENCY = int(os.environ.get('AI_BATCH_CONCURRENCY', 4))  # 批量分析同时处理的简历数（所有批量请求共用）
+BATCH_MAX_RESUMES = 200  # 单次批量分析最多简历数
+BATCH_WRITE_SIZE = 20  # 批量分析每累计多少份结果写一次数据库
+AI_COMBINED_PROMPT = os.environ.get('AI_COMBINED_PROMPT', '0') == '1'  # 一键分析合并为一次调用（简历只发送一次），解析失败的部分按任务单独重试
+AI_COMBINED_MAX_TOKENS = 8000  # 合并调用的最大输出token数
+MULTI_MATCH_MAX_JDS = 20  # 多JD匹配单次最多JD数
+MULTI_MATCH_BATCH_SIZE = int(os.environ.get('MULTI_MATCH_BATCH_SIZE', 10))  # 每次AI调用合并的JD数（简历每批只发送一次），各批并发
+MULTI_MATCH_JD_TOKEN_BUDGET = 800  # 多JD匹配中每个JD的token预算
+MULTI_MATCH_TOKENS_PER_JD = 400  # 多JD匹配每个JD预留的输出token，合计不超过AI_COMBINED_MAX_TOKENS
+ANALYSIS_SLA_SECONDS = int(os.environ.get('ANALYSIS_SLA_SECONDS', 15))  # 简历分析的响应时限（秒），AI超时先返回本地规则分析，AI完成后再补全
+SPECULATIVE_ANALYSIS = os.environ.get('SPECULATIVE_ANALYSIS', '0') == '1'  # 上传后立即在后台开始简历分析，点击分析时直接使用结果（每次上传都会产生AI调用，默认关闭）
+SPECULATIVE_WORKERS = int(os.environ.get('SPECULATIVE_WORKERS', 2))  # 预先分析同时进行的AI调用数
+SPECULATIVE_MAX_PENDING = 20  # 排队及进行中的预先分析超过该数量时不再预先分析
+SPECULATION_TTL = 600  # 预先分析结果在内存中保留的时间（秒），超时未使用则丢弃
+
+# 提示词压缩配置：简历按任务的token预算压缩（清理空白和重复内容，按与JD的相关度保留章节）
+PROMPT_TOKEN_BUDGETS = {
+    'analyze': 6000,
+    'optimize': 3000,
+    'predict': 4500,
+    'match': 4500,
+    'interview': 4500,
+    'self-intro': 4500,
+    'combined': 6000,
+    'default': 4500
+}
+JD_TOKEN_BUDGET = 3000  # JD文本的token预算
+
+# 简历摘要配置：每份简历文本生成一次结构化摘要，匹配/面试题/自我介绍等用摘要代替简历原文
+RESUME_SUMMARY_ENABLED = os.environ.get('RESUME_SUMMARY_ENABLED', '1') == '1'
+RESUME_SUMMARY_SOURCE = os.environ.get('RESUME_SUMMARY_SOURCE', 'local')  # local：使用时按本地规则提取；ai：上传后在后台调用一次AI生成（每次上传多一次付费调用）
+RESUME_SUMMARY_TASKS = {'match', 'interview', 'self-intro', 'predict'}  # 使用摘要的任务（简历分析和优化需要原文）
+RESUME_SUMMARY_WORKERS = 2  # 后台生成摘要的线程数
+RESUME_SUMMARY_VERSION = 1  # 摘要格式或提示词变化时加1，已保存的摘要全部失效
+RESUME_SUMMARY_RETRY_INTERVAL = 600  # AI摘要失败后先使用本地摘要，该时间（秒）后才再次尝试AI
+
+# 近似重复检测配置（MinHash + LSH）：重新上传的简历和几乎相同的JD复用已有分析结果
+SIMILARITY_REUSE_ENABLED = os.environ.get('SIMILARITY_REUSE_ENABLED', '1') == '1'
+SIMILARITY_THRESHOLDS = {
+    'resume': float(os.environ.get('RESUME_SIMILARITY_THRESHOLD', 0.9)),  # 简历相似度阈值（Jaccard估计值）
+    'jd': float(os.environ.get('JD_SIMILARITY_THRESHOLD', 0.85))  # JD相似度阈值
+}
+MINHASH_PERMUTATIONS = 128  # 签名长度
+LSH_BANDS = 16  # 分段数，每段8个值；相似度0.9的文本成为候选的概率>99.9%，0.5的约6%
+SHINGLE_SIZE = 4  # 按字符取4-gram
+
+# 用户用量统计配置（按用户/日期/任务/模型在内存汇总，定期批量写入token_usage表）
+USAGE_FLUSH_INTERVAL = 10  # 写入间隔（秒）
+USAGE_FLUSH_MAX_KEYS = 500  # 内存中待写入的汇总条目超过该值时提前写入
+MODEL_PRICES = {  # 每百万token价格（元）：(输入, 输出)，未列出的模型费用按0计
+    'Qwen/Qwen2.5-72B-Instruct': (4.13, 4.13),
+    'Qwen/Qwen2.5-32B-Instruct': (1.26, 1.26),
+    'Qwen/Qwen2.5-7B-Instruct': (0, 0)
+}
+ADMIN_USER_IDS = {int(x) for x in os.environ.get('ADMIN_USER_IDS', '').split(',') if x.strip()}  # 可查询用量的管理员用户ID
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # /metrics 的抓取token（Authorization: Bearer <token>），为空时只有管理员可访问
+
+# 模型路由配置：按 (任务, 会员等级) 选择模型和最大输出token
+# 路由到的模型在provider池中各自独立限流（SiliconFlow按模型分别计算RPM/TPM），免费流量不占用大模型的额度
+MODEL_ROUTING_ENABLED = os.environ.get('MODEL_ROUTING_ENABLED', '0') == '1'  # 默认关闭，按路由指标确认各模型的输出质量后再开启
+MODEL_SMALL = 'Qwen/Qwen2.5-7B-Instruct'  # 小模型：首字快，免费
+MODEL_MEDIUM = 'Qwen/Qwen2.5-32B-Instruct'
+MODEL_ROUTES = {  # 任务 -> {会员等级(0免费/1专业版/2尊享版): (模型, 最大输出token)}；模型None为主provider的模型，token None为不限制
+    'analyze': {0: (MODEL_MEDIUM, 3000), 1: (None, 4000)},
+    'optimize': {0: (MODEL_MEDIUM, 3000), 1: (None, 4000)},
+    'predict': {0: (MODEL_SMALL, 2000), 1: (MODEL_MEDIUM, 3000), 2: (None, 4000)},
+    'match': {0: (MODEL_MEDIUM, 3000), 1: (None, 4000)},
+    # 面试题（12-15题，每题150字以上参考回答）和自我介绍的长度由提示词要求决定，不限制输出token，否则截断后只能返回默认内容
+    'interview': {0: (MODEL_SMALL, None), 1: (MODEL_MEDIUM, None), 2: (None, None)},
+    'self-intro': {0: (MODEL_SMALL, None), 1: (MODEL_MEDIUM, None), 2: (None, None)},
+    'combined': {0: (MODEL_MEDIUM, None), 1: (None, None)},
+    'match-multi': {0: (MODEL_MEDIUM, None), 1: (None, None)},  # 多JD匹配的输出token按JD数计算
+    'summary': {0: (MODEL_MEDIUM, 1500)}  # 简历摘要按简历文本共享，不区分等级
+}
+MODEL_ROUTE_MODELS = sorted({model for table in MODEL_ROUTES.values() for model, _ in table.values() if model})
+MODEL_ROUTE_TIER_TTL = 60  # 用户会员等级的缓存时间（秒）
+
+# 后台任务队列配置（worker.py 执行队列中的LLM任务）
+JOB_QUEUE_BACKEND = os.environ.get('JOB_QUEUE_BACKEND', 'sqlite')
+JOB_QUEUE_DB_PATH = os.path.join(APP_DIR, 'data', 'jobs.db')
+JOB_LEASE_TIMEOUT = 300  # running超过该时间（秒）视为worker已退出，重新排队
+JOB_MAX_ATTEMPTS = 3  # 单个任务最多执行次数
+JOB_RESULT_TTL = 24 * 3600  # 已结束任务保留时间（秒）
+JOB_LONG_POLL_MAX = 30  # 查询任务时最长等待（秒）
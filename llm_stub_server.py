@@ -0,0 +1,529 @@
+"""
+本地OpenAI兼容stub服务器
+模拟 /chat/completions（含流式）用于压测，不消耗真实token；支持延迟分布、错误注入和录制/回放：
+
+    python llm_stub_server.py                                      # 内置响应，延迟 lognormal 中位数2秒
+    python llm_stub_server.py --latency uniform:0.5,3 --error-rate 0.05 --rate-limit-rate 0.02
+    python llm_stub_server.py --mode record --upstream https://api.siliconflow.cn/v1   # 转发并录制到fixtures
+    python llm_stub_server.py --mode replay --latency recorded --strict              # 按录制的内容和延迟回放
+
+应用通过环境变量指向stub：API_BASE_URL=http://127.0.0.1:8900/v1 API_KEY=stub python app.py
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+import requests
+
+from utils.rate_limiter import estimate_tokens
+
+DEFAULT_FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'llm_fixtures')
+# 流式响应每个chunk的字符数
+STREAM_CHUNK_SIZE = 24
+
+# 按提示词开头识别任务（与 utils/ai_client.py 中的提示词对应）
+TASK_MARKERS = [
+    ('[Combined Resume Analysis]', 'combined'),
+    ('作为资深HR专家', 'analyze'),
+    ('生成具体的优化建议', 'optimize'),
+    ('面试筛选的概率', 'predict'),
+    ('[Precise Job Matching Analysis]', 'match'),
+    ('[Multi Job Matching Analysis]', 'match_multi'),
+    ('[Interview Prep]', 'interview'),
+    ('[Self-Introduction Customization]', 'self_intro'),
+    ('[Resume Summary]', 'summary')
+]
+_COMBINED_KEYS = re.compile(r'top-level keys are exactly: (.+)')
+_JD_HEADERS = re.compile(r'^\[JD (\d+)\]', re.M)
+
+CANNED_RESPONSES = {
+    'analyze': {
+        'score': 78,
+        'overall_assessment': '简历基础较好，针对性优化后可投递',
+        'dimensions': {
+            'completeness': {'score': 85, 'issues': [], 'suggestions': ['补充求职意向']},
+            'format': {'score': 80, 'issues': ['日期格式不统一'], 'suggestions': ['统一日期格式']},
+            'content': {'score': 75, 'issues': ['部分描述缺少行动动词'], 'suggestions': ['以动词开头描述职责']},
+            'quantifiable': {'score': 65, 'issues': ['量化成果较少'], 'suggestions': ['用数字描述成果']},
+            'keywords': {'hard_skills': ['Python', 'MySQL', 'Redis'], 'soft_skills': ['团队协作'],
+                         'missing_keywords': ['Docker', 'Kubernetes'], 'suggestions': ['补充容器化相关经验']},
+            'ats_friendly': {'score': 82, 'issues': [], 'suggestions': []}
+        },
+        'strengths': ['项目经历与岗位相关', '技术栈清晰'],
+        'weaknesses': ['量化成果较少'],
+        'suggestions': ['每段经历补充1-2个量化结果', '突出核心项目'],
+        'recommended_positions': ['后端开发工程师', 'Python开发工程师'],
+        'priority_actions': ['补充量化成果', '统一格式']
+    },
+    'optimize': {
+        'work_experience_suggestions': [{
+            'company': '某科技公司',
+            'original_description': '负责后端开发',
+            'optimized_description': '主导订单服务重构，接口响应时间降低40%',
+            'improvement_points': ['使用行动动词', '量化成果']
+        }],
+        'quantification_suggestions': ['写出系统规模（QPS、用户数）', '写出效率提升比例'],
+        'keyword_suggestions': {'to_add': ['Docker'], 'to_highlight': ['Python']},
+        'format_suggestions': ['每条经历控制在3-5个要点'],
+        'overall_improvement_plan': '先补充量化成果，再按目标岗位调整技能关键词顺序'
+    },
+    'predict': {
+        'interview_rate': 68,
+        'interview_rate_label': '中等',
+        'passing_factors': ['技能与岗位匹配'],
+        'risk_factors': ['缺少大型项目经验'],
+        'improvement_to_increase_rate': ['补充高并发相关项目'],
+        'similar_success_cases': '类似背景候选人通过补充项目细节获得面试'
+    },
+    'match': {
+        'match_score': 72,
+        'matched_skills': ['Python', 'MySQL', 'Redis'],
+        'missing_skills': ['Kubernetes（可培养）'],
+        'matched_experiences': ['3年后端开发经验'],
+        'suggestions': ['在项目经历中体现容器化部署经验'],
+        'match_details': '核心技能匹配，缺少云原生相关经验'
+    },
+    'interview': {
+        'interview_questions': [
+            {
+                'type': type_name,
+                'question': f'{type_name}问题{index + 1}',
+                'answer_points': ['背景', '行动', '结果'],
+                'sample_answer': '我在上一份工作中负责订单系统的重构，' * 6,
+                'tips': '结合具体数据回答'
+            }
+            for index, type_name in enumerate(['自我介绍', '求职动机', '求职动机'] + ['简历深挖'] * 4
+                                              + ['专业能力'] * 4 + ['行为面试'] * 2 + ['开放问题'])
+        ]
+    },
+    'self_intro': {
+        'one_minute': '面试官您好，我有3年后端开发经验，主导过订单系统重构。' * 3,
+        'three_minutes': '面试官您好，我有3年后端开发经验。' * 20,
+        'key_points': ['后端开发经验', '系统重构', '性能优化']
+    },
+    'summary': {
+        'name': '张三',
+        'headline': '后端工程师，3年经验，专注高并发服务',
+        'roles': [{'title': '某某科技有限公司 后端工程师', 'period': '2021.07 - 至今',
+                   'highlights': ['主导订单系统重构，接口响应时间降低40%']}],
+        'projects': [{'title': '实时推荐平台', 'period': '2022.03 - 2022.12',
+                      'highlights': ['基于Kafka搭建实时特征管道，点击率提升15%']}],
+        'education': ['2017.09-2021.06 某某大学 计算机科学与技术 本科'],
+        'skills': ['Python', 'MySQL', 'Redis', 'Kafka'],
+        'achievements': []
+    }
+}
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], Optional[float]]:
+    """
+    解析延迟分布
+
+    Args:
+        spec: fixed:秒 / uniform:最小,最大 / lognormal:中位数,sigma / recorded（回放时使用录制的延迟）
+
+    Returns:
+        采样函数，返回秒数；recorded返回None
+    """
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',') if v.strip()]
+    if kind == 'fixed' and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == 'uniform' and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == 'lognormal' and len(values) == 2:
+        # 长尾分布，sigma=0.5时p99约为中位数的3.2倍
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    if kind == 'recorded' and not values:
+        return lambda rng: None
+    raise ValueError(f'无效的延迟分布: {spec}')
+
+
+def fixture_key(body: dict) -> str:
+    """
+    请求的fixture键：只取消息、温度和最大token数
+    不含model和stream，路由到不同模型或改用流式时仍能命中同一录制
+    """
+    material = {
+        'messages': body.get('messages', []),
+        'temperature': body.get('temperature'),
+        'max_tokens': body.get('max_tokens')
+    }
+    return hashlib.sha256(json.dumps(material, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def detect_task(body: dict) -> str:
+    """按最后一条用户消息识别任务"""
+    prompt = ''
+    for message in body.get('messages', []):
+        if message.get('role') == 'user':
+            prompt = message.get('content') or ''
+    for marker, task in TASK_MARKERS:
+        if marker in prompt[:200]:
+            return task
+    return 'general'
+
+
+def canned_content(body: dict, responses: dict = None) -> str:
+    """按任务返回内置响应"""
+    responses = responses or CANNED_RESPONSES
+    task = detect_task(body)
+    if task == 'combined':
+        prompt = body['messages'][-1].get('content', '')
+        match = _COMBINED_KEYS.search(prompt)
+        names = re.findall(r'"(\w+)"', match.group(1)) if match else list(responses)
+        return json.dumps({name: responses[name] for name in names if name in responses}, ensure_ascii=False)
+    if task == 'match_multi' and 'match' in responses:
+        prompt = body['messages'][-1].get('content', '')
+        matches = [dict(responses['match'], jd=int(n)) for n in _JD_HEADERS.findall(prompt)]
+        return json.dumps({'matches': matches}, ensure_ascii=False)
+    if task in responses:
+        return json.dumps(responses[task], ensure_ascii=False)
+    return 'OK'
+
+
+class StubServer(ThreadingHTTPServer):
+    """保存stub配置、fixtures和统计的HTTP服务器"""
+    
+    daemon_threads = True
+    
+    def __init__(self, address, mode: str = 'canned', latency: str = 'lognormal:2,0.5',
+                 ttft_ratio: float = 0.2, error_rate: float = 0, error_status: int = 503,
+                 rate_limit_rate: float = 0, retry_after: int = 1, timeout_rate: float = 0,
+                 hang_seconds: float = 120, fixtures_dir: str = DEFAULT_FIXTURES_DIR,
+                 upstream: str = '', upstream_key: str = '', strict: bool = False,
+                 responses: dict = None, seed: Optional[int] = None, stream_usage: bool = True):
+        super().__init__(address, StubHandler)
+        self.mode = mode
+        self.sample_latency = parse_latency(latency)
+        self.ttft_ratio = ttft_ratio
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.fixtures_dir = fixtures_dir
+        self.upstream = upstream.rstrip('/')
+        self.upstream_key = upstream_key
+        self.strict = strict
+        self.responses = responses or CANNED_RESPONSES
+        self.stream_usage = stream_usage
+        self.stats = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def random(self) -> float:
+        with self._lock:
+            return self._rng.random()
+    
+    def latency(self, recorded: Optional[float] = None) -> float:
+        with self._lock:
+            value = self.sample_latency(self._rng)
+        if value is None:
+            value = recorded or 0
+        return max(0.0, value)
+    
+    def count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+    
+    def load_fixture(self, key: str) -> Optional[dict]:
+        path = os.path.join(self.fixtures_dir, f'{key}.json')
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def save_fixture(self, key: str, fixture: dict):
+        os.makedirs(self.fixtures_dir, exist_ok=True)
+        path = os.path.join(self.fixtures_dir, f'{key}.json')
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(fixture, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """OpenAI兼容接口：POST /chat/completions，GET /models，GET /stub/stats"""
+    
+    # keep-alive，与AIClient的连接池行为一致
+    protocol_version = 'HTTP/1.1'
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send_json(self, status: int, data: dict, headers: dict = None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_error(self, status: int, message: str, headers: dict = None):
+        self._send_json(status, {'error': {'message': message, 'type': 'stub_error'}}, headers)
+    
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+    
+    def do_GET(self):
+        path = self.path.split('?')[0].rstrip('/')
+        if path.endswith('/models'):
+            self._send_json(200, {'object': 'list', 'data': [{'id': 'stub-model', 'object': 'model'}]})
+        elif path == '/stub/stats':
+            with self.server._lock:
+                stats = dict(self.server.stats)
+            self._send_json(200, stats)
+        else:
+            self._send_error(404, f'Unknown path: {self.path}')
+    
+    def do_POST(self):
+        if not self.path.split('?')[0].rstrip('/').endswith('/chat/completions'):
+            self._send_error(404, f'Unknown path: {self.path}')
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        except ValueError:
+            self._send_error(400, 'Invalid JSON body')
+            return
+        
+        server = self.server
+        task = detect_task(body)
+        server.count('requests')
+        server.count(f'task:{task}')
+        
+        if server.mode != 'record' and self._inject_error():
+            return
+        
+        key = fixture_key(body)
+        recorded_latency = None
+        if server.mode == 'record':
+            fixture = self._record(body, key, task)
+            if fixture is None:
+                return
+            content, usage = fixture['content'], fixture['usage']
+        else:
+            fixture = server.load_fixture(key) if server.mode == 'replay' else None
+            if fixture is not None:
+                server.count('fixture_hits')
+                content, usage, recorded_latency = fixture['content'], fixture['usage'], fixture.get('latency')
+            elif server.mode == 'replay' and server.strict:
+                server.count('fixture_misses')
+                self._send_error(404, f'No fixture for request {key[:12]} (task {task})')
+                return
+            else:
+                if server.mode == 'replay':
+                    server.count('fixture_misses')
+                    print(f"Fixture miss for {key[:12]} (task {task}), using canned response")
+                content = canned_content(body, server.responses)
+                usage = None
+        
+        if usage is None:
+            prompt_tokens = sum(estimate_tokens(m.get('content') or '') for m in body.get('messages', []))
+            completion_tokens = estimate_tokens(content)
+            usage = {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens
+            }
+        
+        # 录制模式已经历真实延迟，不再叠加
+        latency = 0.0 if server.mode == 'record' else server.latency(recorded_latency)
+        model = body.get('model') or 'stub-model'
+        if body.get('stream'):
+            # 与OpenAI一致：只有请求stream_options.include_usage时才在流式响应末尾返回usage
+            # stream_usage为False时模拟不支持stream_options的provider，流式响应从不返回usage
+            include_usage = server.stream_usage and (body.get('stream_options') or {}).get('include_usage')
+            self._stream(content, usage if include_usage else None, model, latency)
+        else:
+            time.sleep(latency)
+            self._send_json(200, {
+                'id': f'chatcmpl-stub-{key[:12]}',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                             'finish_reason': 'stop'}],
+                'usage': usage
+            })
+        server.count('status:200')
+    
+    def _inject_error(self) -> bool:
+        """按配置的比例注入429、5xx和超时，返回是否已处理该请求"""
+        server = self.server
+        roll = server.random()
+        if roll < server.rate_limit_rate:
+            server.count('status:429')
+            self._send_error(429, 'Rate limit exceeded (stub)', {'Retry-After': str(server.retry_after)})
+            return True
+        roll -= server.rate_limit_rate
+        if roll < server.error_rate:
+            server.count(f'status:{server.error_status}')
+            self._send_error(server.error_status, 'Injected upstream error (stub)')
+            return True
+        roll -= server.error_rate
+        if roll < server.timeout_rate:
+            # 挂起超过客户端读取超时，然后断开
+            server.count('timeouts')
+            time.sleep(server.hang_seconds)
+            self.close_connection = True
+            return True
+        return False
+    
+    def _record(self, body: dict, key: str, task: str) -> Optional[dict]:
+        """转发到真实provider（非流式）并保存为fixture，失败时原样返回上游错误"""
+        server = self.server
+        upstream_body = dict(body, stream=False)
+        start = time.monotonic()
+        try:
+            response = requests.post(
+                f'{server.upstream}/chat/completions',
+                headers={'Authorization': f'Bearer {server.upstream_key}', 'Content-Type': 'application/json'},
+                json=upstream_body,
+                timeout=(5, 300)
+            )
+        except requests.exceptions.RequestException as e:
+            server.count('upstream_errors')
+            self._send_error(502, f'Upstream request failed: {e}')
+            return None
+        latency = time.monotonic() - start
+        
+        if response.status_code != 200:
+            server.count(f'status:{response.status_code}')
+            headers = {'Retry-After': response.headers['Retry-After']} if 'Retry-After' in response.headers else None
+            self._send_error(response.status_code, response.text[:500], headers)
+            return None
+        
+        data = response.json()
+        fixture = {
+            'key': key,
+            'task': task,
+            'request': {k: v for k, v in body.items() if k != 'stream'},
+            'content': data['choices'][0]['message']['content'],
+            'usage': data.get('usage'),
+            'latency': round(latency, 3),
+            'recorded_at': time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        server.save_fixture(key, fixture)
+        server.count('recorded')
+        print(f"Recorded {task} fixture {key[:12]} ({latency:.2f}s)")
+        return fixture
+    
+    def _stream(self, content: str, usage: Optional[dict], model: str, latency: float):
+        """按SSE分块返回：首个chunk在 latency × ttft_ratio 后到达，其余均匀分布"""
+        chunks = [content[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(content), STREAM_CHUNK_SIZE)] or ['']
+        first_delay = latency * self.server.ttft_ratio
+        chunk_delay = (latency - first_delay) / len(chunks)
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        
+        time.sleep(first_delay)
+        created = int(time.time())
+        for index, text in enumerate(chunks):
+            if index:
+                time.sleep(chunk_delay)
+            event = {
+                'id': 'chatcmpl-stub',
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': {'content': text}, 'finish_reason': None}]
+            }
+            self._write_chunk(f'data: {json.dumps(event, ensure_ascii=False)}\n\n'.encode('utf-8'))
+        
+        final = {
+            'id': 'chatcmpl-stub',
+            'object': 'chat.completion.chunk',
+            'created': created,
+            'model': model,
+            'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]
+        }
+        if usage is not None:
+            final['usage'] = usage
+        self._write_chunk(f'data: {json.dumps(final, ensure_ascii=False)}\n\n'.encode('utf-8'))
+        self._write_chunk(b'data: [DONE]\n\n')
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地OpenAI兼容stub服务器（压测用）')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--mode', choices=['canned', 'record', 'replay'], default='canned',
+                        help='canned: 内置响应；record: 转发到--upstream并录制；replay: 回放fixtures')
+    parser.add_argument('--latency', default='lognormal:2,0.5',
+                        help='延迟分布：fixed:1.5 / uniform:0.5,3 / lognormal:中位数,sigma / recorded')
+    parser.add_argument('--ttft-ratio', type=float, default=0.2, help='流式响应首个chunk占总延迟的比例')
+    parser.add_argument('--error-rate', type=float, default=0, help='返回--error-status的比例')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--rate-limit-rate', type=float, default=0, help='返回429的比例')
+    parser.add_argument('--retry-after', type=int, default=1, help='429响应的Retry-After（秒）')
+    parser.add_argument('--timeout-rate', type=float, default=0, help='挂起不响应的比例')
+    parser.add_argument('--hang-seconds', type=float, default=120, help='挂起时长，应大于客户端读取超时')
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES_DIR, help='fixtures目录')
+    parser.add_argument('--upstream', default='', help='录制模式转发的provider base URL')
+    parser.add_argument('--upstream-key', default=os.environ.get('UPSTREAM_API_KEY', ''),
+                        help='录制模式使用的API Key，默认读取UPSTREAM_API_KEY')
+    parser.add_argument('--strict', action='store_true', help='回放时fixture缺失返回404而不是内置响应')
+    parser.add_argument('--responses', default='', help='JSON文件，按任务名覆盖内置响应')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子，固定后延迟和错误注入可复现')
+    parser.add_argument('--no-stream-usage', action='store_true',
+                        help='流式响应不返回usage（模拟忽略stream_options的provider）')
+    args = parser.parse_args()
+    
+    if args.mode == 'record' and not (args.upstream and args.upstream_key):
+        parser.error('--mode record 需要 --upstream 和 --upstream-key')
+    
+    responses = dict(CANNED_RESPONSES)
+    if args.responses:
+        with open(args.responses, 'r', encoding='utf-8') as f:
+            responses.update(json.load(f))
+    
+    server = StubServer(
+        (args.host, args.port),
+        mode=args.mode,
+        latency=args.latency,
+        ttft_ratio=args.ttft_ratio,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        timeout_rate=args.timeout_rate,
+        hang_seconds=args.hang_seconds,
+        fixtures_dir=args.fixtures,
+        upstream=args.upstream,
+        upstream_key=args.upstream_key,
+        strict=args.strict,
+        responses=responses,
+        seed=args.seed,
+        stream_usage=not args.no_stream_usage
+    )
+    print(f"LLM stub ({args.mode}) listening on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
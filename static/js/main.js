@@ -373,22 +373,27 @@ async function analyzeAll() {
     }
     
     var jdText = document.getElementById('jdInput').value.trim();
+    var revealed = false;
+    
+    // 首个结果到达后即展示结果区，其余内容继续流式填充
+    function revealResults() {
+        if (revealed) return;
+        revealed = true;
+        document.getElementById('loading').classList.remove('active');
+        document.getElementById('resultSection').classList.add('active');
+        document.getElementById('resultSection').scrollIntoView({ behavior: 'smooth' });
+    }
     
     showLoading(true);
     
     try {
-        await analyzeResume();
-        
-        if (jdText) {
-            await matchJob(jdText);
-        }
-        
-        await generateInterview(jdText);
-        await generateSelfIntro(jdText);
-        
-        document.getElementById('resultSection').classList.add('active');
-        document.getElementById('resultSection').scrollIntoView({ behavior: 'smooth' });
+        await Promise.all([
+            analyzeAndMatch(jdText).then(revealResults),
+            generateInterview(jdText, revealResults),
+            generateSelfIntro(jdText, revealResults)
+        ]);
         
+        revealResults();
         showToast('分析完成', 'success');
     } catch (error) {
         showToast('分析失败，请重试', 'error');
@@ -398,6 +403,68 @@ async function analyzeAll() {
     }
 }
 
+async function analyzeAndMatch(jdText) {
+    var response = await fetchWithAuth('/api/analyze-all', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            resume_id: currentResumeId,
+            jd_text: jdText || '',
+            tasks: ['analyze', 'match']
+        })
+    });
+
+    var result = await response.json();
+
+    if (!result.success) {
+        throw new Error(result.error || '分析失败');
+    }
+
+    if (result.data.analyze) {
+        renderResumeAnalysis(result.data.analyze);
+        if (result.data.analyze.pending_enrichment) {
+            pollEnrichment(currentResumeId, 0);
+        }
+    }
+    if (result.data.match) renderJobMatch(result.data.match);
+}
+
+async function readEventStream(response, onEvent) {
+    var contentType = response.headers.get('Content-Type') || '';
+    if (contentType.indexOf('text/event-stream') === -1) {
+        var result = await response.json();
+        throw new Error(result.error || '请求失败');
+    }
+    
+    var reader = response.body.getReader();
+    var decoder = new TextDecoder('utf-8');
+    var buffer = '';
+    
+    while (true) {
+        var chunk = await reader.read();
+        if (chunk.done) break;
+        
+        buffer += decoder.decode(chunk.value, { stream: true });
+        var messages = buffer.split('\n\n');
+        buffer = messages.pop();
+        
+        messages.forEach(function(message) {
+            var event = 'message';
+            var data = '';
+            message.split('\n').forEach(function(line) {
+                if (line.indexOf('event:') === 0) {
+                    event = line.slice(6).trim();
+                } else if (line.indexOf('data:') === 0) {
+                    data += line.slice(5).trim();
+                }
+            });
+            if (data) {
+                onEvent(event, JSON.parse(data));
+            }
+        });
+    }
+}
+
 async function analyzeResume() {
     var response = await fetchWithAuth('/api/analyze', {
         method: 'POST',
@@ -409,9 +476,36 @@ async function analyzeResume() {
 
     if (result.success) {
         renderResumeAnalysis(result.data);
+        if (result.data.pending_enrichment) {
+            pollEnrichment(currentResumeId, 0);
+        }
     }
 }
 
+// 简历分析超过响应时限时先显示本地规则结果，后台AI分析完成后替换
+var ENRICHMENT_POLL_INTERVAL = 3000;
+var ENRICHMENT_POLL_MAX_ATTEMPTS = 40;
+
+function pollEnrichment(resumeId, attempt) {
+    if (attempt >= ENRICHMENT_POLL_MAX_ATTEMPTS || resumeId !== currentResumeId) return;
+    
+    setTimeout(async function() {
+        try {
+            var response = await fetchWithAuth('/api/resumes/' + resumeId + '/results?type=analyze');
+            var result = await response.json();
+            if (resumeId !== currentResumeId) return;
+            if (result.success && !result.pending_enrichment) {
+                renderResumeAnalysis(result.data);
+                showToast('AI分析已完成，结果已更新', 'success');
+                return;
+            }
+        } catch (error) {
+            console.error('Poll enrichment error:', error);
+        }
+        pollEnrichment(resumeId, attempt + 1);
+    }, ENRICHMENT_POLL_INTERVAL);
+}
+
 async function matchJob(jdText) {
     var response = await fetchWithAuth('/api/match', {
         method: 'POST',
@@ -429,8 +523,8 @@ async function matchJob(jdText) {
     }
 }
 
-async function generateInterview(jdText) {
-    var response = await fetchWithAuth('/api/interview', {
+async function generateInterview(jdText, onContent) {
+    var response = await fetchWithAuth('/api/interview/stream', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -439,15 +533,23 @@ async function generateInterview(jdText) {
         })
     });
 
-    var result = await response.json();
-
-    if (result.success) {
-        renderInterview(result.data);
-    }
+    var questions = [];
+    
+    await readEventStream(response, function(event, data) {
+        if (event === 'question') {
+            questions.push(data);
+            renderInterview({ interview_questions: questions });
+        } else if (event === 'done') {
+            renderInterview(data);
+        } else if (event === 'error') {
+            throw new Error(data.error);
+        }
+        if (onContent) onContent();
+    });
 }
 
-async function generateSelfIntro(jdText) {
-    var response = await fetchWithAuth('/api/self-intro', {
+async function generateSelfIntro(jdText, onContent) {
+    var response = await fetchWithAuth('/api/self-intro/stream', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -456,11 +558,19 @@ async function generateSelfIntro(jdText) {
         })
     });
 
-    var result = await response.json();
-
-    if (result.success) {
-        renderSelfIntro(result.data);
-    }
+    var sections = {};
+    
+    await readEventStream(response, function(event, data) {
+        if (event === 'section') {
+            sections[data.key] = data.value;
+            renderSelfIntro(sections);
+        } else if (event === 'done') {
+            renderSelfIntro(data);
+        } else if (event === 'error') {
+            throw new Error(data.error);
+        }
+        if (onContent) onContent();
+    });
 }
 
 function renderResumeAnalysis(data) {
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+单元测试 - 后台任务队列（无需启动服务器）
+"""
+import unittest
+import sys
+import os
+import time
+import tempfile
+import threading
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.job_queue import JobBackend, SQLiteJobBackend, JobWorker, wait_for_job
+
+
+class TestSQLiteJobBackend(unittest.TestCase):
+    """SQLite任务队列测试"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.backend = SQLiteJobBackend(os.path.join(self.tmpdir, 'jobs.db'))
+    
+    def test_each_job_claimed_once(self):
+        """多个worker并发领取时每个任务只被领取一次"""
+        job_ids = {self.backend.enqueue('analyze', {'resume_id': i}) for i in range(20)}
+        claimed = []
+        
+        def _claim():
+            while True:
+                job = self.backend.claim('w')
+                if job is None:
+                    return
+                claimed.append(job['id'])
+        
+        threads = [threading.Thread(target=_claim) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(sorted(claimed), sorted(job_ids))
+    
+    def test_worker_runs_handlers(self):
+        """worker执行处理函数；参数错误直接失败，其他异常重新排队"""
+        ok_id = self.backend.enqueue('analyze', {'resume_id': 1})
+        bad_id = self.backend.enqueue('match', {'resume_id': 1})
+        flaky_id = self.backend.enqueue('interview', {'resume_id': 1})
+        attempts = []
+        
+        def _flaky(params):
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError('provider down')
+            return {'questions': []}
+        
+        def _bad(params):
+            raise ValueError('请提供岗位JD')
+        
+        worker = JobWorker({'analyze': lambda p: {'score': p['resume_id']}, 'match': _bad,
+                            'interview': _flaky}, backend=self.backend)
+        while worker.run_once():
+            pass
+        
+        self.assertEqual(self.backend.get(ok_id)['result'], {'score': 1})
+        self.assertEqual(self.backend.get(bad_id)['status'], 'failed')
+        self.assertEqual(self.backend.get(bad_id)['error'], '请提供岗位JD')
+        flaky = self.backend.get(flaky_id)
+        self.assertEqual((flaky['status'], flaky['attempts']), ('done', 2))
+    
+    def test_stale_job_requeued(self):
+        """worker崩溃后超时的任务重新排队"""
+        job_id = self.backend.enqueue('analyze', {})
+        self.backend.claim('crashed')
+        self.assertEqual(self.backend.requeue_stale(lease_timeout=60), 0)
+        time.sleep(0.05)
+        self.assertEqual(self.backend.requeue_stale(lease_timeout=0.01), 1)
+        self.assertEqual(self.backend.get(job_id)['status'], 'queued')
+    
+    def test_long_poll(self):
+        """长轮询在任务完成后立即返回"""
+        job_id = self.backend.enqueue('analyze', {})
+        threading.Timer(0.3, lambda: self.backend.complete(job_id, {'ok': True})).start()
+        started = time.monotonic()
+        job = wait_for_job(job_id, 5, backend=self.backend)
+        self.assertEqual(job['status'], 'done')
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertIsNone(wait_for_job('missing', 1, backend=self.backend))
+    
+    def test_incomplete_backend_rejected(self):
+        """未实现全部接口的队列实现在创建时即报错"""
+        class _PartialBackend(JobBackend):
+            def enqueue(self, task, params):
+                return 'job'
+        
+        with self.assertRaises(TypeError):
+            _PartialBackend()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,1351 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+单元测试 - AI客户端基础组件（无需启动服务器）
+"""
+import unittest
+import sys
+import os
+import json
+import time
+import tempfile
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.llm_cache import LLMResponseCache, make_cache_key
+from utils.json_stream import JSONStreamParser, parse_json_strict, parse_json_tolerant
+from utils.resilience import CircuitBreaker, compute_backoff, parse_retry_after
+from utils.provider_pool import ProviderPool
+from utils.rate_limiter import RateLimiter, RateLimitExceeded, estimate_tokens
+from utils.metrics import Histogram, LLMMetrics
+from utils.singleflight import SingleFlight
+from utils.prompt_compressor import compress_resume, normalize_text, split_sections
+from utils.local_analyzer import analyze_locally
+from utils.deadline import deadline_scope, submit_with_context, remaining as deadline_remaining
+from utils.similarity import SimilarityIndex, minhash_signature, estimate_similarity
+from utils.usage_tracker import UsageTracker, user_scope
+from utils.model_router import ModelRouter
+from utils.llm_scheduler import LLMScheduler
+from utils.resume_summary import ResumeSummaryStore, build_local_summary, render_summary, summary_key
+from llm_stub_server import StubServer, canned_content, fixture_key, parse_latency
+
+
+class TestLLMResponseCache(unittest.TestCase):
+    """LLM响应缓存测试"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmpdir, 'cache.db')
+    
+    def test_cache_key_is_content_addressed(self):
+        """相同请求内容生成相同的键，参数变化生成不同的键"""
+        messages = [{"role": "user", "content": "分析简历"}]
+        key1 = make_cache_key('model-a', 'sys', messages, 0.5, 4000)
+        key2 = make_cache_key('model-a', 'sys', list(messages), 0.5, 4000)
+        key3 = make_cache_key('model-a', 'sys', messages, 0.7, 4000)
+        self.assertEqual(key1, key2)
+        self.assertNotEqual(key1, key3)
+    
+    def test_memory_lru_eviction(self):
+        """内存层超过容量时淘汰最久未使用的条目"""
+        cache = LLMResponseCache(max_memory_entries=2, max_disk_entries=0, ttl=60, db_path=None)
+        cache.set('a', '1')
+        cache.set('b', '2')
+        cache.get('a')
+        cache.set('c', '3')
+        self.assertEqual(cache.get('a'), '1')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get_stats()['memory_evictions'], 1)
+    
+    def test_disk_tier_survives_restart(self):
+        """磁盘层在新实例中仍可命中"""
+        cache = LLMResponseCache(max_memory_entries=10, max_disk_entries=10, ttl=60, db_path=self.db_path)
+        cache.set('k', 'value')
+        reopened = LLMResponseCache(max_memory_entries=10, max_disk_entries=10, ttl=60, db_path=self.db_path)
+        self.assertEqual(reopened.get('k'), 'value')
+        self.assertEqual(reopened.get_stats()['disk_hits'], 1)
+    
+    def test_ttl_expiry(self):
+        """过期条目不再返回"""
+        cache = LLMResponseCache(max_memory_entries=10, max_disk_entries=10, ttl=0.05, db_path=self.db_path)
+        cache.set('k', 'value')
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('k'))
+        stats = cache.get_stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertGreaterEqual(stats['expired'], 1)
+
+
+class TestJSONStreamParser(unittest.TestCase):
+    """流式JSON解析测试"""
+    
+    QUESTIONS = '{"interview_questions": [{"type": "自我介绍", "question": "请介绍一下你自己"}, {"type": "技术能力", "question": "说说 {Redis} 的\\"持久化\\""}]}'
+    
+    def test_items_emitted_as_they_close(self):
+        """数组元素闭合即产出，与分块方式无关"""
+        for size in (1, 5, len(self.QUESTIONS)):
+            parser = JSONStreamParser()
+            events = []
+            for i in range(0, len(self.QUESTIONS), size):
+                events.extend(parser.feed(self.QUESTIONS[i:i + size]))
+            items = [e for e in events if e[0] == 'item']
+            self.assertEqual(len(items), 2)
+            self.assertEqual(items[1][2]['question'], '说说 {Redis} 的"持久化"')
+            self.assertEqual(len(parser.result()['interview_questions']), 2)
+    
+    def test_first_item_available_before_stream_ends(self):
+        """第一道题闭合后即可拿到，不必等待后续输出"""
+        parser = JSONStreamParser()
+        cut = self.QUESTIONS.index('}, {') + 1
+        events = parser.feed(self.QUESTIONS[:cut])
+        self.assertEqual(events, [('item', 'interview_questions', {"type": "自我介绍", "question": "请介绍一下你自己"})])
+    
+    def test_truncated_tail_is_recovered(self):
+        """被max_tokens截断时保留已完整的元素"""
+        truncated = '```json\n{"score": 80, "interview_questions": [{"question": "q1"}, {"question": "q2", "sample_answer": "我在XX项目中'
+        result = parse_json_tolerant(truncated)
+        self.assertEqual(result['score'], 80)
+        self.assertEqual(result['interview_questions'], [{"question": "q1"}])
+    
+    def test_fenced_and_trailing_comma(self):
+        """兼容代码块包裹、尾逗号和字符串内换行"""
+        text = '以下是结果：\n```json\n{"one_minute": "第一行\n第二行", "key_points": ["a", "b",],}\n```'
+        result = parse_json_tolerant(text)
+        self.assertEqual(result['key_points'], ['a', 'b'])
+        self.assertEqual(result['one_minute'], '第一行\n第二行')
+    
+    def test_unparseable_returns_empty(self):
+        """无JSON内容时返回空字典"""
+        self.assertEqual(parse_json_tolerant('抱歉，我无法完成'), {})
+    
+    def test_strict_rejects_truncated(self):
+        """严格解析接受代码块包裹的完整JSON，拒绝截断的输出"""
+        self.assertEqual(parse_json_strict('结果：\n```json\n{"score": 80}\n```'), {'score': 80})
+        self.assertIsNone(parse_json_strict('{"score": 80, "suggestions": ["a", "b'))
+        self.assertIsNone(parse_json_strict('抱歉，我无法完成'))
+        
+        from utils.ai_client import AIClient
+        client = AIClient.__new__(AIClient)
+        self.assertTrue(client._cacheable('match', '{"match_score": 80}', truncated=False))
+        self.assertFalse(client._cacheable('match', '{"match_score": 80}', truncated=True))
+        self.assertFalse(client._cacheable('match', '{"match_score": 80, "matched', truncated=False))
+        self.assertTrue(client._cacheable('general', 'OK', truncated=False))
+
+
+class TestResilience(unittest.TestCase):
+    """重试与熔断测试"""
+    
+    def test_breaker_opens_and_recovers(self):
+        """连续失败后熔断，冷却后只放行一个探测请求"""
+        breaker = CircuitBreaker('p', failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        self.assertFalse(breaker.allow_request())
+        time.sleep(0.1)
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+        self.assertEqual(breaker.get_stats()['times_opened'], 1)
+    
+    def test_failed_probe_reopens(self):
+        """半开状态下探测失败立即重新熔断"""
+        breaker = CircuitBreaker('p', failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.1)
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+    
+    def test_backoff_honors_retry_after(self):
+        """退避时间不超过上限，Retry-After过长时放弃重试"""
+        for attempt in range(6):
+            self.assertLessEqual(compute_backoff(attempt, 0.5, 4), 4)
+        self.assertGreaterEqual(compute_backoff(0, 0.5, 4, retry_after=2), 2)
+        self.assertIsNone(compute_backoff(0, 0.5, 4, retry_after=30))
+        self.assertEqual(parse_retry_after('3'), 3)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0)
+        self.assertIsNone(parse_retry_after('soon'))
+
+
+class TestProviderPool(unittest.TestCase):
+    """多provider路由测试"""
+    
+    def _pool(self, *names, rpm=0):
+        pool = ProviderPool()
+        pool.update([{
+            'id': f'test-{self._testMethodName}-{name}',
+            'api_base_url': f'http://{name}',
+            'api_key': 'k',
+            'model_name': name,
+            'provider_name': name,
+            'rpm': rpm
+        } for name in names])
+        return pool
+    
+    def _record(self, pool, provider, latency, ok=True, **kwargs):
+        pool.begin(provider)
+        pool.finish(provider, time.monotonic() - latency, ok=ok, **kwargs)
+    
+    def test_routes_by_latency_and_load(self):
+        """优先选择p95延迟低的provider，在途请求多时分流到其他provider"""
+        pool = self._pool('a', 'b')
+        fast, slow = pool.providers
+        self._record(pool, fast, 0.1)
+        self._record(pool, slow, 0.3)
+        self.assertIs(pool.select()[0], fast)
+        for _ in range(3):
+            pool.begin(fast)
+        self.assertIs(pool.select()[0], slow)
+    
+    def test_avoids_errors_and_rate_limits(self):
+        """错误率高或被限流的provider排到后面，已失败的provider被排除"""
+        pool = self._pool('a', 'b')
+        a, b = pool.providers
+        self._record(pool, a, 0.1)
+        self._record(pool, b, 0.2)
+        self._record(pool, a, 0.1, ok=False, retry_after=30)
+        self.assertIs(pool.select()[0], b)
+        self.assertIs(pool.select(exclude={b.id})[0], a)
+        self.assertIsNone(pool.select(exclude={a.id, b.id}))
+    
+    def test_update_keeps_stats(self):
+        """配置刷新后保留已有provider的统计"""
+        pool = self._pool('a')
+        self._record(pool, pool.providers[0], 0.1)
+        pool.update([dict(pool.providers[0].config, model_name='a2')])
+        self.assertEqual(pool.providers[0].total_requests, 1)
+        self.assertEqual(pool.providers[0].config['model_name'], 'a2')
+    
+    
+    def test_rate_limited_provider_is_skipped(self):
+        """排队过久的provider被跳过，全部超额时拒绝请求"""
+        pool = self._pool('a', 'b', rpm=6)
+        first, _ = pool.select(max_wait=0)
+        second, _ = pool.select(max_wait=0)
+        self.assertNotEqual(first.id, second.id)
+        with self.assertRaises(RateLimitExceeded):
+            pool.select(max_wait=0)
+    
+    def test_routed_models_fall_back_to_primary(self):
+        """路由模型的provider全部熔断时回退到非路由的主provider"""
+        from utils.resilience import get_circuit_breaker
+        base = {'api_base_url': 'http://a', 'api_key': 'k', 'provider_name': 'a'}
+        prefix = f'test-{self._testMethodName}'
+        pool = ProviderPool()
+        pool.update([
+            dict(base, id=f'{prefix}-big', model_name='big'),
+            dict(base, id=f'{prefix}-big@small', model_name='small', routed=True)
+        ])
+        self.assertEqual(pool.select(model='small')[0].id, f'{prefix}-big@small')
+        breaker = get_circuit_breaker(f'{prefix}-big@small')
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        self.assertEqual(pool.select(model='small')[0].id, f'{prefix}-big')
+        self.assertIsNone(pool.select(model='small', exclude={f'{prefix}-big'}))
+
+
+class TestRateLimiter(unittest.TestCase):
+    """客户端限流测试"""
+    
+    def test_requests_queue_then_reject(self):
+        """超出RPM额度的请求按顺序排队，等待超过上限时拒绝"""
+        limiter = RateLimiter('test', rpm=6)
+        self.assertEqual(limiter.try_reserve(0, max_wait=25), 0)
+        waits = [limiter.try_reserve(0, max_wait=25) for _ in range(2)]
+        self.assertAlmostEqual(waits[0], 10, delta=0.1)
+        self.assertAlmostEqual(waits[1], 20, delta=0.1)
+        self.assertIsNone(limiter.try_reserve(0, max_wait=25))
+        self.assertEqual(limiter.get_stats()['rejected'], 1)
+    
+    def test_token_budget_is_settled(self):
+        """TPM按预估预扣，按实际用量退还"""
+        limiter = RateLimiter('test', tpm=600)
+        self.assertEqual(limiter.try_reserve(100, max_wait=0), 0)
+        self.assertIsNone(limiter.try_reserve(100, max_wait=0))
+        limiter.release(80)
+        self.assertEqual(limiter.try_reserve(80, max_wait=0), 0)
+    
+    def test_estimate_tokens(self):
+        """中文按字计，英文约4个字符1个token"""
+        self.assertEqual(estimate_tokens('熟悉Python'), 4)
+        self.assertEqual(estimate_tokens(''), 0)
+
+
+class TestLLMMetrics(unittest.TestCase):
+    """LLM调用指标测试"""
+    
+    def test_histogram_quantiles(self):
+        """分位数落在对应的分桶区间内"""
+        histogram = Histogram()
+        for _ in range(90):
+            histogram.observe(0.4)
+        for _ in range(10):
+            histogram.observe(10)
+        self.assertTrue(0.25 <= histogram.quantile(0.5) <= 0.5)
+        self.assertTrue(8 <= histogram.quantile(0.95) <= 13)
+        self.assertIsNone(Histogram().quantile(0.5))
+    
+    def test_concurrent_counts(self):
+        """多线程并发记录不丢计数"""
+        import threading
+        metrics = LLMMetrics()
+        
+        def _worker():
+            for _ in range(500):
+                metrics.record_call('analyze', 0.1, True, {'prompt_tokens': 2, 'completion_tokens': 1})
+        
+        threads = [threading.Thread(target=_worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        summary = metrics.summary()['analyze']
+        self.assertEqual(summary['calls'], 4000)
+        self.assertEqual(summary['prompt_tokens'], 8000)
+    
+    def test_prometheus_format(self):
+        """导出Prometheus直方图和计数器"""
+        metrics = LLMMetrics()
+        metrics.record_call('match', 1.5, False)
+        metrics.record_cache_hit('match')
+        text = metrics.render_prometheus()
+        self.assertIn('llm_requests_total{task="match",status="error"} 1', text)
+        self.assertIn('llm_request_duration_seconds_bucket{task="match",le="2"} 1', text)
+        self.assertIn('llm_request_duration_seconds_count{task="match"} 1', text)
+        self.assertIn('llm_cache_hits_total{task="match"} 1', text)
+
+
+class TestSingleFlight(unittest.TestCase):
+    """相同请求合并测试"""
+    
+    def test_concurrent_calls_share_result(self):
+        """并发的相同请求只执行一次"""
+        from concurrent.futures import ThreadPoolExecutor
+        flight = SingleFlight()
+        calls = []
+        
+        def _slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'result'
+        
+        with ThreadPoolExecutor(5) as executor:
+            results = list(executor.map(lambda _: flight.do('k', _slow), range(5)))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([value for value, _ in results], ['result'] * 5)
+        self.assertEqual(sum(shared for _, shared in results), 4)
+        self.assertEqual(flight.in_flight(), 0)
+    
+    def test_abandoned_leader(self):
+        """发起方放弃后等待方自行执行"""
+        from concurrent.futures import ThreadPoolExecutor
+        flight = SingleFlight()
+        call, leader = flight.begin('k')
+        self.assertTrue(leader)
+        with ThreadPoolExecutor(1) as executor:
+            future = executor.submit(flight.do, 'k', lambda: 'own')
+            time.sleep(0.1)
+            self.assertFalse(future.done())
+            flight.finish('k', call, abandoned=True)
+            self.assertEqual(future.result(timeout=1), ('own', False))
+    
+    def test_waiter_respects_deadline(self):
+        """等待方最多等到自己的截止时间"""
+        flight = SingleFlight()
+        call, _ = flight.begin('k')
+        started = time.monotonic()
+        with deadline_scope(0.2):
+            with self.assertRaises(TimeoutError):
+                flight.do('k', lambda: 'own')
+        self.assertLess(time.monotonic() - started, 1)
+        flight.finish('k', call, 'result')
+
+
+class TestAnalyzeBatch(unittest.TestCase):
+    """批量分析测试"""
+    
+    def test_duplicate_resumes_analyzed_once(self):
+        """内容相同的简历只分析一次，结果分发给所有ID"""
+        from utils.analyzer import ResumeAnalyzer
+        analyzer = ResumeAnalyzer.__new__(ResumeAnalyzer)
+        calls = []
+        
+        def _analyze_all(resume_text, jd_text='', tasks=None, **kwargs):
+            calls.append(resume_text)
+            return {'results': {'analyze': {'text': resume_text}}, 'errors': {}}
+        
+        analyzer.analyze_all = _analyze_all
+        outcomes = dict(
+            (tuple(ids), outcome['results']['analyze']['text'])
+            for ids, outcome in analyzer.analyze_batch([(1, 'a'), (2, 'b'), (3, 'a')])
+        )
+        self.assertEqual(sorted(calls), ['a', 'b'])
+        self.assertEqual(outcomes, {(1, 3): 'a', (2,): 'b'})
+    
+    def test_failed_resume_reported(self):
+        """单份简历异常不影响其他简历"""
+        from utils.analyzer import ResumeAnalyzer
+        analyzer = ResumeAnalyzer.__new__(ResumeAnalyzer)
+        
+        def _analyze_all(resume_text, jd_text='', tasks=None, **kwargs):
+            if resume_text == 'bad':
+                raise RuntimeError('boom')
+            return {'results': {'analyze': {}}, 'errors': {}}
+        
+        analyzer.analyze_all = _analyze_all
+        outcomes = {ids[0]: outcome for ids, outcome in analyzer.analyze_batch([(1, 'ok'), (2, 'bad')])}
+        self.assertIn('analyze', outcomes[1]['results'])
+        self.assertEqual(outcomes[2]['errors'], {'batch': 'boom'})
+
+
+class TestCombinedAnalysis(unittest.TestCase):
+    """合并调用测试"""
+    
+    def _make_analyzer(self, sections):
+        from utils.analyzer import ResumeAnalyzer
+        calls = []
+        
+        class _FakeAI:
+            def analyze_combined(self, resume_text, jd_text, tasks):
+                calls.append(('combined', sorted(tasks)))
+                return {name: value for name, value in sections.items() if name in tasks}
+            
+            def match_jd(self, resume_text, jd_text):
+                calls.append(('match', None))
+                return {'match_score': 60}
+            
+            def generate_self_introduction(self, resume_text, jd_text):
+                calls.append(('self_intro', None))
+                return {'one_minute': 'fallback'}
+        
+        analyzer = ResumeAnalyzer.__new__(ResumeAnalyzer)
+        analyzer.ai = _FakeAI()
+        return analyzer, calls
+    
+    def test_sections_split_into_task_results(self):
+        """合并结果拆分为各任务原有的结构"""
+        analyzer, calls = self._make_analyzer({
+            'analyze': {'score': 80},
+            'match': {'match_score': 90},
+            'interview': {'interview_questions': [{'question': 'q'}]},
+            'self_intro': {'one_minute': 'hi'}
+        })
+        outcome = analyzer.analyze_all('Python 工程师', 'JD', combined=True)
+        self.assertEqual(calls, [('combined', ['analyze', 'interview', 'match', 'self_intro'])])
+        results = outcome['results']
+        self.assertEqual(results['analyze']['analysis'], {'score': 80})
+        self.assertIn('skills', results['analyze'])
+        self.assertGreaterEqual(len(results['interview']['interview_questions']), 12)
+        self.assertEqual(results['match'], {'match_score': 90})
+    
+    def test_missing_sections_fall_back(self):
+        """缺失的部分单独调用"""
+        analyzer, calls = self._make_analyzer({'match': {'match_score': 90}})
+        outcome = analyzer.analyze_all('简历', 'JD', tasks=['match', 'self_intro'], combined=True)
+        self.assertEqual(calls, [('combined', ['match', 'self_intro']), ('self_intro', None)])
+        self.assertEqual(outcome['results']['self_intro'], {'one_minute': 'fallback'})
+
+
+class TestPromptCompressor(unittest.TestCase):
+    """提示词压缩测试"""
+    
+    def test_normalize_removes_noise(self):
+        """合并空白、去掉表格线、重复行和重复单元格"""
+        text = '张三   简历 第1页\n\n\n|  |  |\n张三 张三 张三\n张三   简历 第1页\n负责后端开发'
+        self.assertEqual(normalize_text(text), '张三 简历 第1页\n张三\n负责后端开发')
+    
+    def test_short_text_unchanged(self):
+        """未超出预算时只做清理"""
+        self.assertEqual(compress_resume('张三\n工作经历\nPython开发', budget=100), '张三\n工作经历\nPython开发')
+    
+    def test_relevant_sections_kept_within_budget(self):
+        """超出预算时优先保留与JD相关的章节，并保持原文顺序"""
+        text = ('张三 13800000000\n'
+                '工作经历\n2016-01 - 2018-01 某公司 会计\n' + '负责财务报表和税务申报工作，' * 20 + '\n'
+                '2018-01 - 至今 某科技 后端工程师\n使用Python和Django开发支付系统，优化MySQL查询\n'
+                '专业技能\nPython Django MySQL Redis')
+        result = compress_resume(text, 'match', 'Python Django MySQL Redis 后端', budget=80)
+        self.assertLessEqual(estimate_tokens(result), 80)
+        self.assertTrue(result.startswith('张三'))
+        self.assertIn('使用Python和Django开发支付系统', result)
+        self.assertIn('Python Django MySQL Redis', result)
+        self.assertNotIn('税务申报', result)
+        self.assertLess(result.index('后端工程师'), result.index('专业技能'))
+    
+    def test_dated_lines_are_not_headers(self):
+        """只有整行是标题的短行才开始新章节，带时间的经历和教育条目留在所属章节"""
+        text = ('张三\n工作经历：\n2018-01 - 至今 某科技 后端工程师\n负责工作经历系统开发\n'
+                '教育背景\n2014-09 - 2018-06 某大学 计算机\n专业技能\nPython')
+        self.assertEqual([kind for kind, _ in split_sections(text)], ['basic', 'work', 'education', 'skills'])
+    
+    def test_numbered_and_bracketed_headers(self):
+        """带序号、符号或括号的标题行也开始新章节，正文中的序号行不受影响"""
+        text = ('张三\n一、工作经历\n2018-01 - 至今 某科技 后端工程师\n1. 负责支付系统开发\n'
+                '【项目经历】\n订单系统\n（三）教育背景：\n某大学 计算机\n■ 专业技能\nPython')
+        self.assertEqual([kind for kind, _ in split_sections(text)], ['basic', 'work', 'project', 'education', 'skills'])
+
+
+class TestDeadline(unittest.TestCase):
+    """请求截止时间测试"""
+    
+    def test_nested_scope_only_tightens(self):
+        """嵌套的截止时间不能放宽外层"""
+        self.assertIsNone(deadline_remaining())
+        with deadline_scope(1):
+            with deadline_scope(60):
+                self.assertLessEqual(deadline_remaining(), 1)
+            with deadline_scope(0.5):
+                self.assertLessEqual(deadline_remaining(), 0.5)
+        self.assertIsNone(deadline_remaining())
+    
+    def test_propagates_to_executor(self):
+        """提交到线程池的任务继承截止时间"""
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(1) as executor, deadline_scope(5):
+            inherited = submit_with_context(executor, deadline_remaining).result()
+            plain = executor.submit(deadline_remaining).result()
+        self.assertTrue(0 < inherited <= 5)
+        self.assertIsNone(plain)
+    
+    def test_latency_quantile_min_samples(self):
+        """样本不足时不给出分位数（自适应超时回退到默认值）"""
+        metrics = LLMMetrics()
+        for _ in range(5):
+            metrics.record_call('match', 4.0, True)
+        self.assertIsNone(metrics.latency_quantile('match', 0.99, min_samples=20))
+        self.assertAlmostEqual(metrics.latency_quantile('match', 0.99, min_samples=5), 4.0, places=1)
+        self.assertIsNone(metrics.latency_quantile('analyze', 0.99))
+
+
+class TestLocalAnalyzer(unittest.TestCase):
+    """本地规则分析及响应时限测试"""
+    
+    RESUME = ('张三\n电话：13800000000 邮箱：zhangsan@example.com\n'
+              '工作经历\n2019.01 - 至今 某科技 后端工程师\n主导支付系统重构，QPS提升3倍，支撑日活50万用户\n'
+              '项目经历\n订单系统：使用Python、Django、MySQL、Redis开发\n专业技能\nPython Django MySQL Redis Docker')
+    
+    def test_local_analysis_shape(self):
+        """本地分析结果与AI分析结构一致"""
+        result = analyze_locally(self.RESUME)
+        self.assertEqual(result['source'], 'local')
+        self.assertTrue(0 <= result['score'] <= 100)
+        for key in ['completeness', 'format', 'content', 'quantifiable', 'keywords', 'ats_friendly']:
+            self.assertIn(key, result['dimensions'])
+        self.assertIn('Django', result['dimensions']['keywords']['hard_skills'])
+        self.assertIn('后端开发', result['recommended_positions'])
+    
+    def test_quantified_resume_scores_higher(self):
+        """量化成果越多，成果量化得分越高"""
+        plain = self.RESUME.replace('，QPS提升3倍，支撑日活50万用户', '，负责相关工作')
+        self.assertGreater(analyze_locally(self.RESUME)['dimensions']['quantifiable']['score'],
+                           analyze_locally(plain)['dimensions']['quantifiable']['score'])
+    
+    def test_sla_returns_local_then_enriches(self):
+        """AI超出响应时限时先返回本地结果，AI完成后补全"""
+        from utils.analyzer import ResumeAnalyzer
+        
+        class _SlowAI:
+            def analyze_resume(self, resume_text):
+                time.sleep(0.3)
+                return {'score': 95}
+        
+        analyzer = ResumeAnalyzer.__new__(ResumeAnalyzer)
+        analyzer.ai = _SlowAI()
+        started = time.time()
+        result, enrichment = analyzer.analyze_within_sla(self.RESUME, sla=0.05)
+        self.assertLess(time.time() - started, 0.25)
+        self.assertTrue(result['pending_enrichment'])
+        self.assertEqual(result['analysis']['source'], 'local')
+        enriched = enrichment.result(timeout=2)
+        self.assertEqual(enriched['analysis'], {'score': 95})
+        self.assertNotIn('pending_enrichment', enriched)
+        
+        result, enrichment = analyzer.analyze_within_sla(self.RESUME, sla=2)
+        self.assertIsNone(enrichment)
+        self.assertEqual(result['analysis'], {'score': 95})
+
+
+class TestUserConfigCache(unittest.TestCase):
+    """用户配置缓存测试"""
+    
+    def setUp(self):
+        import config
+        self.config = config
+        self.original = (config.CONFIG_FILE, config.CONFIG_RELOAD_INTERVAL)
+        self.tmpdir = tempfile.mkdtemp()
+        config.CONFIG_FILE = os.path.join(self.tmpdir, 'user_config.json')
+    
+    def tearDown(self):
+        self.config.CONFIG_FILE, self.config.CONFIG_RELOAD_INTERVAL = self.original
+    
+    def test_save_is_atomic_and_cached(self):
+        """保存后立即生效且不留临时文件；返回副本，修改不影响缓存"""
+        config = self.config
+        version = config.get_config_version()
+        self.assertEqual(config.load_user_config(), {})
+        self.assertTrue(config.save_user_config({'api_key': 'sk-1'}))
+        self.assertEqual(os.listdir(self.tmpdir), ['user_config.json'])
+        self.assertGreater(config.get_config_version(), version)
+        
+        loaded = config.load_user_config()
+        loaded['api_key'] = 'changed'
+        self.assertEqual(config.load_user_config(), {'api_key': 'sk-1'})
+    
+    def test_reloads_when_file_changes(self):
+        """其他进程改写文件后，检查间隔过后重新加载"""
+        config = self.config
+        config.CONFIG_RELOAD_INTERVAL = 60
+        config.save_user_config({'api_key': 'sk-1'})
+        version = config.get_config_version()
+        
+        with open(config.CONFIG_FILE + '.new', 'w', encoding='utf-8') as f:
+            json.dump({'api_key': 'sk-2'}, f)
+        os.replace(config.CONFIG_FILE + '.new', config.CONFIG_FILE)
+        self.assertEqual(config.load_user_config()['api_key'], 'sk-1')
+        
+        config.CONFIG_RELOAD_INTERVAL = 0
+        self.assertEqual(config.load_user_config()['api_key'], 'sk-2')
+        self.assertEqual(config.get_config_version(), version + 1)
+        self.assertEqual(config.get_config_version(), version + 1)
+
+
+class TestSpeculativeAnalysis(unittest.TestCase):
+    """上传时预先分析测试"""
+    
+    def _analyzer(self, delay):
+        from utils.analyzer import ResumeAnalyzer
+        
+        class _FakeAI:
+            calls = 0
+            
+            def analyze_resume(self, resume_text):
+                _FakeAI.calls += 1
+                time.sleep(delay)
+                return {'score': 90}
+        
+        analyzer = ResumeAnalyzer.__new__(ResumeAnalyzer)
+        analyzer.ai = _FakeAI()
+        return analyzer, _FakeAI
+    
+    def test_analyze_joins_speculation(self):
+        """分析时等待进行中的预先分析，不再发起新的调用；只能取出一次"""
+        analyzer, fake = self._analyzer(0.2)
+        self.assertTrue(analyzer.speculate(9001, '简历'))
+        self.assertTrue(analyzer.speculate(9001, '简历'))
+        
+        speculation = analyzer.take_speculation(9001)
+        result, enrichment = analyzer.analyze_within_sla('简历', sla=2, future=speculation)
+        self.assertEqual(result['analysis'], {'score': 90})
+        self.assertIsNone(enrichment)
+        self.assertEqual(fake.calls, 1)
+        self.assertIsNone(analyzer.take_speculation(9001))
+    
+    def test_cancel_on_delete(self):
+        """简历删除后取消预先分析，之后不会再被使用"""
+        analyzer, _ = self._analyzer(0.05)
+        analyzer.speculate(9002, '简历')
+        self.assertTrue(analyzer.cancel_speculation(9002))
+        self.assertFalse(analyzer.cancel_speculation(9002))
+        self.assertIsNone(analyzer.take_speculation(9002))
+
+
+class TestSimilarityIndex(unittest.TestCase):
+    """近似重复检测测试"""
+    
+    RESUME = ('张三\n电话：13800000000\n工作经历\n2019.01 - 至今 某科技 后端工程师\n'
+              '主导支付系统重构，QPS提升3倍，支撑日活50万用户\n负责订单服务拆分与性能优化，接口耗时降低40%\n'
+              '项目经历\n订单系统：使用Python、Django、MySQL、Redis开发，日订单量10万\n'
+              '专业技能\nPython Django MySQL Redis Docker Kubernetes\n教育背景\n某大学 计算机科学 本科')
+    
+    def test_signature_similarity(self):
+        """轻微修改的文本相似度高，无关文本相似度低，空白和大小写不影响签名"""
+        base = minhash_signature(self.RESUME)
+        edited = minhash_signature(self.RESUME.replace('10万', '12万'))
+        other = minhash_signature('李四\n前端开发工程师\n熟悉React、Vue、TypeScript，负责商城前端页面开发')
+        self.assertGreater(estimate_similarity(base, edited), 0.85)
+        self.assertLess(estimate_similarity(base, other), 0.2)
+        self.assertEqual(base, minhash_signature(self.RESUME.upper().replace('\n', '\n\n  ')))
+        self.assertEqual(minhash_signature('  '), [])
+    
+    def test_index_find_and_remove(self):
+        """超过阈值的才返回；其他实例写入的签名在查询时增量加载"""
+        db_path = os.path.join(tempfile.mkdtemp(), 'app.db')
+        index = SimilarityIndex('resume', 0.8, db_path=db_path)
+        index.add(1, self.RESUME)
+        index.add(2, '李四\n前端开发工程师\n熟悉React、Vue、TypeScript')
+        
+        other_process = SimilarityIndex('resume', 0.8, db_path=db_path)
+        matches = other_process.find(self.RESUME.replace('10万', '12万'))
+        self.assertEqual([ref_id for ref_id, _ in matches], [1])
+        self.assertEqual(other_process.find(self.RESUME, exclude={1}), [])
+        self.assertEqual(SimilarityIndex('jd', 0.8, db_path=db_path).find(self.RESUME), [])
+        # 查询已建立索引的文本时直接使用保存的签名，不再重新计算
+        self.assertEqual(other_process.signature(1), minhash_signature(self.RESUME))
+        self.assertIsNone(other_process.signature(3))
+        
+        other_process.remove([1])
+        self.assertEqual(other_process.find(self.RESUME), [])
+        self.assertIsNone(other_process.signature(1))
+
+
+class TestUsageTracker(unittest.TestCase):
+    """用户用量统计测试"""
+    
+    def setUp(self):
+        self.db_path = os.path.join(tempfile.mkdtemp(), 'app.db')
+        self.tracker = UsageTracker(db_path=self.db_path, flush_interval=0)
+    
+    def _usage(self, prompt, completion):
+        return {'prompt_tokens': prompt, 'completion_tokens': completion}
+    
+    def test_record_stays_in_memory_until_flush(self):
+        """记录只累加内存，flush时一次写入并与已有行合并"""
+        with user_scope(7):
+            self.tracker.record('analyze', 'Qwen/Qwen2.5-72B-Instruct', self._usage(1000, 500))
+            self.tracker.record('analyze', 'Qwen/Qwen2.5-72B-Instruct', self._usage(1000, 500))
+        self.tracker.record('match', 'other-model', self._usage(300, 100))
+        self.assertEqual(self.tracker.get_stats()['pending_keys'], 2)
+        
+        import sqlite3
+        conn = sqlite3.connect(self.db_path)
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM token_usage').fetchone()[0], 0)
+        self.assertEqual(self.tracker.flush(), 2)
+        
+        self.tracker.record('analyze', 'Qwen/Qwen2.5-72B-Instruct', self._usage(10, 10), user_id=7)
+        self.tracker.flush()
+        row = conn.execute('SELECT calls, prompt_tokens, completion_tokens FROM token_usage WHERE user_id = 7').fetchone()
+        conn.close()
+        self.assertEqual(row, (3, 2010, 1010))
+    
+    def test_query_groups_and_costs(self):
+        """按用户汇总，未登录记为0号用户，未配置价格的模型费用为0"""
+        with user_scope(7):
+            self.tracker.record('analyze', 'Qwen/Qwen2.5-72B-Instruct', self._usage(1_000_000, 0))
+        self.tracker.record('match', 'other-model', self._usage(500, 100))
+        
+        today = time.strftime('%Y-%m-%d')
+        rows = {row['user_id']: row for row in self.tracker.query(today, today, group_by='user')}
+        self.assertEqual(rows[7]['total_tokens'], 1_000_000)
+        self.assertAlmostEqual(rows[7]['cost'], 4.13)
+        self.assertEqual(rows[0]['cost'], 0)
+        self.assertEqual([row['task'] for row in self.tracker.query(today, today, group_by='task')],
+                         ['analyze', 'match'])
+        with self.assertRaises(ValueError):
+            self.tracker.query(today, today, group_by='user_id; DROP TABLE token_usage')
+
+
+class TestModelRouter(unittest.TestCase):
+    """会员等级模型路由测试"""
+    
+    ROUTES = {
+        'self-intro': {0: ('small', 1500), 2: (None, 2000)},
+        'analyze': {1: ('medium', None)}
+    }
+    
+    def setUp(self):
+        import sqlite3
+        self.db_path = os.path.join(tempfile.mkdtemp(), 'app.db')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE users (id INTEGER PRIMARY KEY, membership_level INTEGER DEFAULT 0)')
+        conn.executemany('INSERT INTO users (id, membership_level) VALUES (?, ?)', [(1, 0), (2, 1), (3, 2)])
+        conn.commit()
+        conn.close()
+        self.router = ModelRouter(routes=self.ROUTES, enabled=True, db_path=self.db_path, tier_ttl=60)
+    
+    def test_route_by_tier(self):
+        """按当前用户的会员等级选择路由，未列出的等级取较低等级中最接近的一项"""
+        with user_scope(1):
+            self.assertEqual(self.router.route('self-intro')[2:], ('small', 1500))
+        with user_scope(2):
+            self.assertEqual(self.router.route('self-intro')[2:], ('small', 1500))
+            self.assertEqual(self.router.route('analyze')[2:], ('medium', None))
+        with user_scope(3):
+            self.assertEqual(self.router.route('self-intro')[2:], (None, 2000))
+        # 未登录按免费用户，低于最低等级时使用最低等级的路由
+        self.assertEqual(self.router.route('analyze').tier, 0)
+        self.assertEqual(self.router.route('analyze').model, 'medium')
+        self.assertEqual(self.router.route('general')[2:], (None, None))
+        
+        disabled = ModelRouter(routes=self.ROUTES, enabled=False, db_path=self.db_path)
+        self.assertEqual(disabled.route('self-intro', tier=0)[2:], (None, None))
+    
+    def test_tier_is_cached(self):
+        """会员等级缓存到过期或手动清除"""
+        import sqlite3
+        self.assertEqual(self.router.user_tier(2), 1)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('UPDATE users SET membership_level = 2 WHERE id = 2')
+        conn.commit()
+        conn.close()
+        self.assertEqual(self.router.user_tier(2), 1)
+        self.router.invalidate(2)
+        self.assertEqual(self.router.user_tier(2), 2)
+        self.assertEqual(self.router.user_tier(999), 0)
+    
+    def test_route_metrics(self):
+        """按任务/等级/实际模型统计延迟、可解析率和截断率"""
+        route = self.router.route('self-intro', tier=0)
+        self.router.record(route, 'small', 0.5, True, valid=True, usage={'completion_tokens': 100})
+        self.router.record(route, 'small', 0.7, True, valid=False, truncated=True,
+                           usage={'completion_tokens': 300})
+        self.router.record(route, 'small', 5.0, False)
+        summary = self.router.summary()['self-intro/0/small']
+        self.assertEqual(summary['calls'], 3)
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(summary['valid_rate'], 0.5)
+        self.assertEqual(summary['truncated_rate'], 0.5)
+        self.assertEqual(summary['avg_completion_tokens'], 200)
+        self.assertLess(summary['p95_ms'], 1000)
+    
+    def test_pool_selects_routed_model(self):
+        """provider池只在提供路由模型的条目中挑选，没有时使用非路由条目"""
+        base = {'api_base_url': 'http://a', 'api_key': 'k', 'provider_name': 'a', 'rpm': 1}
+        pool = ProviderPool()
+        pool.update([
+            dict(base, id='router-big', model_name='big'),
+            dict(base, id='router-big@small', model_name='small', routed=True)
+        ])
+        self.assertEqual(pool.select(model='small')[0].id, 'router-big@small')
+        # 各模型独立限流：小模型额度用完不影响大模型
+        with self.assertRaises(RateLimitExceeded):
+            pool.select(model='small', max_wait=0)
+        self.assertEqual(pool.select(model='missing', max_wait=0)[0].id, 'router-big')
+    
+    def test_fallback_request_uses_served_model(self):
+        """回退到非路由provider时不受路由的最大输出token限制，缓存键按实际响应的模型计算"""
+        from types import SimpleNamespace
+        from utils.ai_client import AIClient
+        client = AIClient.__new__(AIClient)
+        client.api_config = {'model_name': 'big'}
+        route = self.router.route('self-intro', tier=0)
+        payload, request_key = client._build_payload([{'role': 'user', 'content': 'hi'}], 0.7, 'sys', True,
+                                                     4000, route)
+        self.assertEqual((payload['model'], payload['max_tokens']), ('small', 1500))
+        
+        routed = SimpleNamespace(config={'model_name': 'small'})
+        primary = SimpleNamespace(config={'model_name': 'big'})
+        self.assertEqual(client._served_payload(payload, routed, route.model, 4000), payload)
+        served = client._served_payload(payload, primary, route.model, 4000)
+        self.assertEqual((served['model'], served['max_tokens']), ('big', 4000))
+        self.assertEqual(client._cache_key(payload), request_key)
+        self.assertEqual(client._cache_key(served), make_cache_key('big', 'sys', [{'role': 'user', 'content': 'hi'}],
+                                                                   0.7, 4000))
+
+
+class TestLLMScheduler(unittest.TestCase):
+    """会员等级调度测试"""
+    
+    def _scheduler(self, **kwargs):
+        options = dict(concurrency=1, weights={0: 1, 2: 3}, user_limits={0: 1}, starvation_seconds=60)
+        options.update(kwargs)
+        return LLMScheduler('test', **options)
+    
+    def _drain(self, scheduler, waiters):
+        """占住唯一名额，按顺序排队后逐个放行，返回获得名额的顺序"""
+        import threading
+        holder = scheduler.acquire(None, 1, 1)
+        order = []
+        
+        def _run(name, tier):
+            ticket = scheduler.acquire(None, tier, 5)
+            order.append(name)
+            scheduler.release(ticket)
+        
+        threads = []
+        for name, tier in waiters:
+            thread = threading.Thread(target=_run, args=(name, tier))
+            thread.start()
+            threads.append(thread)
+            while scheduler.get_stats()['queued'] < len(threads):
+                time.sleep(0.001)
+        scheduler.release(holder)
+        for thread in threads:
+            thread.join()
+        return order
+    
+    def test_weighted_fair_order(self):
+        """积压时按权重分配名额：尊享版与免费用户约3:1，免费请求不会被一直压后"""
+        scheduler = self._scheduler()
+        waiters = [(f'free{i}', 0) for i in range(3)] + [(f'vip{i}', 2) for i in range(6)]
+        order = self._drain(scheduler, waiters)
+        self.assertEqual(order, ['vip0', 'vip1', 'free0', 'vip2', 'vip3', 'vip4', 'free1', 'vip5', 'free2'])
+        stats = scheduler.get_stats()
+        self.assertEqual(stats['tiers'][2]['admitted'], 6)
+        self.assertEqual(stats['queued'], 0)
+    
+    def test_starvation_protection(self):
+        """排队超过时限的请求不论等级按入队顺序放行"""
+        scheduler = self._scheduler(starvation_seconds=0)
+        order = self._drain(scheduler, [('free', 0), ('vip', 2)])
+        self.assertEqual(order, ['free', 'vip'])
+        self.assertEqual(scheduler.get_stats()['tiers'][0]['starvation_boosts'], 1)
+    
+    def test_per_user_limit_and_timeout(self):
+        """同一用户超出名额上限时排队，其他用户不受影响；排队超时返回None"""
+        scheduler = self._scheduler(concurrency=3)
+        first = scheduler.acquire(7, 0, 1)
+        self.assertIsNotNone(first)
+        self.assertIsNone(scheduler.acquire(7, 0, 0.05))
+        other = scheduler.acquire(8, 0, 0.05)
+        self.assertIsNotNone(other)
+        self.assertIsNotNone(scheduler.acquire(None, 0, 0.05))
+        stats = scheduler.get_stats()
+        self.assertEqual(stats['active'], 3)
+        self.assertEqual(stats['tiers'][0]['timeouts'], 1)
+        
+        scheduler.release(first)
+        self.assertIsNotNone(scheduler.acquire(7, 0, 0.05))
+    
+    def test_unlimited(self):
+        """concurrency为0时不排队"""
+        scheduler = self._scheduler(concurrency=0)
+        tickets = [scheduler.acquire(7, 0, 0) for _ in range(5)]
+        self.assertTrue(all(tickets))
+        for ticket in tickets:
+            scheduler.release(ticket)
+
+
+class TestResumeSummary(unittest.TestCase):
+    """简历摘要测试"""
+    
+    RESUME = '\n'.join([
+        '张三',
+        '高级Python工程师 | 5年后端开发经验',
+        '电话：13800138000  邮箱：zhangsan@example.com',
+        '工作经历',
+        '2020.03 - 至今  某某科技有限公司  高级后端工程师',
+        '负责订单系统重构，接口响应时间降低40%',
+        '参与一些日常维护工作',
+        '2018.07 - 2020.02  某某网络公司  后端工程师',
+        '开发支付对账模块，每日处理200万笔交易',
+        '项目经历',
+        '2021.05-2022.01 智能推荐平台',
+        '使用Python、Redis、Kafka搭建实时推荐，点击率提升15%',
+        '专业技能',
+        'Python, Django, MySQL, Redis, Kafka, Docker'
+    ] + ['负责日常开发和维护工作，按时完成需求'] * 50)
+    
+    def test_local_summary(self):
+        """本地提取经历、时间、量化成果和技能，不包含联系方式"""
+        summary = build_local_summary(self.RESUME)
+        self.assertEqual(summary['name'], '张三')
+        self.assertEqual([r['period'] for r in summary['roles']], ['2020.03 - 至今', '2018.07 - 2020.02'])
+        self.assertIn('某某科技有限公司', summary['roles'][0]['title'])
+        self.assertEqual(summary['roles'][0]['highlights'][0], '负责订单系统重构，接口响应时间降低40%')
+        self.assertEqual(summary['projects'][0]['period'], '2021.05 - 2022.01')
+        self.assertIn('Kafka', summary['skills'])
+        self.assertEqual(len(summary['achievements']), 3)
+        
+        rendered = render_summary(summary)
+        self.assertNotIn('13800138000', rendered)
+        # 经历要点中已有的成果不重复输出
+        self.assertEqual(rendered.count('点击率提升15%'), 1)
+        self.assertLess(estimate_tokens(rendered), estimate_tokens(self.RESUME) / 3)
+    
+    def test_store_keyed_by_text(self):
+        """按规范化文本的哈希保存，简历文本变化后不再命中"""
+        store = ResumeSummaryStore(db_path=os.path.join(tempfile.mkdtemp(), 'app.db'))
+        self.assertEqual(summary_key(self.RESUME), summary_key(self.RESUME + '\n\n'))
+        key = summary_key(self.RESUME)
+        self.assertIsNone(store.get(key))
+        store.put(key, {'skills': ['Python'], 'source': 'ai'})
+        self.assertEqual(store.get(key)['skills'], ['Python'])
+        self.assertIsNone(store.get(summary_key(self.RESUME + '\n2023 新增经历')))
+        store.delete(key)
+        self.assertFalse(store.exists(key))
+        self.assertEqual(store.get_stats()['built'], 1)
+    
+    def test_failed_ai_summary_backs_off(self):
+        """AI摘要失败后保存本地摘要，重试间隔内不再调用AI，超过间隔后在后台重试"""
+        from unittest import mock
+        import utils.ai_client
+        import utils.resume_summary as resume_summary
+        
+        class _FailingAI:
+            calls = 0
+            
+            def summarize_resume(self, resume_text):
+                _FailingAI.calls += 1
+                return None
+        
+        def _wait():
+            deadline = time.monotonic() + 5
+            while resume_summary._pending_summaries and time.monotonic() < deadline:
+                time.sleep(0.01)
+        
+        store = ResumeSummaryStore(db_path=os.path.join(tempfile.mkdtemp(), 'app.db'))
+        with mock.patch.object(resume_summary, '_summary_store', store), \
+                mock.patch.object(resume_summary, 'RESUME_SUMMARY_SOURCE', 'ai'), \
+                mock.patch.object(utils.ai_client, 'get_ai_client', _FailingAI):
+            self.assertIsNone(resume_summary.get_resume_summary(self.RESUME))
+            _wait()
+            for _ in range(10):
+                self.assertEqual(resume_summary.get_resume_summary(self.RESUME)['source'], 'local')
+            _wait()
+            self.assertEqual(_FailingAI.calls, 1)
+            
+            with mock.patch.object(resume_summary, 'RESUME_SUMMARY_RETRY_INTERVAL', 0):
+                resume_summary.get_resume_summary(self.RESUME)
+                _wait()
+            self.assertEqual(_FailingAI.calls, 2)
+        self.assertEqual(store.get_stats()['build_failures'], 2)
+
+
+class TestMultiMatch(unittest.TestCase):
+    """多JD匹配测试"""
+    
+    RESUME = '熟悉Python、Django、MySQL、Redis，有Docker部署经验'
+    
+    def test_batches_rank_and_fallback(self):
+        """按本地预排顺序分批调用，相同JD只评估一次，AI未返回的JD使用本地估算，结果按分数排序"""
+        from utils.analyzer import ResumeAnalyzer
+        
+        class _FakeAI:
+            batches = []
+            
+            def match_jds(self, resume_text, jd_texts):
+                _FakeAI.batches.append(list(jd_texts))
+                # 每批的最后一个JD没有返回结果
+                return {i: {'match_score': 90 - i} for i in range(len(jd_texts) - 1)}
+        
+        analyzer = ResumeAnalyzer.__new__(ResumeAnalyzer)
+        analyzer.ai = _FakeAI()
+        best, low, mid = '要求Python、Django、MySQL、Redis', '要求Java、Kubernetes', '要求Python、Kubernetes'
+        results = analyzer.match_with_jds(self.RESUME, [low, best, mid, best + '\n'], batch_size=2)
+        
+        self.assertEqual(sorted(_FakeAI.batches), sorted([[best, mid], [low]]))
+        self.assertEqual([r['index'] for r in results], [1, 3, 2, 0])
+        self.assertEqual([r['match_score'] for r in results], [90, 90, 75, 55])
+        self.assertEqual(results[2]['source'], 'local')
+        self.assertEqual(results[0]['local_score'], 95)
+    
+    def test_collect_matches_and_stub(self):
+        """按jd编号整理结果，丢弃越界和没有分数的条目；stub为每个JD返回一条结果"""
+        from utils.ai_client import AIClient
+        client = AIClient.__new__(AIClient)
+        matches = [{'jd': 2, 'match_score': '80'}, {'jd': 5, 'match_score': 70}, {'jd': 1}, 'invalid']
+        self.assertEqual(client._collect_matches(matches, 3), {1: {'match_score': 80}})
+        
+        prompt = '[Multi Job Matching Analysis]\n\n[Job Descriptions]\n[JD 1]\nPython\n\n[JD 2]\nJava'
+        content = parse_json_tolerant(canned_content({'messages': [{'role': 'user', 'content': prompt}]}))
+        self.assertEqual(sorted(client._collect_matches(content['matches'], 2)), [0, 1])
+
+
+class TestStubServer(unittest.TestCase):
+    """压测stub服务器测试"""
+    
+    def _start(self, **kwargs):
+        import threading
+        server = StubServer(('127.0.0.1', 0), latency='fixed:0', **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f"http://127.0.0.1:{server.server_address[1]}/v1"
+    
+    def test_latency_distributions(self):
+        """延迟分布按种子可复现，recorded使用录制值"""
+        import random
+        sample = parse_latency('lognormal:2,0.5')
+        self.assertEqual(sample(random.Random(7)), sample(random.Random(7)))
+        self.assertTrue(0.5 <= parse_latency('uniform:0.5,1')(random.Random()) <= 1)
+        self.assertIsNone(parse_latency('recorded')(random.Random()))
+        with self.assertRaises(ValueError):
+            parse_latency('normal:1')
+    
+    def test_fixture_key_ignores_model_and_stream(self):
+        """换模型或改用流式仍命中同一录制"""
+        body = {'model': 'a', 'messages': [{'role': 'user', 'content': 'hi'}], 'temperature': 0.5}
+        self.assertEqual(fixture_key(body), fixture_key(dict(body, model='b', stream=True)))
+        self.assertNotEqual(fixture_key(body), fixture_key(dict(body, temperature=0.7)))
+    
+    def test_canned_and_streaming_responses(self):
+        """内置响应按任务返回可解析的JSON，流式与非流式内容一致"""
+        import requests
+        base_url = self._start()
+        body = {'model': 'm', 'messages': [{'role': 'user', 'content': '[Precise Job Matching Analysis]\n...'}]}
+        data = requests.post(f'{base_url}/chat/completions', json=body, timeout=5).json()
+        content = data['choices'][0]['message']['content']
+        self.assertIn('match_score', parse_json_tolerant(content))
+        self.assertGreater(data['usage']['completion_tokens'], 0)
+        
+        # 流式响应只在请求include_usage时返回usage
+        for include_usage in (False, True):
+            stream_body = dict(body, stream=True, stream_options={'include_usage': include_usage})
+            response = requests.post(f'{base_url}/chat/completions', json=stream_body, stream=True, timeout=5)
+            streamed = ''
+            usage = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith('data: ') and line != 'data: [DONE]':
+                    chunk = json.loads(line[6:])
+                    streamed += chunk['choices'][0]['delta'].get('content', '')
+                    usage = chunk.get('usage') or usage
+            self.assertEqual(streamed, content)
+            self.assertEqual(usage, data['usage'] if include_usage else None)
+    
+    def test_error_injection_and_strict_replay(self):
+        """注入429带Retry-After；严格回放时缺少fixture返回404"""
+        import requests
+        body = {'messages': [{'role': 'user', 'content': 'hi'}]}
+        base_url = self._start(rate_limit_rate=1, retry_after=3)
+        response = requests.post(f'{base_url}/chat/completions', json=body, timeout=5)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '3')
+        
+        base_url = self._start(mode='replay', strict=True, fixtures_dir=tempfile.mkdtemp())
+        self.assertEqual(requests.post(f'{base_url}/chat/completions', json=body, timeout=5).status_code, 404)
+
+
+class _StubClientCase(unittest.TestCase):
+    """AIClient对接本地stub服务器；响应缓存、指标和用量统计使用测试内的实例，不读写全局状态"""
+    
+    def setUp(self):
+        from unittest import mock
+        import utils.ai_client as ai_client
+        self.cache = LLMResponseCache(max_memory_entries=100, max_disk_entries=0, db_path=None)
+        self.metrics = LLMMetrics()
+        self.tracker = UsageTracker(db_path=os.path.join(tempfile.mkdtemp(), 'app.db'), flush_interval=0)
+        overrides = {
+            'get_llm_cache': lambda: self.cache,
+            'get_llm_metrics': lambda: self.metrics,
+            'get_usage_tracker': lambda: self.tracker,
+            'LLM_CACHE_ENABLED': True,
+            'AI_RETRY_BASE_DELAY': 0.01
+        }
+        for name, value in overrides.items():
+            patcher = mock.patch.object(ai_client, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def _start_stub(self, **kwargs) -> StubServer:
+        import threading
+        kwargs.setdefault('latency', 'fixed:0')
+        server = StubServer(('127.0.0.1', 0), **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+    
+    def _provider(self, server: StubServer, name: str, **kwargs) -> dict:
+        """provider配置，id和模型名按测试区分，熔断器、限流器和调度器不与其他测试共用"""
+        config = {
+            'id': f'{self._testMethodName}-{name}',
+            'api_base_url': f'http://127.0.0.1:{server.server_address[1]}/v1',
+            'api_key': 'stub',
+            'model_name': f'{self._testMethodName}-model',
+            'provider_name': name,
+            'rpm': 0,
+            'tpm': 0
+        }
+        config.update(kwargs)
+        return config
+    
+    def _client(self, *providers):
+        from utils.ai_client import AIClient
+        client = AIClient.__new__(AIClient)
+        client.api_config = providers[0]
+        client.pool = ProviderPool()
+        client.pool.update(list(providers))
+        return client
+    
+    def _spy_usage(self, client) -> list:
+        """记录每次调用按用户记账的usage"""
+        usages = []
+        record = client._record_usage
+        
+        def _record(usage, task, model):
+            usages.append(usage)
+            record(usage, task, model)
+        
+        client._record_usage = _record
+        return usages
+    
+    def _tracked_tokens(self) -> int:
+        self.tracker.flush()
+        today = time.strftime('%Y-%m-%d')
+        return sum(row['total_tokens'] for row in self.tracker.query(today, today, group_by='task'))
+
+
+class TestStreamingClient(_StubClientCase):
+    """AIClient流式调用测试（对接stub）"""
+    
+    MESSAGES = [{'role': 'user', 'content': '[Interview Prep] - Generate interview questions'}]
+    
+    def test_stream_json_events_cache_and_usage(self):
+        """面试题逐题产出，最后产出完整结果；usage取provider返回值，完整结果写入缓存"""
+        from llm_stub_server import CANNED_RESPONSES
+        expected = CANNED_RESPONSES['interview']
+        server = self._start_stub()
+        client = self._client(self._provider(server, 'stub'))
+        usages = self._spy_usage(client)
+        
+        events = list(client.stream_json(self.MESSAGES, task='interview'))
+        items = [value for kind, key, value in events if kind == 'item' and key == 'interview_questions']
+        self.assertEqual(items, expected['interview_questions'])
+        self.assertEqual(events[-1], ('done', None, expected))
+        self.assertEqual(len(usages), 1)
+        self.assertNotIn('estimated', usages[0])
+        self.assertGreater(usages[0]['completion_tokens'], 0)
+        self.assertEqual(self._tracked_tokens(), usages[0]['total_tokens'])
+        
+        # 再次请求命中缓存，一次性产出完整内容，不再调用provider
+        cached = list(client.chat_stream(self.MESSAGES, task='interview'))
+        self.assertEqual(len(cached), 1)
+        self.assertEqual(parse_json_strict(cached[0]), expected)
+        self.assertEqual(server.stats['requests'], 1)
+        self.assertEqual(self.metrics.summary()['interview']['cache_hits'], 1)
+    
+    def test_usage_estimated_without_stream_usage(self):
+        """provider流式响应不返回usage时按文本估算用量并标记estimated"""
+        server = self._start_stub(stream_usage=False)
+        client = self._client(self._provider(server, 'stub'))
+        usages = self._spy_usage(client)
+        
+        content = ''.join(client.chat_stream(self.MESSAGES, task='interview'))
+        self.assertTrue(usages[0]['estimated'])
+        self.assertEqual(usages[0]['completion_tokens'], estimate_tokens(content))
+        self.assertGreater(usages[0]['prompt_tokens'], 0)
+        self.assertEqual(self._tracked_tokens(), usages[0]['total_tokens'])
+    
+    def test_abandoned_stream_records_partial_usage(self):
+        """消费方中途断开时按已收到的内容估算用量，不完整的结果不写缓存"""
+        server = self._start_stub()
+        client = self._client(self._provider(server, 'stub'))
+        usages = self._spy_usage(client)
+        
+        stream = client.chat_stream(self.MESSAGES, task='interview')
+        first = next(stream)
+        stream.close()
+        self.assertTrue(usages[0]['estimated'])
+        self.assertEqual(usages[0]['completion_tokens'], estimate_tokens(first))
+        
+        list(client.chat_stream(self.MESSAGES, task='interview'))
+        self.assertEqual(server.stats['requests'], 2)
+
+
+class TestSendRetries(_StubClientCase):
+    """AIClient._send 重试、Retry-After和熔断测试（对接stub）"""
+    
+    MESSAGES = [{'role': 'user', 'content': 'hi'}]
+    
+    def _send(self, client, retries: int):
+        from unittest import mock
+        import utils.ai_client as ai_client
+        from utils.resilience import retry_stats
+        before = dict(retry_stats)
+        payload, _ = client._build_payload(self.MESSAGES, 0.7, None, False)
+        with mock.patch.object(ai_client, 'AI_MAX_RETRIES', retries):
+            sent = client._send(payload, 100, task='general')
+        return sent, {key: retry_stats[key] - before[key] for key in before}
+    
+    def test_rate_limited_retry_honors_retry_after(self):
+        """429按Retry-After等待后重试，重试用尽后失败；每次失败都退还预扣的token"""
+        server = self._start_stub(rate_limit_rate=1, retry_after=1)
+        client = self._client(self._provider(server, 'stub', tpm=600))
+        
+        started = time.monotonic()
+        sent, events = self._send(client, retries=1)
+        self.assertIsNone(sent)
+        self.assertGreaterEqual(time.monotonic() - started, 1.0)
+        self.assertEqual(server.stats['requests'], 2)
+        self.assertEqual((events['retries'], events['retries_exhausted']), (1, 1))
+        
+        provider = client.pool.providers[0]
+        self.assertEqual(provider.total_failures, 2)
+        self.assertGreater(provider.throttled_until, time.monotonic())
+        # 令牌桶容量100，只有失败时退还了预扣的token才能再预约一个完整请求
+        self.assertEqual(provider.limiter.try_reserve(100, 0), 0)
+    
+    def test_breaker_opens_then_fails_fast(self):
+        """连续5xx达到阈值后熔断，之后的请求不再发给provider"""
+        from utils.resilience import get_circuit_breaker
+        server = self._start_stub(error_rate=1)
+        client = self._client(self._provider(server, 'stub'))
+        breaker = get_circuit_breaker(client.pool.providers[0].id)
+        
+        sent, events = self._send(client, retries=breaker.failure_threshold - 1)
+        self.assertIsNone(sent)
+        self.assertEqual(server.stats['requests'], breaker.failure_threshold)
+        self.assertEqual(events['retries'], breaker.failure_threshold - 1)
+        self.assertEqual(breaker.state, 'open')
+        
+        sent, events = self._send(client, retries=2)
+        self.assertIsNone(sent)
+        self.assertEqual(events['circuit_rejections'], 1)
+        self.assertEqual(server.stats['requests'], breaker.failure_threshold)
+
+
+class TestConcurrentChat(_StubClientCase):
+    """AIClient.chat 合并相同请求测试（对接stub）"""
+    
+    def test_identical_requests_share_one_upstream_call(self):
+        """并发的相同请求只调用provider一次，其余合并到进行中的请求或命中缓存"""
+        import threading
+        server = self._start_stub(latency='fixed:0.5')
+        client = self._client(self._provider(server, 'stub'))
+        messages = [{'role': 'user', 'content': '[Precise Job Matching Analysis]\n...'}]
+        barrier = threading.Barrier(10)
+        results = []
+        
+        def _call():
+            barrier.wait()
+            results.append(client.chat(messages, task='match'))
+        
+        threads = [threading.Thread(target=_call) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        self.assertEqual(server.stats['requests'], 1)
+        self.assertEqual(len(set(results)), 1)
+        self.assertIn('match_score', parse_json_tolerant(results[0]))
+        summary = self.metrics.summary()['match']
+        self.assertEqual(summary['calls'], 1)
+        self.assertGreater(summary['coalesced'], 0)
+        self.assertEqual(summary['coalesced'] + summary['cache_hits'], 9)
+
+
+class TestProviderFailover(_StubClientCase):
+    """provider配置展开和故障切换测试（对接stub）"""
+    
+    def test_routed_models_expand_and_fail_over(self):
+        """models中的路由模型展开为独立条目；路由模型的条目出错时切换到另一个provider的同一模型"""
+        from unittest import mock
+        import config
+        from utils.resilience import retry_stats
+        failing, healthy = self._start_stub(error_rate=1), self._start_stub()
+        name = self._testMethodName
+        user_config = {'providers': [
+            dict(self._provider(failing, f'{name}-a'), api_key='stub-aaaa', model_name='big', models=['small', 'big']),
+            dict(self._provider(healthy, f'{name}-b'), api_key='stub-bbbb', model_name='big', models=['small'])
+        ]}
+        with mock.patch.object(config, 'load_user_config', lambda: user_config):
+            providers = config.get_provider_configs()
+        self.assertEqual([(p['id'], p['model_name'], bool(p.get('routed'))) for p in providers], [
+            (f'{name}-a#aaaa', 'big', False),
+            (f'{name}-b#bbbb', 'big', False),
+            (f'{name}-a#aaaa@small', 'small', True),
+            (f'{name}-b#bbbb@small', 'small', True)
+        ])
+        
+        client = self._client(*providers)
+        # 出错的provider延迟更低，优先被选中
+        slow = client.pool.providers[3]
+        client.pool.begin(slow)
+        client.pool.finish(slow, time.monotonic() - 5, ok=True)
+        
+        failovers = retry_stats['failovers']
+        payload, _ = client._build_payload([{'role': 'user', 'content': 'hi'}], 0.7, None, False)
+        response, provider = client._send(payload, 100, model='small')
+        self.assertEqual(provider.id, f'{name}-b#bbbb@small')
+        self.assertEqual(response.json()['model'], 'small')
+        self.assertEqual(retry_stats['failovers'] - failovers, 1)
+        self.assertEqual((failing.stats['requests'], healthy.stats['requests']), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
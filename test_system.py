@@ -158,9 +158,26 @@ def test_self_introduction(resume_id):
         print(f"[失败] {e}")
         return False
 
+def test_analyze_all(resume_id):
+    """测试一键并发分析"""
+    print(f"\n[测试8] 一键分析 (ID: {resume_id})...")
+    try:
+        response = requests.post(f"{BASE_URL}/api/analyze-all",
+                                 json={'resume_id': resume_id, 'jd_text': 'Python后端开发工程师，熟悉Django、MySQL'})
+        assert response.status_code == 200
+        data = response.json()
+        assert data['success'] == True
+        for key in ['analyze', 'match', 'interview', 'self_intro']:
+            assert key in data['data']
+        print("[通过] 一键分析完成 - 4项结果已返回")
+        return True
+    except Exception as e:
+        print(f"[失败] {e}")
+        return False
+
 def test_list_resumes():
     """测试简历列表"""
-    print("\n[测试8] 获取简历列表...")
+    print("\n[测试9] 获取简历列表...")
     try:
         response = requests.get(f"{BASE_URL}/api/resumes")
         assert response.status_code == 200
@@ -175,7 +192,7 @@ def test_list_resumes():
 
 def test_get_templates():
     """测试获取模板列表"""
-    print("\n[测试9] 获取PDF模板列表...")
+    print("\n[测试10] 获取PDF模板列表...")
     try:
         response = requests.get(f"{BASE_URL}/api/templates")
         assert response.status_code == 200
@@ -191,7 +208,7 @@ def test_get_templates():
 
 def test_export_resume(resume_id):
     """测试简历导出"""
-    print(f"\n[测试10] 导出简历PDF (ID: {resume_id})...")
+    print(f"\n[测试11] 导出简历PDF (ID: {resume_id})...")
     try:
         for template in ['modern', 'business', 'creative']:
             response = requests.post(
@@ -227,6 +244,7 @@ def main():
             results.append(("岗位匹配", test_match_jd(resume_id)))
             results.append(("面试题生成", test_generate_interview(resume_id)))
             results.append(("自我介绍", test_self_introduction(resume_id)))
+            results.append(("一键分析", test_analyze_all(resume_id)))
             results.append(("简历列表", test_list_resumes()))
             results.append(("模板列表", test_get_templates()))
             results.append(("PDF导出", test_export_resume(resume_id)))
@@ -1,8 +1,56 @@
 import json
+import time
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime
-from typing import Optional
-from config import get_api_config
+from typing import Optional, Iterator
+from config import (
+    get_api_config,
+    get_provider_configs,
+    get_config_version,
+    AI_POOL_CONNECTIONS,
+    AI_POOL_MAXSIZE,
+    AI_WARMUP_CONNECTIONS,
+    AI_TIMEOUT,
+    AI_CONNECT_TIMEOUT,
+    AI_MAX_RETRIES,
+    AI_RETRY_BASE_DELAY,
+    AI_RETRY_MAX_DELAY,
+    AI_RATE_LIMIT_MAX_WAIT,
+    AI_SCHEDULER_MAX_WAIT,
+    AI_ADAPTIVE_TIMEOUT_MIN,
+    AI_ADAPTIVE_TIMEOUT_MULTIPLIER,
+    AI_ADAPTIVE_TIMEOUT_MIN_SAMPLES,
+    AI_COMBINED_MAX_TOKENS,
+    MULTI_MATCH_JD_TOKEN_BUDGET,
+    MULTI_MATCH_TOKENS_PER_JD,
+    JD_TOKEN_BUDGET,
+    RESUME_SUMMARY_ENABLED,
+    RESUME_SUMMARY_TASKS,
+    LLM_CACHE_ENABLED
+)
+from utils.llm_cache import get_llm_cache, make_cache_key
+from utils.resilience import (
+    RETRYABLE_STATUS,
+    get_circuit_breaker,
+    parse_retry_after,
+    compute_backoff,
+    record_retry_event,
+    get_resilience_stats
+)
+from utils.provider_pool import get_provider_pool
+from utils.rate_limiter import estimate_tokens, RateLimitExceeded
+from utils.metrics import get_llm_metrics
+from utils.singleflight import SingleFlight
+from utils.deadline import remaining as deadline_remaining
+from utils.json_stream import JSONStreamParser, parse_json_strict, parse_json_tolerant
+from utils.prompt_compressor import compress_resume, compress_jd
+from utils.resume_summary import get_resume_summary, render_summary, get_summary_stats
+from utils.local_analyzer import analyze_locally, match_locally
+from utils.usage_tracker import get_usage_tracker, current_user
+from utils.model_router import get_model_router
+from utils.llm_scheduler import get_llm_scheduler, get_scheduler_stats
 
 api_stats = {
     "total_calls": 0,
@@ -13,6 +61,10 @@ api_stats = {
     "provider": "",
     "model": ""
 }
+_api_stats_lock = threading.Lock()
+
+# 返回JSON的任务，按路由统计结果可解析率
+JSON_TASKS = {'analyze', 'optimize', 'predict', 'match', 'match-multi', 'interview', 'self-intro', 'combined', 'summary'}
 
 SYSTEM_PROMPT = """You are a senior career development consultant and recruitment expert, proficient in job market trends, resume optimization, interview techniques, and career planning.
 
@@ -36,28 +88,136 @@ Help job seekers:
 - Present their best selves
 - Get satisfactory offers quickly"""
 
+# 合并调用中各任务的要求和输出结构；required为判断该部分完整的字段
+COMBINED_SECTIONS = {
+    'analyze': {
+        'required': 'score',
+        'instruction': 'Evaluate the resume as a senior HR expert on completeness, format, content quality, '
+                       'quantifiable achievements, keywords and ATS friendliness. Score 90+: ready for top companies; '
+                       '75-89: apply after polishing; 60-74: needs targeted rework; <60: rewrite.',
+        'schema': '{"score": 85, "overall_assessment": "one sentence", "dimensions": {'
+                  '"completeness": {"score": 80, "issues": [], "suggestions": []}, "format": {...}, "content": {...}, '
+                  '"quantifiable": {...}, "keywords": {"hard_skills": [], "soft_skills": [], "missing_keywords": [], '
+                  '"suggestions": []}, "ats_friendly": {...}}, "strengths": [], "weaknesses": [], "suggestions": [], '
+                  '"recommended_positions": [], "priority_actions": []}'
+    },
+    'match': {
+        'required': 'match_score',
+        'instruction': 'Score how well the resume matches the target position (0-100), list matched items and '
+                       'missing items (mark each "trainable" or "hard requirement"), and give at most 3 targeted suggestions.',
+        'schema': '{"match_score": 75, "matched_skills": [], "missing_skills": [], "matched_experiences": [], '
+                  '"suggestions": [], "match_details": "one sentence"}'
+    },
+    'interview': {
+        'required': 'interview_questions',
+        'instruction': 'As a senior interviewer, generate 12-15 questions: 1 self-introduction, 2 job motivation, '
+                       '3-4 resume deep dives, 3-4 technical/ability, 2 behavioral, 1 open question. Each has 3-4 STAR '
+                       'answer points, a customized sample answer over 150 characters and 1 tip.',
+        'schema': '{"interview_questions": [{"type": "", "question": "", "answer_points": [], "sample_answer": "", "tips": ""}]}'
+    },
+    'self_intro': {
+        'required': 'one_minute',
+        'instruction': 'As a career consultant, write a conversational 1-minute version (150-200 characters) and a '
+                       '3-minute version (400-600 characters, STAR cases and quantified achievements) of the '
+                       'self-introduction, plus 3-5 core selling points. Every sentence should answer "why choose you".',
+        'schema': '{"one_minute": "", "three_minutes": "", "key_points": []}'
+    }
+}
+
+
+# 进行中的相同请求只发一次，其余调用方共享结果
+_inflight_requests = SingleFlight()
+
+# 按provider base URL复用的keep-alive会话
+_http_sessions = {}
+_http_sessions_lock = threading.Lock()
+
+
+def get_http_session(api_base_url: str) -> requests.Session:
+    """获取指定base URL的连接池会话，多线程共享以复用TCP/TLS连接"""
+    with _http_sessions_lock:
+        session = _http_sessions.get(api_base_url)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=AI_POOL_CONNECTIONS,
+                pool_maxsize=AI_POOL_MAXSIZE
+            )
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _http_sessions[api_base_url] = session
+        return session
+
 
 class AIClient:
     def __init__(self):
-        self.api_config = get_api_config()
-        self.update_headers()
-        api_stats['provider'] = self.api_config['provider_name']
-        api_stats['model'] = self.api_config['model_name']
-    
-    def update_headers(self):
-        self.api_url = f"{self.api_config['api_base_url']}/chat/completions"
-        self.headers = {
-            "Authorization": f"Bearer {self.api_config['api_key']}",
-            "Content-Type": "application/json"
-        }
+        self._config_version = None
+        self.refresh_config()
     
-    def refresh_config(self):
-        self.api_config = get_api_config()
-        self.update_headers()
-        api_stats['provider'] = self.api_config['provider_name']
-        api_stats['model'] = self.api_config['model_name']
+    def refresh_config(self, force: bool = False):
+        # 配置未变化时不重建provider列表（每次获取客户端都会调用）
+        version = get_config_version()
+        if version == self._config_version and not force:
+            return
+        self._config_version = version
+        
+        # 第一个provider为主provider，决定统计展示和缓存键中的模型名
+        providers = get_provider_configs()
+        self.api_config = providers[0]
+        self.pool = get_provider_pool()
+        self.pool.update(providers)
+        with _api_stats_lock:
+            api_stats['provider'] = self.api_config['provider_name']
+            api_stats['model'] = self.api_config['model_name']
     
-    def chat(self, messages: list, temperature: float = 0.7, system_prompt: Optional[str] = None) -> Optional[str]:
+    def warm_up(self, connections: int = AI_WARMUP_CONNECTIONS) -> int:
+        """
+        预热连接池：提前完成TCP+TLS握手，避免首个请求承担握手延迟
+        
+        Args:
+            connections: 每个provider并发建立的连接数
+        
+        Returns:
+            成功建立的连接数
+        """
+        results = []
+        
+        def _open_connection(provider):
+            try:
+                get_http_session(provider.config['api_base_url']).get(
+                    f"{provider.config['api_base_url']}/models",
+                    headers=provider.headers,
+                    timeout=10
+                )
+                results.append(True)
+            except requests.exceptions.RequestException as e:
+                print(f"API connection warm-up failed ({provider.id}): {e}")
+        
+        # 路由模型的条目与所属provider共用连接池，不重复预热
+        threads = [
+            threading.Thread(target=_open_connection, args=(provider,))
+            for provider in self.pool.providers if not provider.config.get('routed')
+            for _ in range(max(1, connections))
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return len(results)
+    
+    def _build_payload(self, messages: list, temperature: float, system_prompt: Optional[str],
+                       use_cache: bool, max_tokens: int = 4000, route=None) -> tuple:
+        """
+        组装请求体，并计算请求键（内容寻址，用于响应缓存和合并相同请求；use_cache为False时为None）
+        
+        route为模型路由时，使用路由的模型，最大输出token不超过路由的预算
+        """
+        model = self.api_config['model_name']
+        if route is not None:
+            model = route.model or model
+            if route.max_tokens:
+                max_tokens = min(max_tokens, route.max_tokens)
+        
         chat_messages = messages.copy()
         if system_prompt is None:
             system_prompt = SYSTEM_PROMPT
@@ -65,51 +225,478 @@ class AIClient:
         chat_messages.insert(0, {"role": "system", "content": system_prompt})
         
         payload = {
-            "model": self.api_config['model_name'],
+            "model": model,
             "messages": chat_messages,
             "temperature": temperature,
-            "max_tokens": 4000
+            "max_tokens": max_tokens
         }
         
+        request_key = self._cache_key(payload) if use_cache else None
+        return payload, request_key
+    
+    def _cache_key(self, payload: dict) -> str:
+        """按请求体中的模型、提示词和采样参数计算缓存键"""
+        return make_cache_key(payload['model'], payload['messages'][0]['content'], payload['messages'][1:],
+                              payload['temperature'], payload['max_tokens'])
+    
+    def _served_payload(self, payload: dict, provider, model: Optional[str], max_tokens: Optional[int]) -> dict:
+        """
+        实际发给provider的请求体：模型换成provider的模型；
+        路由的模型没有可用provider、回退到非路由provider时，最大输出token恢复为调用方的取值
+        """
+        served = dict(payload, model=provider.config['model_name'])
+        if model and max_tokens and provider.config['model_name'] != model:
+            served['max_tokens'] = max_tokens
+        return served
+    
+    def _record_usage(self, usage: dict, task: str, model: str):
+        # 按用户汇总的用量只在内存累加，由后台线程批量写库
+        get_usage_tracker().record(task, model, usage)
+        with _api_stats_lock:
+            api_stats['total_calls'] += 1
+            api_stats['total_prompt_tokens'] += usage.get('prompt_tokens', 0)
+            api_stats['total_completion_tokens'] += usage.get('completion_tokens', 0)
+            api_stats['total_tokens'] += usage.get('total_tokens', 0)
+            api_stats['last_call_time'] = str(datetime.now())
+    
+    def _format_error(self, response: requests.Response) -> str:
+        error_msg = f"API request failed: {response.status_code}"
         try:
-            response = requests.post(
-                self.api_url,
-                headers=self.headers,
-                json=payload,
-                timeout=60
-            )
+            error_data = response.json()
+            error_msg += f" - {error_data.get('error', {}).get('message', response.text)}"
+        except:
+            error_msg += f" - {response.text}"
+        return error_msg
+    
+    def _estimate_tokens(self, payload: dict) -> int:
+        """预估本次请求的token数（提示词 + max_tokens），用于TPM限流预扣"""
+        prompt_tokens = sum(estimate_tokens(m['content']) for m in payload['messages'])
+        return prompt_tokens + payload['max_tokens']
+    
+    def _estimate_usage(self, payload: dict, content: str) -> dict:
+        """provider的流式响应没有返回usage时按文本估算用量"""
+        prompt_tokens = sum(estimate_tokens(m['content']) for m in payload['messages'])
+        completion_tokens = estimate_tokens(content or '')
+        return {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'estimated': True
+        }
+    
+    def _settle_tokens(self, provider, reserved: int, usage: dict):
+        """按实际用量校正限流预扣的token"""
+        if usage.get('total_tokens'):
+            provider.limiter.release(reserved - usage['total_tokens'])
+    
+    def _acquire_slot(self, route) -> Optional[tuple]:
+        """
+        按会员等级排队获取该模型的provider并发名额
+        
+        Returns:
+            (调度器, Ticket)，用完后调用 scheduler.release(ticket)；排队超时返回None
+        """
+        scheduler = get_llm_scheduler(route.model or self.api_config['model_name'])
+        timeout = AI_SCHEDULER_MAX_WAIT
+        budget = deadline_remaining()
+        if budget is not None:
+            timeout = max(0.0, min(timeout, budget))
+        ticket = scheduler.acquire(current_user(), route.tier, timeout)
+        if ticket is None:
+            record_retry_event('queue_timeouts')
+            print(f"AI request skipped: waited {timeout:.1f}s for a provider slot ({route.task}, tier {route.tier})")
+            return None
+        return scheduler, ticket
+    
+    def _read_timeout(self, task: str, stream: bool) -> float:
+        """
+        按该任务近期的p99延迟自适应读取超时，样本不足时使用AI_TIMEOUT
+        
+        流式请求的读取超时作用于每次读取，因此按首个片段耗时计算
+        """
+        p99 = get_llm_metrics().latency_quantile(task, 0.99, first_token=stream,
+                                                  min_samples=AI_ADAPTIVE_TIMEOUT_MIN_SAMPLES)
+        if p99 is None:
+            return AI_TIMEOUT
+        return min(AI_TIMEOUT, max(AI_ADAPTIVE_TIMEOUT_MIN, p99 * AI_ADAPTIVE_TIMEOUT_MULTIPLIER))
+    
+    def _send(self, payload: dict, tokens: int, stream: bool = False, task: str = 'general',
+              model: Optional[str] = None, max_tokens: Optional[int] = None) -> Optional[tuple]:
+        """
+        发送请求：按评分挑选provider，失败时先切换到其他provider，
+        所有provider都失败过后按指数退避重试；provider熔断时直接跳过，
+        超出限流额度时排队等待，预计等待过久则直接拒绝；
+        请求设置了截止时间时，超时取剩余时间，来不及重试则直接失败
+        
+        Args:
+            payload: 请求体（model字段按选中的provider替换）
+            tokens: 预计消耗的token数
+            stream: 是否流式请求（只在收到响应前重试）
+            task: 任务名，用于自适应读取超时
+            model: 模型路由选中的模型，优先发给提供该模型的provider
+            max_tokens: 调用方要求的最大输出token，回退到非路由provider时代替路由的限制
+        
+        Returns:
+            (状态码为200的响应, provider)，失败时返回None
+        """
+        tried = set()
+        error = None
+        delay = None
+        read_timeout = self._read_timeout(task, stream)
+        
+        for attempt in range(AI_MAX_RETRIES + 1):
+            budget = deadline_remaining()
+            if budget is not None and budget <= 0:
+                record_retry_event('deadline_exceeded')
+                print(f"AI request skipped: request deadline exceeded ({task})")
+                return None
+            max_wait = AI_RATE_LIMIT_MAX_WAIT if budget is None else min(AI_RATE_LIMIT_MAX_WAIT, budget)
             
-            if response.status_code == 200:
-                result = response.json()
-                usage = result.get('usage', {})
-                api_stats['total_calls'] += 1
-                api_stats['total_prompt_tokens'] += usage.get('prompt_tokens', 0)
-                api_stats['total_completion_tokens'] += usage.get('completion_tokens', 0)
-                api_stats['total_tokens'] += usage.get('total_tokens', 0)
-                api_stats['last_call_time'] = str(datetime.now())
-                return result['choices'][0]['message']['content']
-            else:
-                error_msg = f"API request failed: {response.status_code}"
-                try:
-                    error_data = response.json()
-                    error_msg += f" - {error_data.get('error', {}).get('message', response.text)}"
-                except:
-                    error_msg += f" - {response.text}"
-                print(error_msg)
+            try:
+                selected = self.pool.select(exclude=tried, tokens=tokens, max_wait=max_wait, model=model)
+                if selected is None and tried:
+                    # 所有可用provider都已失败过，退避后再试
+                    if delay is None:
+                        break
+                    if budget is not None and delay >= budget:
+                        record_retry_event('deadline_exceeded')
+                        print(f"{error}; not retrying, request deadline too close")
+                        return None
+                    record_retry_event('retries')
+                    print(f"{error}; retrying in {delay:.1f}s ({attempt}/{AI_MAX_RETRIES})")
+                    time.sleep(delay)
+                    tried.clear()
+                    if budget is not None:
+                        max_wait = max(0.0, min(max_wait, deadline_remaining()))
+                    selected = self.pool.select(tokens=tokens, max_wait=max_wait, model=model)
+                elif tried:
+                    record_retry_event('failovers')
+                    print(f"{error}; failing over to {selected[0].id}")
+            except RateLimitExceeded as e:
+                record_retry_event('rate_limit_rejections')
+                print(f"AI request rejected: {e}")
                 return None
+            
+            if selected is None:
+                record_retry_event('circuit_rejections')
+                print("All AI providers are unavailable (circuit open), failing fast")
+                return None
+            
+            provider, wait = selected
+            if wait > 0:
+                time.sleep(wait)
+            
+            timeout = read_timeout
+            if budget is not None:
+                timeout = min(timeout, deadline_remaining())
+                if timeout <= 0:
+                    provider.limiter.release(tokens, requests=1)
+                    get_circuit_breaker(provider.id).record_cancelled()
+                    record_retry_event('deadline_exceeded')
+                    print(f"AI request skipped: request deadline exceeded ({task})")
+                    return None
+            
+            breaker = get_circuit_breaker(provider.id)
+            retry_after = None
+            started = self.pool.begin(provider)
+            try:
+                response = get_http_session(provider.config['api_base_url']).post(
+                    provider.api_url,
+                    headers=provider.headers,
+                    json=self._served_payload(payload, provider, model, max_tokens),
+                    timeout=(min(AI_CONNECT_TIMEOUT, timeout), timeout),
+                    stream=stream
+                )
+            except requests.exceptions.ReadTimeout:
+                # 模型已在生成，重试只会让用户再等一个完整超时
+                if timeout < read_timeout:
+                    # 截止时间先到，不能说明provider异常
+                    breaker.record_cancelled()
+                    self.pool.cancel(provider)
+                    record_retry_event('deadline_exceeded')
+                else:
+                    breaker.record_failure()
+                    self.pool.finish(provider, started, ok=False)
+                print(f"API request timeout after {timeout:.1f}s ({provider.id})")
+                return None
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                breaker.record_failure()
+                self.pool.finish(provider, started, ok=False)
+                provider.limiter.release(tokens)
+                error = f"API connection error ({provider.id}): {e}"
+            else:
+                if response.status_code == 200:
+                    breaker.record_success()
+                    self.pool.finish(provider, started, ok=True, headers=response.headers)
+                    return response, provider
                 
-        except requests.exceptions.Timeout:
-            print("API request timeout")
+                error = self._format_error(response)
+                if response.status_code not in RETRYABLE_STATUS:
+                    # 4xx说明provider本身可用，不计入熔断
+                    breaker.record_success()
+                    self.pool.finish(provider, started, ok=True, headers=response.headers)
+                    provider.limiter.release(tokens)
+                    response.close()
+                    print(error)
+                    return None
+                
+                breaker.record_failure()
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                self.pool.finish(provider, started, ok=False, headers=response.headers,
+                                 retry_after=retry_after if response.status_code == 429 else None)
+                provider.limiter.release(tokens)
+                response.close()
+            
+            tried.add(provider.id)
+            delay = compute_backoff(attempt, AI_RETRY_BASE_DELAY, AI_RETRY_MAX_DELAY, retry_after)
+        
+        record_retry_event('retries_exhausted')
+        print(error)
+        return None
+    
+    def chat(self, messages: list, temperature: float = 0.7, system_prompt: Optional[str] = None,
+             use_cache: bool = True, task: str = 'general', max_tokens: int = 4000) -> Optional[str]:
+        route = get_model_router().route(task)
+        payload, request_key = self._build_payload(messages, temperature, system_prompt, use_cache,
+                                                   max_tokens, route)
+        if request_key is None:
+            return self._complete(payload, None, route, max_tokens)
+        
+        if LLM_CACHE_ENABLED:
+            cached = get_llm_cache().get(request_key)
+            if cached is not None:
+                get_llm_metrics().record_cache_hit(task)
+                return cached
+        
+        # 双击、前端重试或多人同时分析同一JD时，相同请求只调用一次provider
+        try:
+            content, shared = _inflight_requests.do(
+                request_key, lambda: self._complete(payload, request_key, route, max_tokens)
+            )
+        except TimeoutError as e:
+            record_retry_event('deadline_exceeded')
+            print(f"AI request skipped: {e} ({task})")
             return None
+        if shared:
+            get_llm_metrics().record_coalesced(task)
+        return content
+    
+    def _complete(self, payload: dict, request_key: Optional[str], route,
+                  max_tokens: Optional[int] = None) -> Optional[str]:
+        """发送非流式请求并写入缓存（缓存键按实际响应的模型计算）"""
+        task = route.task
+        slot = self._acquire_slot(route)
+        if slot is None:
+            return None
+        
+        tokens = self._estimate_tokens(payload)
+        started = time.monotonic()
+        usage = {}
+        content = None
+        model = payload['model']
+        truncated = False
+        try:
+            sent = self._send(payload, tokens, task=task, model=route.model, max_tokens=max_tokens)
+            if sent is None:
+                return None
+            
+            response, provider = sent
+            model = provider.config['model_name']
+            result = response.json()
+            usage = result.get('usage', {})
+            self._record_usage(usage, task, model)
+            self._settle_tokens(provider, tokens, usage)
+            choice = result['choices'][0]
+            content = choice['message']['content']
+            truncated = choice.get('finish_reason') == 'length'
+            if request_key and LLM_CACHE_ENABLED and self._cacheable(task, content, truncated):
+                served = self._served_payload(payload, provider, route.model, max_tokens)
+                get_llm_cache().set(self._cache_key(served), content)
+            return content
+            
         except Exception as e:
             print(f"API request error: {e}")
             return None
+        finally:
+            slot[0].release(slot[1])
+            latency = time.monotonic() - started
+            get_llm_metrics().record_call(task, latency, bool(content), usage)
+            self._record_route(route, model, latency, content, truncated, usage)
+    
+    def _cacheable(self, task: str, content: Optional[str], truncated: bool) -> bool:
+        """被max_tokens截断的输出和结构化任务中不完整的JSON不写缓存，否则在有效期内会一直返回这个坏结果"""
+        if not content or truncated:
+            return False
+        return task not in JSON_TASKS or parse_json_strict(content) is not None
+    
+    def _record_route(self, route, model: str, latency: float, content: Optional[str],
+                      truncated: bool, usage: dict):
+        """按路由记录延迟和质量：结构化任务检查结果能否解析"""
+        valid = None
+        if content and route.task in JSON_TASKS:
+            valid = bool(parse_json_tolerant(content))
+        get_model_router().record(route, model, latency, bool(content), valid=valid,
+                                  truncated=truncated, usage=usage)
+    
+    def chat_stream(self, messages: list, temperature: float = 0.7, system_prompt: Optional[str] = None,
+                    use_cache: bool = True, task: str = 'general', max_tokens: int = 4000) -> Iterator[str]:
+        """
+        流式对话（provider stream=true），逐段产出模型输出的文本
+        
+        Args:
+            messages: 对话消息
+            temperature: 采样温度
+            system_prompt: 系统提示词，None时使用默认
+            use_cache: 是否读写响应缓存
+            task: 任务名，用于按任务统计指标
+            max_tokens: 最大输出token（模型路由可能进一步限制）
+        
+        Yields:
+            文本片段；缓存命中或合并到进行中的相同请求时一次性产出完整内容
+        """
+        route = get_model_router().route(task)
+        payload, request_key = self._build_payload(messages, temperature, system_prompt, use_cache,
+                                                   max_tokens, route)
+        
+        if request_key and LLM_CACHE_ENABLED:
+            cached = get_llm_cache().get(request_key)
+            if cached is not None:
+                get_llm_metrics().record_cache_hit(task)
+                yield cached
+                return
+        
+        call = None
+        if request_key:
+            call, leader = _inflight_requests.begin(request_key)
+            if not leader:
+                try:
+                    content = call.wait()
+                except TimeoutError as e:
+                    record_retry_event('deadline_exceeded')
+                    print(f"AI request skipped: {e} ({task})")
+                    return
+                if not call.abandoned:
+                    get_llm_metrics().record_coalesced(task)
+                    if content:
+                        yield content
+                    return
+                # 发起方中途断开，自行请求
+                call = None
+        
+        payload['stream'] = True
+        # OpenAI兼容接口默认不在流式响应中返回usage
+        payload['stream_options'] = {'include_usage': True}
+        parts = []
+        usage = {}
+        content = None
+        abandoned = True
+        
+        tokens = self._estimate_tokens(payload)
+        slot = None
+        provider = None
+        started = time.monotonic()
+        first_token = None
+        model = payload['model']
+        truncated = False
+        try:
+            slot = self._acquire_slot(route)
+            if slot is None:
+                abandoned = False
+                return
+            
+            started = time.monotonic()
+            sent = self._send(payload, tokens, stream=True, task=task, model=route.model,
+                              max_tokens=max_tokens)
+            if sent is None:
+                abandoned = False
+                return
+            
+            response, provider = sent
+            model = provider.config['model_name']
+            with response:
+                response.encoding = 'utf-8'
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith('data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == '[DONE]':
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except json.JSONDecodeError:
+                        continue
+                    if chunk.get('usage'):
+                        usage = chunk['usage']
+                    choices = chunk.get('choices') or []
+                    if not choices:
+                        continue
+                    if choices[0].get('finish_reason') == 'length':
+                        truncated = True
+                    delta = (choices[0].get('delta') or {}).get('content')
+                    if delta:
+                        if first_token is None:
+                            first_token = time.monotonic() - started
+                        parts.append(delta)
+                        yield delta
+            
+            content = ''.join(parts)
+            abandoned = False
+            if request_key and LLM_CACHE_ENABLED and self._cacheable(task, content, truncated):
+                served = self._served_payload(payload, provider, route.model, max_tokens)
+                get_llm_cache().set(self._cache_key(served), content)
+                
+        except requests.exceptions.Timeout:
+            abandoned = False
+            print("API stream timeout")
+        except Exception as e:
+            abandoned = False
+            print(f"API stream error: {e}")
+        finally:
+            if provider is not None:
+                # 客户端中途断开或读取出错时provider仍按已生成的内容计费，同样按用户记录用量
+                if not usage:
+                    usage = self._estimate_usage(payload, ''.join(parts))
+                self._record_usage(usage, task, model)
+                self._settle_tokens(provider, tokens, usage)
+            if slot is not None:
+                slot[0].release(slot[1])
+                latency = time.monotonic() - started
+                get_llm_metrics().record_call(task, latency, bool(parts), usage, first_token=first_token)
+                if not abandoned:
+                    self._record_route(route, model, latency, content, truncated, usage)
+            if call is not None:
+                # 消费方中途关闭生成器（GeneratorExit）时标记为放弃，等待方改为自行请求
+                _inflight_requests.finish(request_key, call, content, abandoned=abandoned)
+    
+    def stream_json(self, messages: list, temperature: float = 0.7,
+                    default: Optional[dict] = None, task: str = 'general') -> Iterator[tuple]:
+        """
+        流式请求JSON结果，字段或数组元素一旦完整即产出
+        
+        Args:
+            messages: 对话消息
+            temperature: 采样温度
+            default: 完整结果无法解析时的默认值
+            task: 任务名，用于按任务统计指标
+        
+        Yields:
+            ('field', key, value) / ('item', key, value)，最后产出 ('done', None, 完整结果)
+        """
+        parser = JSONStreamParser()
+        for text in self.chat_stream(messages, temperature=temperature, task=task):
+            for event in parser.feed(text):
+                yield event
+        
+        result = parser.result()
+        if parser.truncated and result:
+            print(f"Recovered truncated streamed JSON (keys: {list(result)})")
+        yield ('done', None, result or default or {})
     
     def analyze_resume(self, resume_text: str) -> dict:
         prompt = f"""作为资深HR专家，请对以下简历进行全面分析评估。
 
 【简历内容】
-{resume_text[:8000]}
+{compress_resume(resume_text, 'analyze')}
 
 【分析要求】
 请从以下6个维度进行评估：
@@ -173,18 +760,17 @@ class AIClient:
 - <60：建议大改或重写"""
 
         messages = [{"role": "user", "content": prompt}]
-        response = self.chat(messages, temperature=0.5)
+        response = self.chat(messages, temperature=0.5, task='analyze')
         
-        if response:
-            return self._parse_json_response(response)
-        return self._get_default_analysis()
+        result = self._parse_json_response(response) if response else None
+        return result or self._get_default_analysis(resume_text)
     
     def generate_optimization_suggestions(self, resume_text: str, analysis: dict) -> dict:
         """根据分析结果生成具体的简历优化建议"""
         prompt = f"""根据以下简历分析结果，生成具体的优化建议。
 
 【原始简历摘要】
-{resume_text[:4000]}
+{compress_resume(resume_text, 'optimize')}
 
 【分析结果】
 {json.dumps(analysis, ensure_ascii=False, indent=2)}
@@ -220,15 +806,12 @@ JSON格式：
     ],
     "overall_improvement_plan": "整体改进计划（100字以内）"
 }}"""
-        
+
         messages = [{"role": "user", "content": prompt}]
-        response = self.chat(messages, temperature=0.6)
+        response = self.chat(messages, temperature=0.6, task='optimize')
         
         if response:
-            try:
-                return json.loads(response)
-            except json.JSONDecodeError:
-                return {}
+            return self._parse_json_response(response)
         return {}
     
     def predict_interview_rate(self, resume_text: str, jd_text: str = None) -> dict:
@@ -236,9 +819,9 @@ JSON格式：
         prompt = f"""请评估这份简历通过面试筛选的概率。
 
 【简历内容】
-{resume_text[:6000]}
+{self._resume_context(resume_text, 'predict', jd_text or '')}
 
-{'【目标岗位JD】' + jd_text[:2000] if jd_text else ''}
+{'【目标岗位JD】' + compress_jd(jd_text, JD_TOKEN_BUDGET // 2) if jd_text else ''}
 
 【评估维度】
 1. 硬性条件匹配度（学历、经验年限、技能要求）
@@ -256,25 +839,77 @@ JSON格式：
     "improvement_to_increase_rate": ["提升通过率的建议1"],
     "similar_success_cases": "类似背景候选人成功案例参考"
 }}"""
-        
+
         messages = [{"role": "user", "content": prompt}]
-        response = self.chat(messages, temperature=0.5)
+        response = self.chat(messages, temperature=0.5, task='predict')
         
         if response:
-            try:
-                return json.loads(response)
-            except json.JSONDecodeError:
-                return {}
+            return self._parse_json_response(response)
         return {}
     
+    def _resume_context(self, resume_text: str, task: str, jd_text: str = '') -> str:
+        """
+        下游任务提示词中的简历：已有简历摘要且比压缩后的原文短时使用摘要，否则按预算压缩原文
+        
+        Args:
+            resume_text: 简历纯文本
+            task: 任务名（见 PROMPT_TOKEN_BUDGETS）
+            jd_text: 用于压缩原文时计算章节相关度
+        """
+        compressed = compress_resume(resume_text, task, jd_text)
+        if not RESUME_SUMMARY_ENABLED or task not in RESUME_SUMMARY_TASKS:
+            return compressed
+        summary = get_resume_summary(resume_text)
+        if not summary:
+            return compressed
+        rendered = render_summary(summary)
+        return rendered if estimate_tokens(rendered) < estimate_tokens(compressed) else compressed
+    
+    def summarize_resume(self, resume_text: str) -> Optional[dict]:
+        """
+        生成简历的结构化摘要（每份简历只调用一次，结果由 utils.resume_summary 保存）
+        
+        Returns:
+            摘要字典，AI不可用或无法解析时返回None
+        """
+        prompt = f"""[Resume Summary] - Extract a compact, factual summary for later prompts
+
+[Resume]
+{compress_resume(resume_text, 'analyze')}
+
+[Requirements]
+- Keep the resume's original language; copy names, dates, numbers and technologies exactly, never invent facts
+- roles: every work experience, newest first; highlights: at most 3 per role, prefer quantified results
+- projects: at most 4 most substantial projects
+- achievements: quantified results not already listed in highlights
+- skills: technologies, tools and professional skills only
+- Leave out contact details (phone, email, address)
+
+[Output Format]
+JSON only:
+{{
+    "name": "candidate name",
+    "headline": "current title + years of experience + focus area, one sentence",
+    "roles": [{{"title": "company + position", "period": "2020.03 - present", "highlights": ["quantified result"]}}],
+    "projects": [{{"title": "project name + role", "period": "2021.05 - 2022.01", "highlights": ["what was built and the result"]}}],
+    "education": ["period school major degree"],
+    "skills": ["skill 1", "skill 2"],
+    "achievements": ["other quantified achievement"]
+}}"""
+
+        messages = [{"role": "user", "content": prompt}]
+        response = self.chat(messages, temperature=0.2, task='summary')
+        result = self._parse_json_response(response) if response else None
+        return result or None
+    
     def match_jd(self, resume_text: str, jd_text: str) -> dict:
         prompt = f"""[Precise Job Matching Analysis]
 
 [Resume Summary]
-{resume_text[:6000]}
+{self._resume_context(resume_text, 'match', jd_text)}
 
 [Target Job Description]
-{jd_text[:4000]}
+{compress_jd(jd_text)}
 
 [Matching Analysis Requirements]
 Please quickly evaluate:
@@ -305,20 +940,99 @@ Return JSON:
 - Suggestions should be specific and actionable, not empty words"""
 
         messages = [{"role": "user", "content": prompt}]
-        response = self.chat(messages, temperature=0.5)
+        response = self.chat(messages, temperature=0.5, task='match')
         
-        if response:
-            return self._parse_json_response(response)
-        return self._get_default_match()
+        result = self._parse_json_response(response) if response else None
+        return result or self._get_default_match(resume_text, jd_text)
     
-    def generate_interview_questions(self, resume_text: str, jd_text: str) -> dict:
+    def match_jds(self, resume_text: str, jd_texts: list) -> dict:
+        """
+        一次调用评估简历与多个JD的匹配度，简历只发送一次
+        
+        Args:
+            resume_text: 简历纯文本
+            jd_texts: 岗位JD文本列表
+        
+        Returns:
+            {JD在jd_texts中的位置: 匹配结果}，只包含解析成功且带匹配分数的JD
+        """
+        if len(jd_texts) == 1:
+            # 单个JD使用完整的匹配提示词，AI不可用时由调用方使用本地估算
+            result = self.match_jd(resume_text, jd_texts[0])
+            matches = [dict(result, jd=1)] if result.get('source') != 'local' else []
+            return self._collect_matches(matches, 1)
+        
+        resume = self._resume_context(resume_text, 'match', '\n'.join(jd_texts))
+        jds = '\n\n'.join(
+            f'[JD {number}]\n{compress_jd(jd_text, MULTI_MATCH_JD_TOKEN_BUDGET)}'
+            for number, jd_text in enumerate(jd_texts, 1)
+        )
+        prompt = f"""[Multi Job Matching Analysis] - Score one resume against each job description below
+
+[Resume Summary]
+{resume}
+
+[Job Descriptions]
+{jds}
+
+[Matching Analysis Requirements]
+Evaluate every job description independently with the same standard, so scores are comparable:
+- match_score (0-100): 90+ highly matching, 75-89 basic matching, 60-74 partial matching, <60 not recommended
+- matched_skills: required by the JD and present in the resume
+- missing_skills: required by the JD but missing, marked "trainable" or "hard requirement"
+- suggestions: at most 2, specific to that JD
+
+[Output Format]
+Return JSON with exactly one entry per job description, "jd" is its number:
+{{
+    "matches": [
+        {{
+            "jd": 1,
+            "match_score": 75,
+            "matched_skills": ["matched skill 1"],
+            "missing_skills": ["missing skill 1 (trainable/hard requirement)"],
+            "matched_experiences": ["related experience"],
+            "suggestions": ["specific improvement suggestion"],
+            "match_details": "one sentence summary of matching situation"
+        }}
+    ]
+}}"""
+
+        messages = [{"role": "user", "content": prompt}]
+        max_tokens = min(AI_COMBINED_MAX_TOKENS, MULTI_MATCH_TOKENS_PER_JD * len(jd_texts))
+        response = self.chat(messages, temperature=0.5, task='match-multi', max_tokens=max_tokens)
+        if not response:
+            return {}
+        
+        matches = self._parse_json_response(response).get('matches')
+        results = self._collect_matches(matches if isinstance(matches, list) else [], len(jd_texts))
+        if len(results) < len(jd_texts):
+            print(f"Multi-JD match incomplete: {len(results)}/{len(jd_texts)} JDs scored")
+        return results
+    
+    def _collect_matches(self, matches: list, count: int) -> dict:
+        """按jd编号整理多JD匹配结果，丢弃编号越界或没有可解析分数的条目"""
+        results = {}
+        for entry in matches:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                position = int(entry.pop('jd')) - 1
+                entry['match_score'] = int(float(entry['match_score']))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if 0 <= position < count:
+                results.setdefault(position, entry)
+        return results
+    
+    def _interview_messages(self, resume_text: str, jd_text: str) -> list:
         prompt = f"""[Interview Prep] - Generate questions based on your resume and target position
 
 [Resume Highlights]
-{resume_text[:6000]}
+{self._resume_context(resume_text, 'interview', jd_text)}
 
 [Target Position]
-{jd_text[:4000]}
+{compress_jd(jd_text)}
 
 [Generation Requirements]
 As a senior interviewer, generate 12-15 high-frequency and precise interview questions:
@@ -357,21 +1071,24 @@ JSON only:
 - Technical questions should combine with specific technologies mentioned in resume
 - Behavioral questions should combine with specific experiences in resume"""
 
-        messages = [{"role": "user", "content": prompt}]
-        response = self.chat(messages, temperature=0.7)
+        return [{"role": "user", "content": prompt}]
+    
+    def generate_interview_questions(self, resume_text: str, jd_text: str) -> dict:
+        messages = self._interview_messages(resume_text, jd_text)
+        response = self.chat(messages, temperature=0.7, task='interview')
         
         if response:
             return self._parse_json_response(response)
         return self._get_default_questions()
     
-    def generate_self_introduction(self, resume_text: str, jd_text: str) -> dict:
+    def _self_introduction_messages(self, resume_text: str, jd_text: str) -> list:
         prompt = f"""[Self-Introduction Customization] - Optimized for target position
 
 [Your Resume]
-{resume_text[:6000]}
+{self._resume_context(resume_text, 'self-intro', jd_text)}
 
 [Target Position]
-{jd_text[:4000]}
+{compress_jd(jd_text)}
 
 [Writing Requirements]
 As a career consultant, generate 2 versions of self-introduction:
@@ -406,53 +1123,91 @@ JSON:
 - Use conversational language, suitable for interview delivery
 - Should be able to speak naturally after memorizing, not like reciting"""
 
-        messages = [{"role": "user", "content": prompt}]
-        response = self.chat(messages, temperature=0.7)
+        return [{"role": "user", "content": prompt}]
+    
+    def generate_self_introduction(self, resume_text: str, jd_text: str) -> dict:
+        messages = self._self_introduction_messages(resume_text, jd_text)
+        response = self.chat(messages, temperature=0.7, task='self-intro')
         
         if response:
             return self._parse_json_response(response)
         return self._get_default_introduction()
     
-    def _parse_json_response(self, response: str) -> dict:
-        try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            import re
-            json_match = re.search(r'interview_questions"\s*:\s*\[([\s\S]*?)\]', response)
-            if json_match:
-                try:
-                    questions_str = "[" + json_match.group(1) + "]"
-                    questions = json.loads(questions_str)
-                    return {"interview_questions": questions}
-                except json.JSONDecodeError:
-                    pass
-            
-            json_match = re.search(r'\{[\s\S]*\}', response)
-            if json_match:
-                try:
-                    return json.loads(json_match.group())
-                except json.JSONDecodeError:
-                    pass
+    def stream_interview_questions(self, resume_text: str, jd_text: str) -> Iterator[tuple]:
+        """流式生成面试题，每道题解析完成即产出"""
+        return self.stream_json(self._interview_messages(resume_text, jd_text), temperature=0.7,
+                                default=self._get_default_questions(), task='interview')
+    
+    def stream_self_introduction(self, resume_text: str, jd_text: str) -> Iterator[tuple]:
+        """流式生成自我介绍，每个部分解析完成即产出"""
+        return self.stream_json(self._self_introduction_messages(resume_text, jd_text), temperature=0.7,
+                                default=self._get_default_introduction(), task='self-intro')
+    
+    def analyze_combined(self, resume_text: str, jd_text: str, tasks: list) -> dict:
+        """
+        一次调用同时完成多个分析任务，简历和JD只发送一次
+        
+        Args:
+            resume_text: 简历纯文本
+            jd_text: 岗位JD文本
+            tasks: 任务名列表（analyze/match/interview/self_intro）
+        
+        Returns:
+            {任务名: 结果}，只包含解析成功且结构完整的部分
+        """
+        sections = {name: spec for name, spec in COMBINED_SECTIONS.items() if name in tasks}
+        if not sections:
             return {}
+        
+        requirements = '\n\n'.join(
+            f'**"{name}"** - {spec["instruction"]}\n{spec["schema"]}'
+            for name, spec in sections.items()
+        )
+        prompt = f"""[Combined Resume Analysis] - Complete all sections below in a single JSON response
+
+[Resume]
+{compress_resume(resume_text, 'combined', jd_text)}
+
+[Target Position]
+{compress_jd(jd_text) if jd_text else 'Not provided, infer the most suitable position from the resume'}
+
+[Sections]
+{requirements}
+
+[Output Format]
+Return one JSON object whose top-level keys are exactly: {', '.join(f'"{name}"' for name in sections)}
+Each value must follow the schema of its section. JSON only.
+
+[Important]
+- All content must be customized for this candidate, not generic templates
+- Suggestions should be specific and actionable"""
+
+        messages = [{"role": "user", "content": prompt}]
+        response = self.chat(messages, temperature=0.6, task='combined', max_tokens=AI_COMBINED_MAX_TOKENS)
+        if not response:
+            return {}
+        
+        parsed = self._parse_json_response(response)
+        results = {}
+        for name, spec in sections.items():
+            section = parsed.get(name)
+            if isinstance(section, dict) and section.get(spec['required']):
+                results[name] = section
+        
+        if len(results) < len(sections):
+            print(f"Combined analysis incomplete, missing sections: {sorted(set(sections) - set(results))}")
+        return results
     
-    def _get_default_analysis(self) -> dict:
-        return {
-            "score": 70,
-            "strengths": ["Resume structure is clear"],
-            "weaknesses": ["Consider adding more quantified data"],
-            "suggestions": ["Optimize job descriptions", "Add project experience"],
-            "recommended_positions": ["Suggest consulting specific position direction"]
-        }
+    def _parse_json_response(self, response: str) -> dict:
+        return parse_json_tolerant(response)
     
-    def _get_default_match(self) -> dict:
-        return {
-            "match_score": 60,
-            "matched_skills": [],
-            "missing_skills": ["Please re-analyze after uploading resume and JD"],
-            "matched_experiences": [],
-            "suggestions": ["Ensure resume and JD information is complete"],
-            "match_details": "Information incomplete, cannot accurately match"
-        }
+    def _get_default_analysis(self, resume_text: str) -> dict:
+        """AI不可用时使用本地规则分析"""
+        return analyze_locally(resume_text)
+    
+    def _get_default_match(self, resume_text: str, jd_text: str) -> dict:
+        """AI不可用时按技能关键词估算匹配度"""
+        return match_locally(resume_text, jd_text)
     
     def _get_default_questions(self) -> dict:
         return {
@@ -477,25 +1232,38 @@ JSON:
 
 def get_api_stats() -> dict:
     config = get_api_config()
+    with _api_stats_lock:
+        stats = api_stats.copy()
     return {
-        "provider": api_stats['provider'] or config['provider_name'],
-        "model": api_stats['model'] or config['model_name'],
-        "total_calls": api_stats['total_calls'],
-        "total_prompt_tokens": api_stats['total_prompt_tokens'],
-        "total_completion_tokens": api_stats['total_completion_tokens'],
-        "total_tokens": api_stats['total_tokens'],
-        "last_call_time": api_stats['last_call_time'],
-        "is_custom_key": config['is_custom']
+        "provider": stats['provider'] or config['provider_name'],
+        "model": stats['model'] or config['model_name'],
+        "total_calls": stats['total_calls'],
+        "total_prompt_tokens": stats['total_prompt_tokens'],
+        "total_completion_tokens": stats['total_completion_tokens'],
+        "total_tokens": stats['total_tokens'],
+        "last_call_time": stats['last_call_time'],
+        "is_custom_key": config['is_custom'],
+        "cache": get_llm_cache().get_stats(),
+        "resilience": get_resilience_stats(),
+        "providers": get_provider_pool().get_stats(),
+        "tasks": get_llm_metrics().summary(),
+        "usage_tracker": get_usage_tracker().get_stats(),
+        "model_routes": get_model_router().get_stats(),
+        "scheduler": get_scheduler_stats(),
+        "resume_summaries": get_summary_stats(),
+        "inflight_requests": _inflight_requests.in_flight()
     }
 
 
 def reset_api_stats() -> dict:
-    stats = api_stats.copy()
-    api_stats['total_calls'] = 0
-    api_stats['total_prompt_tokens'] = 0
-    api_stats['total_completion_tokens'] = 0
-    api_stats['total_tokens'] = 0
-    api_stats['last_call_time'] = None
+    # 只重置状态页的累计值，/metrics 中的计数器保持单调递增
+    with _api_stats_lock:
+        stats = api_stats.copy()
+        api_stats['total_calls'] = 0
+        api_stats['total_prompt_tokens'] = 0
+        api_stats['total_completion_tokens'] = 0
+        api_stats['total_tokens'] = 0
+        api_stats['last_call_time'] = None
     return stats
 
 
@@ -514,13 +1282,15 @@ def test_api_key(api_key: str, api_base_url: str = "", model_name: str = "") ->
         "max_tokens": 10
     }
     
+    started = time.monotonic()
     try:
-        response = requests.post(
+        response = get_http_session(test_url).post(
             f"{test_url}/chat/completions",
             headers=headers,
             json=payload,
             timeout=30
         )
+        get_llm_metrics().record_call('test', time.monotonic() - started, response.status_code == 200)
         
         if response.status_code == 200:
             return {"success": True, "message": "API Key is valid"}
@@ -533,6 +1303,7 @@ def test_api_key(api_key: str, api_base_url: str = "", model_name: str = "") ->
                 error_msg = f"Error code: {response.status_code}"
             return {"success": False, "message": error_msg}
     except Exception as e:
+        get_llm_metrics().record_call('test', time.monotonic() - started, False)
         return {"success": False, "message": f"Connection failed: {str(e)}"}
 
 
@@ -1,3 +1,8 @@
+import time
+import hashlib
+import threading
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed, TimeoutError as FutureTimeoutError
 from utils.file_parser import (
     parse_resume,
     extract_contact_info,
@@ -5,6 +10,35 @@ from utils.file_parser import (
     suggest_job_positions
 )
 from utils.ai_client import get_ai_client
+from utils.deadline import submit_with_context, remaining as deadline_remaining
+from utils.local_analyzer import analyze_locally, match_locally
+from utils.usage_tracker import current_user, user_scope
+from config import AI_TASK_WORKERS, AI_BATCH_CONCURRENCY, AI_COMBINED_PROMPT, ANALYSIS_SLA_SECONDS
+from config import SPECULATIVE_WORKERS, SPECULATIVE_MAX_PENDING, SPECULATION_TTL
+from config import MULTI_MATCH_BATCH_SIZE
+
+
+# 一键分析的共享线程池，限制同时进行的AI调用数量
+_task_executor = ThreadPoolExecutor(max_workers=AI_TASK_WORKERS, thread_name_prefix='ai-task')
+
+# 批量分析的共享线程池，限制批量请求同时处理的简历数，避免挤占交互请求
+_batch_executor = ThreadPoolExecutor(max_workers=AI_BATCH_CONCURRENCY, thread_name_prefix='ai-batch')
+
+# 简历分析的AI调用线程池；超出响应时限后调用在这里继续完成，不受请求截止时间限制
+_enrichment_executor = ThreadPoolExecutor(max_workers=AI_TASK_WORKERS, thread_name_prefix='ai-enrich')
+
+# 上传时预先执行的简历分析，线程数单独限制，不挤占用户主动发起的请求
+_speculative_executor = ThreadPoolExecutor(max_workers=SPECULATIVE_WORKERS, thread_name_prefix='ai-speculate')
+_speculations = {}  # resume_id -> (提交时间, AI分析的Future)
+_speculations_lock = threading.Lock()
+_speculation_stats = {'started': 0, 'skipped': 0, 'hits': 0, 'joined': 0, 'cancelled': 0, 'expired': 0}
+
+
+def get_speculation_stats() -> dict:
+    with _speculations_lock:
+        stats = dict(_speculation_stats)
+        stats['pending'] = sum(1 for _, future in _speculations.values() if not future.done())
+    return stats
 
 
 DEFAULT_INTERVIEW_QUESTIONS = [
@@ -118,8 +152,113 @@ class ResumeAnalyzer:
         Returns:
             分析结果字典
         """
+        return self.analyze_within_sla(resume_text)[0]
+    
+    def speculate(self, resume_id: int, resume_text: str) -> bool:
+        """
+        在后台预先开始简历分析（上传后调用），analyze_within_sla() 可直接使用结果或等待进行中的调用
+        
+        Returns:
+            是否已有或新开始了预先分析；排队数量达到上限时返回False
+        """
+        now = time.monotonic()
+        with _speculations_lock:
+            for key, (started, future) in list(_speculations.items()):
+                if future.done() and now - started > SPECULATION_TTL:
+                    del _speculations[key]
+                    _speculation_stats['expired'] += 1
+            if resume_id in _speculations:
+                return True
+            if sum(1 for _, future in _speculations.values() if not future.done()) >= SPECULATIVE_MAX_PENDING:
+                _speculation_stats['skipped'] += 1
+                return False
+            
+            # 用量记到上传的用户
+            user_id = current_user()
+            
+            def _analyze():
+                with user_scope(user_id):
+                    return self.ai.analyze_resume(resume_text)
+            
+            _speculations[resume_id] = (now, _speculative_executor.submit(_analyze))
+            _speculation_stats['started'] += 1
+        return True
+    
+    def take_speculation(self, resume_id: int) -> Optional[Future]:
+        """取出简历的预先分析（只能取一次），没有时返回None"""
+        with _speculations_lock:
+            entry = _speculations.pop(resume_id, None)
+            if entry is None or entry[1].cancelled():
+                return None
+            _speculation_stats['hits' if entry[1].done() else 'joined'] += 1
+            return entry[1]
+    
+    def cancel_speculation(self, resume_id: int) -> bool:
+        """
+        取消简历的预先分析（简历被删除时）
+        
+        Returns:
+            是否存在预先分析；已开始的调用无法中断，结果会被丢弃
+        """
+        with _speculations_lock:
+            entry = _speculations.pop(resume_id, None)
+            if entry is None:
+                return False
+            entry[1].cancel()
+            _speculation_stats['cancelled'] += 1
+            return True
+    
+    def analyze_within_sla(self, resume_text: str, sla: Optional[float] = ANALYSIS_SLA_SECONDS,
+                           future: Optional[Future] = None) -> tuple:
+        """
+        在响应时限内完成简历分析
+        
+        AI在时限（及请求截止时间）内返回时使用AI结果；否则立即返回本地规则分析并标记
+        pending_enrichment，AI调用在后台继续，完成后通过返回的Future得到补全的结果
+        
+        Args:
+            resume_text: 简历纯文本
+            sla: 响应时限（秒），None表示等待AI结果
+            future: 已在进行的AI分析（如 take_speculation() 取出的预先分析），None时新发起调用
+        
+        Returns:
+            (分析结果, 补全结果的Future；已是最终结果时为None)
+        """
+        if future is None:
+            # 不继承请求截止时间，但用量仍记到当前用户
+            user_id = current_user()
+            
+            def _analyze():
+                with user_scope(user_id):
+                    return self.ai.analyze_resume(resume_text)
+            
+            future = _enrichment_executor.submit(_analyze)
+        timeout = sla
+        budget = deadline_remaining()
+        if budget is not None:
+            timeout = max(0.0, budget if timeout is None else min(timeout, budget))
+        try:
+            return self._build_analysis(resume_text, future.result(timeout=timeout)), None
+        except FutureTimeoutError:
+            pass
+        
+        result = self._build_analysis(resume_text, analyze_locally(resume_text))
+        result['pending_enrichment'] = True
+        
+        enriched = Future()
+        
+        def _enrich(done):
+            try:
+                enriched.set_result(self._build_analysis(resume_text, done.result()))
+            except Exception as e:
+                enriched.set_exception(e)
+        
+        future.add_done_callback(_enrich)
+        return result, enriched
+    
+    def _build_analysis(self, resume_text: str, ai_analysis: dict) -> dict:
+        """合并本地提取的信息与AI分析结果"""
         skills = extract_skills(resume_text)
-        ai_analysis = self.ai.analyze_resume(resume_text)
         contact_info = extract_contact_info(resume_text)
         recommended_positions = suggest_job_positions(skills, [])
         
@@ -132,6 +271,10 @@ class ResumeAnalyzer:
         
         return result
     
+    def rebuild_analysis(self, resume_text: str, result: dict) -> dict:
+        """复用其他简历的分析结果时只保留AI分析部分，本地提取的信息按当前简历重新生成"""
+        return self._build_analysis(resume_text, result.get('analysis') or {})
+    
     def match_with_jd(self, resume_text: str, jd_text: str) -> dict:
         """
         分析简历与岗位的匹配度
@@ -145,6 +288,55 @@ class ResumeAnalyzer:
         """
         return self.ai.match_jd(resume_text, jd_text)
     
+    def match_with_jds(self, resume_text: str, jd_texts: list, batch_size: int = MULTI_MATCH_BATCH_SIZE) -> list:
+        """
+        简历与多个岗位JD的匹配度排名
+        
+        先按技能关键词覆盖率在本地预排，按预排顺序每batch_size个JD合并为一次AI调用（简历每批只发送一次，
+        分数相近的JD在同一批中比较），各批并发执行；内容相同的JD只评估一次，AI未返回的JD使用本地估算结果
+        
+        Args:
+            resume_text: 简历纯文本
+            jd_texts: 岗位JD文本列表
+            batch_size: 每次AI调用的JD数
+        
+        Returns:
+            匹配结果列表，按匹配度从高到低排序，每项带index（在jd_texts中的位置）和local_score（本地估算分数）
+        """
+        local = [match_locally(resume_text, jd_text) for jd_text in jd_texts]
+        groups = {}
+        for index, jd_text in enumerate(jd_texts):
+            key = hashlib.sha256(jd_text.strip().encode('utf-8')).hexdigest()
+            groups.setdefault(key, []).append(index)
+        ranked = sorted(groups.values(), key=lambda indexes: -local[indexes[0]]['match_score'])
+        batches = [ranked[i:i + batch_size] for i in range(0, len(ranked), max(1, batch_size))]
+        
+        futures = {
+            submit_with_context(_task_executor, self.ai.match_jds, resume_text,
+                                [jd_texts[indexes[0]] for indexes in batch]): batch
+            for batch in batches
+        }
+        matched = {}
+        for future in as_completed(futures):
+            try:
+                batch_results = future.result()
+            except Exception as e:
+                print(f"Multi-JD match batch failed: {e}")
+                batch_results = {}
+            for position, indexes in enumerate(futures[future]):
+                if position in batch_results:
+                    for index in indexes:
+                        matched[index] = batch_results[position]
+        
+        results = []
+        for index in range(len(jd_texts)):
+            result = dict(matched.get(index) or local[index])
+            result['index'] = index
+            result['local_score'] = local[index]['match_score']
+            results.append(result)
+        results.sort(key=lambda r: (-r['match_score'], -r['local_score'], r['index']))
+        return results
+    
     def generate_interview_questions(self, resume_text: str, jd_text: str) -> dict:
         """
         生成面试题
@@ -157,7 +349,10 @@ class ResumeAnalyzer:
             面试题列表（至少12道）
         """
         result = self.ai.generate_interview_questions(resume_text, jd_text)
-        
+        return self._ensure_interview_questions(result)
+    
+    def _ensure_interview_questions(self, result: dict) -> dict:
+        """面试题不足12道时使用默认题库"""
         questions = result.get('interview_questions', [])
         
         if not questions or len(questions) < 12:
@@ -177,3 +372,132 @@ class ResumeAnalyzer:
             自我介绍内容
         """
         return self.ai.generate_self_introduction(resume_text, jd_text)
+    
+    def stream_interview_questions(self, resume_text: str, jd_text: str):
+        """
+        流式生成面试题
+        
+        Args:
+            resume_text: 简历纯文本
+            jd_text: 岗位JD文本
+        
+        Yields:
+            (事件类型, 字段名, 值)，每道题完成即产出 'item'，最后产出 'done' 及完整结果
+        """
+        for kind, key, value in self.ai.stream_interview_questions(resume_text, jd_text):
+            if kind == 'done':
+                value = self._ensure_interview_questions(value)
+            yield kind, key, value
+    
+    def stream_self_introduction(self, resume_text: str, jd_text: str):
+        """
+        流式生成自我介绍
+        
+        Args:
+            resume_text: 简历纯文本
+            jd_text: 岗位JD文本
+        
+        Yields:
+            (事件类型, 字段名, 值)，每个部分完成即产出 'field'，最后产出 'done' 及完整结果
+        """
+        return self.ai.stream_self_introduction(resume_text, jd_text)
+    
+    def analyze_all(self, resume_text: str, jd_text: str = '', tasks: list = None,
+                    combined: bool = None, sla: Optional[float] = ANALYSIS_SLA_SECONDS,
+                    speculation: Optional[Future] = None) -> dict:
+        """
+        并发执行简历分析、岗位匹配、面试题和自我介绍生成
+        
+        Args:
+            resume_text: 简历纯文本
+            jd_text: 岗位JD文本，为空时跳过岗位匹配
+            tasks: 需要执行的任务名列表，默认全部执行
+            combined: 是否先尝试合并为一次调用，默认使用 AI_COMBINED_PROMPT 配置；
+                      合并结果中缺失或不完整的任务再单独调用
+            sla: 简历分析的响应时限（秒），见 analyze_within_sla
+            speculation: 简历的预先分析（见 speculate），有时简历分析直接使用它，不参与合并调用
+        
+        Returns:
+            {'results': {任务名: 结果}, 'errors': {任务名: 错误信息},
+             'enrichments': {任务名: 补全结果的Future}}
+        """
+        task_funcs = {
+            'analyze': (self.analyze_within_sla, (resume_text, sla, speculation)),
+            'interview': (self.generate_interview_questions, (resume_text, jd_text)),
+            'self_intro': (self.generate_self_introduction, (resume_text, jd_text))
+        }
+        if jd_text:
+            task_funcs['match'] = (self.match_with_jd, (resume_text, jd_text))
+        if tasks is not None:
+            task_funcs = {name: func for name, func in task_funcs.items() if name in tasks}
+        
+        results = {}
+        errors = {}
+        enrichments = {}
+        if combined is None:
+            combined = AI_COMBINED_PROMPT
+        combined_tasks = [name for name in task_funcs if not (name == 'analyze' and speculation is not None)]
+        if combined and len(combined_tasks) > 1:
+            try:
+                sections = self.ai.analyze_combined(resume_text, jd_text, combined_tasks)
+            except Exception as e:
+                print(f"Combined analysis failed, falling back to per-task calls: {e}")
+                sections = {}
+            for name, section in sections.items():
+                if name == 'analyze':
+                    section = self._build_analysis(resume_text, section)
+                elif name == 'interview':
+                    section = self._ensure_interview_questions(section)
+                results[name] = section
+                del task_funcs[name]
+        
+        futures = {
+            name: submit_with_context(_task_executor, func, *args)
+            for name, (func, args) in task_funcs.items()
+        }
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                errors[name] = str(e)
+        
+        if 'analyze' in futures and 'analyze' in results:
+            results['analyze'], enrichment = results['analyze']
+            if enrichment is not None:
+                enrichments['analyze'] = enrichment
+        
+        return {'results': results, 'errors': errors, 'enrichments': enrichments}
+    
+    def analyze_batch(self, resumes: list, jd_text: str = '', tasks: list = None):
+        """
+        批量分析多份简历，内容相同的简历只分析一次
+        
+        Args:
+            resumes: [(resume_id, 简历纯文本), ...]
+            jd_text: 岗位JD文本
+            tasks: 每份简历需要执行的任务名列表
+        
+        Yields:
+            (内容相同的简历ID列表, analyze_all结果)，按完成顺序产出
+        """
+        groups = {}
+        for resume_id, resume_text in resumes:
+            key = hashlib.sha256(resume_text.encode('utf-8')).hexdigest()
+            groups.setdefault(key, (resume_text, []))[1].append(resume_id)
+        
+        # 批量分析逐条推送进度，每份简历等待完整的AI结果，不使用响应时限
+        futures = {
+            submit_with_context(_batch_executor, self.analyze_all, resume_text, jd_text, tasks, sla=None): resume_ids
+            for resume_text, resume_ids in groups.values()
+        }
+        try:
+            for future in as_completed(futures):
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    outcome = {'results': {}, 'errors': {'batch': str(e)}}
+                yield futures[future], outcome
+        finally:
+            # 客户端断开时取消尚未开始的简历
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,56 @@
+"""
+请求截止时间模块
+每个Web请求携带一个延迟预算（contextvar），AI调用按剩余时间设置超时，
+预算不足时跳过重试直接失败，避免浏览器早已放弃的请求继续占用线程
+"""
+import time
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+
+_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+
+def set_deadline(seconds: Optional[float]) -> contextvars.Token:
+    """
+    为当前上下文设置截止时间
+
+    Args:
+        seconds: 从现在起的预算秒数，None表示不限制
+
+    Returns:
+        用于 reset_deadline() 恢复的token
+    """
+    deadline = time.monotonic() + seconds if seconds is not None else None
+    current = _deadline.get()
+    if current is not None and (deadline is None or current < deadline):
+        # 嵌套时只能收紧，不能放宽外层的截止时间
+        deadline = current
+    return _deadline.set(deadline)
+
+
+def reset_deadline(token: contextvars.Token):
+    _deadline.reset(token)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """在with块内应用截止时间"""
+    token = set_deadline(seconds)
+    try:
+        yield
+    finally:
+        reset_deadline(token)
+
+
+def remaining() -> Optional[float]:
+    """当前上下文剩余的秒数，未设置截止时间时返回None"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """提交到线程池并带上当前上下文（线程池中的任务默认不继承contextvar）"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
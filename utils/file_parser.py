@@ -68,6 +68,50 @@ except ImportError:
     pytesseract = None
 
 
+# 简历章节标题模式（extract_work_experience 和提示词压缩共用）
+SECTION_PATTERNS = {
+    # 工作经历模式
+    'work': [
+        r'工作经历[：:\-]?',
+        r'职业经历[：:\-]?',
+        r'任职经历[：:\-]?',
+        r'工作经历\s*[-–—]',
+        r'(\d{4}[-/]\d{0,2})\s*[-–—]\s*(\d{4}[-/]\d{0,2}|至今|现在)'
+    ],
+    # 项目经历模式
+    'project': [
+        r'项目经历[：:\-]?',
+        r'项目经验[：:\-]?',
+        r'项目背景[：:\-]?',
+        r'参与项目[：:\-]?'
+    ],
+    # 教育背景模式
+    'education': [
+        r'教育背景[：:\-]?',
+        r'教育经历[：:\-]?',
+        r'学术背景[：:\-]?'
+    ],
+    # 证书模式
+    'certificate': [
+        r'证书资质[：:\-]?',
+        r'获得证书[：:\-]?',
+        r'资格证书[：:\-]?'
+    ],
+    # 奖项模式
+    'award': [
+        r'获奖情况[：:\-]?',
+        r'荣誉奖励[：:\-]?',
+        r'获得奖项[：:\-]?'
+    ],
+    # 自我介绍模式
+    'intro': [
+        r'自我介绍[：:\-]?',
+        r'个人简介[：:\-]?',
+        r'关于我[：:\-]?'
+    ]
+}
+
+
 def allowed_file(filename: str) -> bool:
     """检查文件扩展名是否允许"""
     if '.' not in filename:
@@ -199,50 +243,12 @@ def extract_work_experience(text: str) -> Dict[str, Any]:
     
     lines = text.strip().split('\n')
     
-    # 工作经历模式
-    work_patterns = [
-        r'工作经历[：:\-]?',
-        r'职业经历[：:\-]?',
-        r'任职经历[：:\-]?',
-        r'工作经历\s*[-–—]',
-        r'(\d{4}[-/]\d{0,2})\s*[-–—]\s*(\d{4}[-/]\d{0,2}|至今|现在)'
-    ]
-    
-    # 项目经历模式
-    project_patterns = [
-        r'项目经历[：:\-]?',
-        r'项目经验[：:\-]?',
-        r'项目背景[：:\-]?',
-        r'参与项目[：:\-]?'
-    ]
-    
-    # 教育背景模式
-    education_patterns = [
-        r'教育背景[：:\-]?',
-        r'教育经历[：:\-]?',
-        r'学术背景[：:\-]?'
-    ]
-    
-    # 证书模式
-    certificate_patterns = [
-        r'证书资质[：:\-]?',
-        r'获得证书[：:\-]?',
-        r'资格证书[：:\-]?'
-    ]
-    
-    # 奖项模式
-    award_patterns = [
-        r'获奖情况[：:\-]?',
-        r'荣誉奖励[：:\-]?',
-        r'获得奖项[：:\-]?'
-    ]
-    
-    # 自我介绍模式
-    intro_patterns = [
-        r'自我介绍[：:\-]?',
-        r'个人简介[：:\-]?',
-        r'关于我[：:\-]?'
-    ]
+    work_patterns = SECTION_PATTERNS['work']
+    project_patterns = SECTION_PATTERNS['project']
+    education_patterns = SECTION_PATTERNS['education']
+    certificate_patterns = SECTION_PATTERNS['certificate']
+    award_patterns = SECTION_PATTERNS['award']
+    intro_patterns = SECTION_PATTERNS['intro']
     
     # 当前状态标记
     current_section = 'other'
@@ -675,23 +681,24 @@ def extract_skills(text: str) -> list:
     return unique_skills
 
 
+# 技术岗位分类及其关键技能
+POSITION_SKILLS = {
+    '后端开发': ['Python', 'Java', 'Go', 'Spring', 'Django', 'Flask', 'MySQL', 'Redis'],
+    '前端开发': ['React', 'Vue', 'HTML', 'CSS', 'JavaScript', 'TypeScript', 'Node.js'],
+    '全栈开发': ['Python', 'JavaScript', 'React', 'Node.js', 'MySQL'],
+    '数据分析': ['Python', 'Pandas', 'SQL', 'Excel', 'Tableau', 'Spark'],
+    '机器学习': ['Python', 'TensorFlow', 'PyTorch', 'Scikit-learn', 'NLP'],
+    'DevOps': ['Docker', 'Kubernetes', 'Jenkins', 'AWS', 'Linux', 'Git'],
+    '移动开发': ['Swift', 'Kotlin', 'React Native', 'Android', 'iOS'],
+    '产品经理': ['Axure', 'Figma', '需求分析', '产品设计', '用户研究']
+}
+
+
 def suggest_job_positions(skills: list, work_experience: list) -> list:
     """根据技能和工作经验推荐合适的岗位方向"""
     positions = []
     
-    # 技术岗位分类
-    tech_positions = {
-        '后端开发': ['Python', 'Java', 'Go', 'Spring', 'Django', 'Flask', 'MySQL', 'Redis'],
-        '前端开发': ['React', 'Vue', 'HTML', 'CSS', 'JavaScript', 'TypeScript', 'Node.js'],
-        '全栈开发': ['Python', 'JavaScript', 'React', 'Node.js', 'MySQL'],
-        '数据分析': ['Python', 'Pandas', 'SQL', 'Excel', 'Tableau', 'Spark'],
-        '机器学习': ['Python', 'TensorFlow', 'PyTorch', 'Scikit-learn', 'NLP'],
-        'DevOps': ['Docker', 'Kubernetes', 'Jenkins', 'AWS', 'Linux', 'Git'],
-        '移动开发': ['Swift', 'Kotlin', 'React Native', 'Android', 'iOS'],
-        '产品经理': ['Axure', 'Figma', '需求分析', '产品设计', '用户研究']
-    }
-    
-    for position, required_skills in tech_positions.items():
+    for position, required_skills in POSITION_SKILLS.items():
         match_count = sum(1 for skill in skills if skill in required_skills)
         if match_count >= 2:
             positions.append({
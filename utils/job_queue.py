@@ -0,0 +1,320 @@
+"""
+后台任务队列模块
+LLM分析任务写入持久化队列后立即返回任务ID，由独立的worker进程（worker.py）执行，
+Web进程只负责提交和查询，不再被慢速的provider调用占住
+
+默认使用SQLite存储，可通过 register_job_backend() 接入其他实现（如Redis）
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import socket
+import threading
+from abc import ABC, abstractmethod
+from typing import Optional, Dict, Callable
+
+from config import (
+    JOB_QUEUE_BACKEND,
+    JOB_QUEUE_DB_PATH,
+    JOB_LEASE_TIMEOUT,
+    JOB_MAX_ATTEMPTS,
+    JOB_RESULT_TTL
+)
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+FINISHED_STATUSES = (DONE, FAILED)
+
+
+class JobBackend(ABC):
+    """任务队列存储接口"""
+    
+    @abstractmethod
+    def enqueue(self, task: str, params: dict) -> str:
+        """提交任务，返回任务ID"""
+    
+    @abstractmethod
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """领取最早的排队任务并标记为running，没有任务时返回None"""
+    
+    @abstractmethod
+    def complete(self, job_id: str, result) -> None:
+        """标记任务完成并保存结果"""
+    
+    @abstractmethod
+    def fail(self, job_id: str, error: str, retry: bool = False) -> None:
+        """标记失败；retry为True且未超过最大次数时重新排队"""
+    
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict]:
+        """查询任务，不存在时返回None"""
+    
+    @abstractmethod
+    def requeue_stale(self, lease_timeout: float = JOB_LEASE_TIMEOUT) -> int:
+        """把超时未完成（worker崩溃）的任务重新排队，返回数量"""
+    
+    @abstractmethod
+    def purge(self, older_than: float = JOB_RESULT_TTL) -> int:
+        """删除早已结束的任务，返回数量"""
+    
+    @abstractmethod
+    def get_stats(self) -> Dict:
+        """各状态的任务数量"""
+
+
+class SQLiteJobBackend(JobBackend):
+    """SQLite任务队列，WAL模式下支持多个worker进程并发领取"""
+    
+    def __init__(self, db_path: str = JOB_QUEUE_DB_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_jobs (
+                    id TEXT PRIMARY KEY,
+                    task TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER DEFAULT 0,
+                    worker TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_jobs_status ON llm_jobs (status, created_at)')
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+    
+    def _to_dict(self, row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        if job['result'] is not None:
+            job['result'] = json.loads(job['result'])
+        return job
+    
+    def enqueue(self, task: str, params: dict) -> str:
+        job_id = uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            conn.execute(
+                'INSERT INTO llm_jobs (id, task, params, status, created_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, task, json.dumps(params, ensure_ascii=False), QUEUED, time.time())
+            )
+        finally:
+            conn.close()
+        return job_id
+    
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        conn = self._connect()
+        try:
+            # IMMEDIATE事务保证多个worker不会领取到同一个任务
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT * FROM llm_jobs WHERE status = ? ORDER BY created_at LIMIT 1', (QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            now = time.time()
+            conn.execute(
+                'UPDATE llm_jobs SET status = ?, worker = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?',
+                (RUNNING, worker_id, now, row['id'])
+            )
+            conn.execute('COMMIT')
+            job = self._to_dict(row)
+            job.update(status=RUNNING, worker=worker_id, started_at=now, attempts=row['attempts'] + 1)
+            return job
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+    
+    def complete(self, job_id: str, result) -> None:
+        conn = self._connect()
+        try:
+            conn.execute(
+                'UPDATE llm_jobs SET status = ?, result = ?, error = NULL, finished_at = ? WHERE id = ?',
+                (DONE, json.dumps(result, ensure_ascii=False), time.time(), job_id)
+            )
+        finally:
+            conn.close()
+    
+    def fail(self, job_id: str, error: str, retry: bool = False) -> None:
+        conn = self._connect()
+        try:
+            if retry:
+                cursor = conn.execute(
+                    'UPDATE llm_jobs SET status = ?, error = ?, worker = NULL WHERE id = ? AND attempts < ?',
+                    (QUEUED, error, job_id, JOB_MAX_ATTEMPTS)
+                )
+                if cursor.rowcount:
+                    return
+            conn.execute(
+                'UPDATE llm_jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?',
+                (FAILED, error, time.time(), job_id)
+            )
+        finally:
+            conn.close()
+    
+    def get(self, job_id: str) -> Optional[Dict]:
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT * FROM llm_jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return self._to_dict(row) if row else None
+    
+    def requeue_stale(self, lease_timeout: float = JOB_LEASE_TIMEOUT) -> int:
+        cutoff = time.time() - lease_timeout
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            requeued = conn.execute(
+                'UPDATE llm_jobs SET status = ?, worker = NULL WHERE status = ? AND started_at < ? AND attempts < ?',
+                (QUEUED, RUNNING, cutoff, JOB_MAX_ATTEMPTS)
+            ).rowcount
+            conn.execute(
+                'UPDATE llm_jobs SET status = ?, error = ?, finished_at = ? WHERE status = ? AND started_at < ?',
+                (FAILED, 'worker lease expired', time.time(), RUNNING, cutoff)
+            )
+            conn.execute('COMMIT')
+            return requeued
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+    
+    def purge(self, older_than: float = JOB_RESULT_TTL) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute(
+                'DELETE FROM llm_jobs WHERE status IN (?, ?) AND finished_at < ?',
+                (DONE, FAILED, time.time() - older_than)
+            ).rowcount
+        finally:
+            conn.close()
+    
+    def get_stats(self) -> Dict:
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT status, COUNT(*) AS n FROM llm_jobs GROUP BY status').fetchall()
+        finally:
+            conn.close()
+        stats = {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED)}
+        stats.update({row['status']: row['n'] for row in rows})
+        return stats
+
+
+# 可用的队列实现，JOB_QUEUE_BACKEND 选择其中之一
+_job_backends = {'sqlite': SQLiteJobBackend}
+_job_backend = None
+_job_backend_lock = threading.Lock()
+
+
+def register_job_backend(name: str, backend_class):
+    """注册自定义队列实现"""
+    _job_backends[name] = backend_class
+
+
+def get_job_backend() -> JobBackend:
+    """获取当前配置的任务队列"""
+    global _job_backend
+    with _job_backend_lock:
+        if _job_backend is None:
+            if JOB_QUEUE_BACKEND not in _job_backends:
+                raise ValueError(f"Unknown job queue backend: {JOB_QUEUE_BACKEND}")
+            _job_backend = _job_backends[JOB_QUEUE_BACKEND]()
+        return _job_backend
+
+
+def wait_for_job(job_id: str, timeout: float, backend: Optional[JobBackend] = None) -> Optional[Dict]:
+    """
+    长轮询：等待任务结束或超时
+
+    Args:
+        job_id: 任务ID
+        timeout: 最长等待秒数
+        backend: 任务队列，默认使用全局队列
+
+    Returns:
+        任务信息（可能仍未结束），任务不存在时返回None
+    """
+    backend = backend or get_job_backend()
+    deadline = time.monotonic() + timeout
+    interval = 0.1
+    while True:
+        job = backend.get(job_id)
+        if job is None or job['status'] in FINISHED_STATUSES or time.monotonic() >= deadline:
+            return job
+        time.sleep(min(interval, max(0.0, deadline - time.monotonic())))
+        interval = min(interval * 2, 1.0)
+
+
+class JobWorker:
+    """
+    任务执行器：循环领取任务并调用对应的处理函数
+
+    处理函数签名为 handler(params) -> 结果；抛出 ValueError 视为参数错误直接失败，
+    其他异常按 JOB_MAX_ATTEMPTS 重新排队
+    """
+    
+    def __init__(self, handlers: Dict[str, Callable[[dict], object]],
+                 backend: Optional[JobBackend] = None, worker_id: Optional[str] = None,
+                 poll_interval: float = 0.5):
+        self.handlers = handlers
+        self.backend = backend or get_job_backend()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self.poll_interval = poll_interval
+    
+    def run_once(self) -> bool:
+        """执行一个任务，没有任务时返回False"""
+        job = self.backend.claim(self.worker_id)
+        if job is None:
+            return False
+        
+        handler = self.handlers.get(job['task'])
+        if handler is None:
+            self.backend.fail(job['id'], f"Unknown task: {job['task']}")
+            return True
+        
+        try:
+            result = handler(job['params'])
+        except ValueError as e:
+            self.backend.fail(job['id'], str(e))
+        except Exception as e:
+            print(f"Job {job['id']} ({job['task']}) failed: {e}")
+            self.backend.fail(job['id'], str(e), retry=True)
+        else:
+            self.backend.complete(job['id'], result)
+        return True
+    
+    def run_forever(self, stop_event: Optional[threading.Event] = None):
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            try:
+                if not self.run_once():
+                    stop_event.wait(self.poll_interval)
+            except sqlite3.OperationalError as e:
+                # 数据库繁忙等临时错误，稍后重试
+                print(f"Job worker {self.worker_id} error: {e}")
+                stop_event.wait(self.poll_interval)
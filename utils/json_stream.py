@@ -0,0 +1,238 @@
+"""
+流式JSON解析模块
+增量消费模型输出的文本片段，顶层字段或顶层数组元素一旦闭合即产出；
+输出因max_tokens被截断时，回退到最后一个完整的元素并补齐括号
+"""
+import re
+import json
+from typing import Optional, List, Tuple, Any
+
+
+class _Frame:
+    """解析栈中的一个容器（对象或数组）"""
+    
+    def __init__(self, kind: str, key: Optional[str] = None):
+        self.kind = kind  # '{' 或 '['
+        self.key = key  # 该容器在父对象中的键
+        self.expect_key = kind == '{'
+        self.current_key = None
+        self.value_start = None
+        self.in_scalar = False
+        self.index = 0
+
+
+class JSONStreamParser:
+    """
+    增量JSON解析器
+
+    feed() 返回新闭合的事件列表：
+        ('field', key, value)  顶层对象的一个字段已完整
+        ('item', key, value)   顶层字段中数组的一个元素已完整
+    """
+    
+    def __init__(self):
+        self.buffer = ''
+        self.started = False
+        self.finished = False
+        self._pos = 0
+        self._root_start = None
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._string_is_key = False
+        # 最近一个可安全截断的位置及此时需要补齐的括号
+        self._safe_end = None
+        self._safe_closers = ''
+        # 已完整解析的顶层字段和数组元素
+        self.fields = {}
+        self.items = {}
+    
+    def feed(self, chunk: str) -> List[Tuple[str, Optional[str], Any]]:
+        """追加一段文本并返回新产生的事件"""
+        self.buffer += chunk
+        events = []
+        buf = self.buffer
+        
+        i = self._pos
+        while i < len(buf) and not self.finished:
+            c = buf[i]
+            
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    frame = self._stack[-1]
+                    if self._string_is_key:
+                        try:
+                            frame.current_key = json.loads(buf[self._string_start:i + 1])
+                        except json.JSONDecodeError:
+                            frame.current_key = None
+                        frame.expect_key = False
+                    else:
+                        self._complete_value(frame, self._string_start, i + 1, events)
+                i += 1
+                continue
+            
+            if not self.started:
+                if c == '{':
+                    self.started = True
+                    self._root_start = i
+                    self._stack.append(_Frame('{'))
+                i += 1
+                continue
+            
+            frame = self._stack[-1]
+            
+            if c == '"':
+                self._finish_scalar(frame, i, events)
+                self._in_string = True
+                self._string_start = i
+                self._string_is_key = frame.kind == '{' and frame.expect_key
+            elif c in '{[':
+                self._finish_scalar(frame, i, events)
+                frame.value_start = i
+                key = frame.current_key if frame.kind == '{' else frame.key
+                self._stack.append(_Frame(c, key))
+            elif c in '}]':
+                self._finish_scalar(frame, i, events)
+                self._stack.pop()
+                if not self._stack:
+                    self.finished = True
+                else:
+                    parent = self._stack[-1]
+                    self._complete_value(parent, parent.value_start, i + 1, events)
+            elif c == ',':
+                self._finish_scalar(frame, i, events)
+                if frame.kind == '{':
+                    frame.expect_key = True
+            elif c == ':' or c.isspace():
+                self._finish_scalar(frame, i, events)
+            elif not frame.in_scalar:
+                frame.in_scalar = True
+                frame.value_start = i
+            i += 1
+        
+        self._pos = i
+        return events
+    
+    def _finish_scalar(self, frame: _Frame, end: int, events: list):
+        if frame.in_scalar:
+            frame.in_scalar = False
+            self._complete_value(frame, frame.value_start, end, events)
+    
+    def _complete_value(self, frame: _Frame, start: Optional[int], end: int, events: list):
+        """容器内的一个值已闭合，位于第一、二层时产出事件"""
+        if start is None:
+            return
+        frame.value_start = None
+        depth = len(self._stack)
+        if depth > 2:
+            return
+        try:
+            value = json.loads(self.buffer[start:end], strict=False)
+        except json.JSONDecodeError:
+            return
+        
+        self._safe_end = end
+        self._safe_closers = ''.join('}' if f.kind == '{' else ']' for f in reversed(self._stack))
+        
+        if depth == 1:
+            self.fields[frame.current_key] = value
+            events.append(('field', frame.current_key, value))
+        elif frame.kind == '[':
+            self.items.setdefault(frame.key, []).append(value)
+            events.append(('item', frame.key, value))
+            frame.index += 1
+    
+    @property
+    def truncated(self) -> bool:
+        """输出是否在根对象闭合前结束"""
+        return self.started and not self.finished
+    
+    def result(self) -> dict:
+        """
+        返回解析结果，依次尝试：
+        1. 完整解析根对象
+        2. 截断输出：保留到最后一个完整元素并补齐括号
+        3. 由已完整解析的顶层字段和数组元素拼装
+        
+        Returns:
+            解析出的字典，完全无法解析时返回空字典
+        """
+        if self._root_start is None:
+            return {}
+        
+        if self.finished:
+            value = _loads_dict(self.buffer[self._root_start:self._pos])
+            if value is not None:
+                return value
+        
+        if self._safe_end is not None:
+            repaired = self.buffer[self._root_start:self._safe_end] + self._safe_closers
+            value = _loads_dict(repaired)
+            if value is not None:
+                return value
+        
+        result = dict(self.fields)
+        for key, items in self.items.items():
+            if key not in result:
+                result[key] = items
+        return result
+
+
+def _loads_dict(text: str) -> Optional[dict]:
+    """宽松解析：允许字符串中的控制字符和多余的尾逗号"""
+    for candidate in (text, re.sub(r',\s*([}\]])', r'\1', text)):
+        try:
+            value = json.loads(candidate, strict=False)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, dict):
+            return value
+    return None
+
+
+def parse_json_strict(text: str) -> Optional[dict]:
+    """
+    只接受完整的JSON对象（允许代码块包裹和前后说明文字），用于判断输出能否写入缓存
+    
+    Returns:
+        解析出的字典；被截断、需要修补或无法解析时返回None
+    """
+    value = _loads_dict(text.strip())
+    if value is not None:
+        return value
+    
+    parser = JSONStreamParser()
+    parser.feed(text)
+    if not parser.finished:
+        return None
+    return _loads_dict(parser.buffer[parser._root_start:parser._pos])
+
+
+def parse_json_tolerant(text: str) -> dict:
+    """
+    容错解析模型返回的JSON
+    
+    Args:
+        text: 模型输出，可包含```json代码块、前后说明文字或被截断
+    
+    Returns:
+        解析出的字典，完全无法解析时返回空字典
+    """
+    value = _loads_dict(text.strip())
+    if value is not None:
+        return value
+    
+    parser = JSONStreamParser()
+    parser.feed(text)
+    result = parser.result()
+    if result and parser.truncated:
+        print(f"Recovered truncated JSON response ({len(text)} chars, keys: {list(result)})")
+    elif not result:
+        print(f"Failed to parse JSON response ({len(text)} chars)")
+    return result
@@ -0,0 +1,237 @@
+"""
+LLM响应缓存模块
+按请求内容哈希寻址：内存LRU + SQLite持久化两级缓存
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict
+
+from config import (
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_MEMORY_ENTRIES,
+    LLM_CACHE_DISK_ENTRIES,
+    LLM_CACHE_TTL,
+    LLM_CACHE_DB_PATH
+)
+
+
+def make_cache_key(model: str, system_prompt: str, messages: list,
+                   temperature: float, max_tokens: int) -> str:
+    """根据请求内容生成缓存键（SHA-256）"""
+    raw = json.dumps({
+        'model': model,
+        'system': system_prompt,
+        'messages': messages,
+        'temperature': temperature,
+        'max_tokens': max_tokens
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """两级LLM响应缓存"""
+    
+    # 每写入多少次检查一次磁盘容量
+    EVICT_CHECK_INTERVAL = 50
+    
+    def __init__(self, max_memory_entries: int = LLM_CACHE_MEMORY_ENTRIES,
+                 max_disk_entries: int = LLM_CACHE_DISK_ENTRIES,
+                 ttl: int = LLM_CACHE_TTL,
+                 db_path: Optional[str] = LLM_CACHE_DB_PATH):
+        """
+        初始化缓存
+        
+        Args:
+            max_memory_entries: 内存LRU最大条目数
+            max_disk_entries: 磁盘缓存最大条目数，0表示不启用磁盘层
+            ttl: 过期时间（秒）
+            db_path: SQLite文件路径，None表示不启用磁盘层
+        """
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.db_path = db_path if max_disk_entries > 0 else None
+        
+        self._memory = OrderedDict()  # key -> (created_at, response)
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0,
+            'expired': 0
+        }
+        
+        if self.db_path:
+            self._init_db()
+    
+    def _init_db(self):
+        try:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = self._connect()
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access)')
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"LLM cache disk tier disabled: {e}")
+            self.db_path = None
+    
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5)
+    
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，未命中或已过期返回None"""
+        now = time.time()
+        
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return entry[1]
+                del self._memory[key]
+                self._stats['expired'] += 1
+        
+        if self.db_path:
+            try:
+                conn = self._connect()
+                row = conn.execute(
+                    'SELECT response, created_at FROM llm_cache WHERE cache_key = ?', (key,)
+                ).fetchone()
+                if row and now - row[1] < self.ttl:
+                    conn.execute('UPDATE llm_cache SET last_access = ? WHERE cache_key = ?', (now, key))
+                    conn.commit()
+                    conn.close()
+                    with self._lock:
+                        self._stats['disk_hits'] += 1
+                        self._put_memory(key, row[0], row[1])
+                    return row[0]
+                if row:
+                    conn.execute('DELETE FROM llm_cache WHERE cache_key = ?', (key,))
+                    conn.commit()
+                    with self._lock:
+                        self._stats['expired'] += 1
+                conn.close()
+            except sqlite3.Error as e:
+                print(f"LLM cache read error: {e}")
+        
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+    
+    def set(self, key: str, response: str):
+        """写入缓存"""
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, response, now)
+            self._writes_since_evict += 1
+            need_evict = self._writes_since_evict >= self.EVICT_CHECK_INTERVAL
+            if need_evict:
+                self._writes_since_evict = 0
+        
+        if self.db_path:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    'INSERT OR REPLACE INTO llm_cache (cache_key, response, created_at, last_access) VALUES (?, ?, ?, ?)',
+                    (key, response, now, now)
+                )
+                conn.commit()
+                if need_evict:
+                    self._evict_disk(conn, now)
+                conn.close()
+            except sqlite3.Error as e:
+                print(f"LLM cache write error: {e}")
+    
+    def _put_memory(self, key: str, response: str, created_at: float):
+        # 调用方需持有self._lock
+        self._memory[key] = (created_at, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._stats['memory_evictions'] += 1
+    
+    def _evict_disk(self, conn: sqlite3.Connection, now: float):
+        """删除过期条目，并按最近访问时间淘汰超出容量的条目"""
+        cursor = conn.execute('DELETE FROM llm_cache WHERE created_at < ?', (now - self.ttl,))
+        expired = cursor.rowcount
+        count = conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+        overflow = count - self.max_disk_entries
+        evicted = 0
+        if overflow > 0:
+            cursor = conn.execute('''
+                DELETE FROM llm_cache WHERE cache_key IN (
+                    SELECT cache_key FROM llm_cache ORDER BY last_access ASC LIMIT ?
+                )
+            ''', (overflow,))
+            evicted = cursor.rowcount
+        conn.commit()
+        with self._lock:
+            self._stats['expired'] += max(expired, 0)
+            self._stats['disk_evictions'] += max(evicted, 0)
+    
+    def clear(self):
+        """清空所有缓存"""
+        with self._lock:
+            self._memory.clear()
+        if self.db_path:
+            try:
+                conn = self._connect()
+                conn.execute('DELETE FROM llm_cache')
+                conn.commit()
+                conn.close()
+            except sqlite3.Error as e:
+                print(f"LLM cache clear error: {e}")
+    
+    def get_stats(self) -> Dict:
+        """获取缓存命中统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        
+        stats['disk_entries'] = 0
+        if self.db_path:
+            try:
+                conn = self._connect()
+                stats['disk_entries'] = conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+                conn.close()
+            except sqlite3.Error:
+                pass
+        
+        hits = stats['memory_hits'] + stats['disk_hits']
+        lookups = hits + stats['misses']
+        stats['hits'] = hits
+        stats['hit_rate'] = round(hits / lookups, 4) if lookups else 0.0
+        stats['enabled'] = LLM_CACHE_ENABLED
+        return stats
+
+
+# 单例实例
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """获取LLM响应缓存单例"""
+    global _llm_cache
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                _llm_cache = LLMResponseCache()
+    return _llm_cache
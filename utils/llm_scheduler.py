@@ -0,0 +1,285 @@
+"""
+LLM请求调度模块
+provider并发名额用完后，请求按会员等级加权公平排队（WFQ）：尊享版 / 专业版 / 免费用户按权重分配空出的名额，
+同一用户同时占用的名额有上限，排队过久的请求不论等级优先放行（防饿死）。
+每个模型一个调度器，排队深度和等待时间供 /api/status 和 /metrics 使用
+"""
+import threading
+import time
+from collections import deque
+from fractions import Fraction
+from typing import Dict, Optional
+
+from config import (
+    AI_SCHEDULER_CONCURRENCY,
+    AI_SCHEDULER_TIER_WEIGHTS,
+    AI_SCHEDULER_USER_LIMITS,
+    AI_SCHEDULER_STARVATION_SECONDS
+)
+from utils.metrics import Histogram
+
+
+class Ticket:
+    """一次排队请求，获得名额后由 release() 归还"""
+    
+    __slots__ = ('user_id', 'tier', 'enqueued_at', 'granted', 'event')
+    
+    def __init__(self, user_id: Optional[int], tier: int):
+        self.user_id = user_id
+        self.tier = tier
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.event = threading.Event()
+
+
+class _TierStats:
+    """单个会员等级的排队统计"""
+    
+    def __init__(self):
+        self.admitted = 0
+        self.timeouts = 0
+        self.starvation_boosts = 0
+        self.wait = Histogram()
+
+
+class LLMScheduler:
+    """按会员等级加权公平分配provider并发名额"""
+    
+    def __init__(self, name: str, concurrency: int = AI_SCHEDULER_CONCURRENCY,
+                 weights: Optional[Dict[int, float]] = None, user_limits: Optional[Dict[int, int]] = None,
+                 starvation_seconds: float = AI_SCHEDULER_STARVATION_SECONDS):
+        """
+        Args:
+            name: 调度器名称（模型名）
+            concurrency: 同时发往provider的请求数，0表示不限制（不排队）
+            weights: 会员等级 -> 权重，积压时各等级获得名额的比例
+            user_limits: 会员等级 -> 单个用户同时占用的名额上限（未登录请求不限）
+            starvation_seconds: 排队超过该时间的请求不论等级优先放行
+        """
+        self.name = name
+        self.concurrency = concurrency
+        self.weights = weights or AI_SCHEDULER_TIER_WEIGHTS
+        self.user_limits = user_limits or AI_SCHEDULER_USER_LIMITS
+        self.starvation_seconds = starvation_seconds
+        
+        self._queues = {}  # tier -> deque(Ticket)
+        self._finish = {}  # tier -> 该等级上次获得名额的虚拟完成时间
+        self._tags = {}  # tier -> 队首请求的 (虚拟开始时间, 虚拟完成时间)
+        self._virtual_time = Fraction(0)
+        self._active = 0
+        self._active_by_user = {}
+        self._tiers = {}  # tier -> _TierStats
+        self._lock = threading.Lock()
+    
+    def _weight(self, tier: int) -> float:
+        levels = [level for level in self.weights if level <= tier]
+        return self.weights[max(levels)] if levels else 1.0
+    
+    def _user_limit(self, ticket: Ticket) -> Optional[int]:
+        if not ticket.user_id:
+            return None
+        levels = [level for level in self.user_limits if level <= ticket.tier]
+        return self.user_limits[max(levels)] if levels else None
+    
+    def _eligible(self, ticket: Ticket) -> bool:
+        # 调用方需持有self._lock
+        limit = self._user_limit(ticket)
+        return limit is None or self._active_by_user.get(ticket.user_id, 0) < limit
+    
+    def _stats(self, tier: int) -> _TierStats:
+        # 调用方需持有self._lock
+        stats = self._tiers.get(tier)
+        if stats is None:
+            stats = self._tiers[tier] = _TierStats()
+        return stats
+    
+    def _grant(self, ticket: Ticket, now: float):
+        # 调用方需持有self._lock
+        ticket.granted = True
+        self._active += 1
+        if ticket.user_id:
+            self._active_by_user[ticket.user_id] = self._active_by_user.get(ticket.user_id, 0) + 1
+        stats = self._stats(ticket.tier)
+        stats.admitted += 1
+        stats.wait.observe(now - ticket.enqueued_at)
+        ticket.event.set()
+    
+    def _next(self, now: float) -> Optional[Ticket]:
+        """
+        挑选下一个获得名额的请求（调用方需持有self._lock）
+
+        每个等级取队列中第一个未超出用户上限的请求；其中有排队超过starvation_seconds的，
+        最早入队的优先；否则按虚拟完成时间最小的等级放行。等级的队首请求出现时
+        打上完成时间标签 max(虚拟时间, 该等级上次的完成时间) + 1/权重，积压时各等级按权重比例获得名额
+        """
+        heads = {}
+        for tier, queue in self._queues.items():
+            for ticket in queue:
+                if self._eligible(ticket):
+                    heads[tier] = ticket
+                    break
+        for tier in list(self._tags):
+            if tier not in heads:
+                del self._tags[tier]
+        if not heads:
+            return None
+        for tier in heads:
+            if tier not in self._tags:
+                start = max(self._virtual_time, self._finish.get(tier, 0))
+                self._tags[tier] = (start, start + 1 / Fraction(self._weight(tier)))
+        
+        tier = min(heads, key=lambda level: (self._tags[level][1], self._tags[level][0], -level))
+        oldest = min(heads.values(), key=lambda t: t.enqueued_at)
+        if oldest.tier != tier and now - oldest.enqueued_at >= self.starvation_seconds:
+            self._stats(oldest.tier).starvation_boosts += 1
+            tier = oldest.tier
+        
+        start, finish = self._tags.pop(tier)
+        self._finish[tier] = finish
+        self._virtual_time = max(self._virtual_time, start)
+        ticket = heads[tier]
+        self._queues[tier].remove(ticket)
+        return ticket
+    
+    def _dispatch(self):
+        # 调用方需持有self._lock
+        now = time.monotonic()
+        while self._active < self.concurrency:
+            ticket = self._next(now)
+            if ticket is None:
+                break
+            self._grant(ticket, now)
+    
+    def acquire(self, user_id: Optional[int], tier: int, timeout: Optional[float]) -> Optional[Ticket]:
+        """
+        排队获取一个并发名额
+
+        Args:
+            user_id: 用户ID，未登录为None
+            tier: 会员等级
+            timeout: 最多排队的秒数，None表示一直等待
+
+        Returns:
+            获得名额后返回Ticket（用完后调用release）；排队超时返回None
+        """
+        ticket = Ticket(user_id, tier)
+        if self.concurrency <= 0:
+            ticket.granted = True
+            return ticket
+        
+        with self._lock:
+            self._queues.setdefault(tier, deque()).append(ticket)
+            self._dispatch()
+        if ticket.event.wait(timeout):
+            return ticket
+        
+        with self._lock:
+            if ticket.granted:
+                return ticket
+            self._queues[tier].remove(ticket)
+            self._stats(tier).timeouts += 1
+        return None
+    
+    def release(self, ticket: Ticket):
+        """归还名额并放行下一个排队的请求"""
+        if self.concurrency <= 0:
+            return
+        with self._lock:
+            self._active = max(0, self._active - 1)
+            if ticket.user_id:
+                count = self._active_by_user.get(ticket.user_id, 0) - 1
+                if count > 0:
+                    self._active_by_user[ticket.user_id] = count
+                else:
+                    self._active_by_user.pop(ticket.user_id, None)
+            self._dispatch()
+    
+    def get_stats(self) -> Dict:
+        """排队深度和各等级等待时间，单位为毫秒"""
+        def _ms(value):
+            return round(value * 1000) if value is not None else None
+        
+        with self._lock:
+            tiers = {}
+            for tier in sorted(set(self._tiers) | set(self._queues)):
+                stats = self._stats(tier)
+                tiers[tier] = {
+                    'queued': len(self._queues.get(tier, ())),
+                    'admitted': stats.admitted,
+                    'timeouts': stats.timeouts,
+                    'starvation_boosts': stats.starvation_boosts,
+                    'wait_p50_ms': _ms(stats.wait.quantile(0.5)),
+                    'wait_p95_ms': _ms(stats.wait.quantile(0.95)),
+                    'wait_max_ms': _ms(stats.wait.max) if stats.wait.count else None
+                }
+            return {
+                'concurrency': self.concurrency,
+                'active': self._active,
+                'queued': sum(len(queue) for queue in self._queues.values()),
+                'tiers': tiers
+            }
+    
+    def prometheus_samples(self) -> Dict[str, list]:
+        """该调度器的Prometheus样本，按指标名分组"""
+        samples = {
+            'llm_scheduler_active': [],
+            'llm_scheduler_queue_depth': [],
+            'llm_scheduler_timeouts_total': [],
+            'llm_scheduler_wait_seconds': []
+        }
+        with self._lock:
+            samples['llm_scheduler_active'].append(f'llm_scheduler_active{{model="{self.name}"}} {self._active}')
+            for tier in sorted(set(self._tiers) | set(self._queues)):
+                stats = self._stats(tier)
+                labels = f'model="{self.name}",tier="{tier}"'
+                samples['llm_scheduler_queue_depth'].append(
+                    f'llm_scheduler_queue_depth{{{labels}}} {len(self._queues.get(tier, ()))}')
+                samples['llm_scheduler_timeouts_total'].append(
+                    f'llm_scheduler_timeouts_total{{{labels}}} {stats.timeouts}')
+                wait = samples['llm_scheduler_wait_seconds']
+                bounds = [str(b) for b in stats.wait.buckets] + ['+Inf']
+                for bound, count in zip(bounds, stats.wait.cumulative_counts()):
+                    wait.append(f'llm_scheduler_wait_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                wait.append(f'llm_scheduler_wait_seconds_sum{{{labels}}} {stats.wait.sum:.6f}')
+                wait.append(f'llm_scheduler_wait_seconds_count{{{labels}}} {stats.wait.count}')
+        return samples
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_llm_scheduler(model: str) -> LLMScheduler:
+    """获取指定模型的调度器（各模型的provider名额互不影响）"""
+    with _schedulers_lock:
+        scheduler = _schedulers.get(model)
+        if scheduler is None:
+            scheduler = _schedulers[model] = LLMScheduler(model)
+        return scheduler
+
+
+def get_scheduler_stats() -> Dict:
+    with _schedulers_lock:
+        schedulers = list(_schedulers.values())
+    return {s.name: s.get_stats() for s in schedulers}
+
+
+def render_scheduler_prometheus() -> str:
+    """导出所有调度器的Prometheus文本格式"""
+    families = [
+        ('llm_scheduler_active', 'gauge', 'LLM calls holding a provider slot'),
+        ('llm_scheduler_queue_depth', 'gauge', 'LLM calls waiting for a provider slot by membership tier'),
+        ('llm_scheduler_timeouts_total', 'counter', 'LLM calls that gave up waiting for a provider slot'),
+        ('llm_scheduler_wait_seconds', 'histogram', 'Time LLM calls waited for a provider slot')
+    ]
+    with _schedulers_lock:
+        schedulers = sorted(_schedulers.values(), key=lambda s: s.name)
+    samples = [s.prometheus_samples() for s in schedulers]
+    
+    lines = []
+    for name, kind, help_text in families:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for scheduler_samples in samples:
+            lines.extend(scheduler_samples[name])
+    return '\n'.join(lines) + '\n'
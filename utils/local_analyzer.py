@@ -0,0 +1,237 @@
+"""
+本地规则分析模块
+基于 file_parser 的确定性提取结果，毫秒级计算完整性、可量化成果密度、关键词覆盖和ATS友好度；
+AI调用超出时间预算或provider不可用时作为兜底结果返回，结构与AI分析结果一致
+"""
+import re
+from typing import Dict, List
+
+from utils.file_parser import (
+    SECTION_PATTERNS,
+    POSITION_SKILLS,
+    extract_contact_info,
+    extract_skills,
+    extract_work_experience,
+    suggest_job_positions
+)
+
+SOFT_SKILLS = {'项目管理', '团队协作', '沟通能力', '解决问题', '学习能力', 'Agile', 'Scrum', 'Kanban', '敏捷开发'}
+
+# 成果量化：数字 + 单位/比例
+QUANTIFIED = re.compile(r'\d+(\.\d+)?\s*(%|％|倍|万|亿|千|百|k|K|w|W|人|个|项|次|元|天|小时|ms|秒|分钟|\+)')
+# 描述工作内容的动词
+_ACTION_VERBS = re.compile(r'负责|主导|设计|开发|实现|优化|搭建|推动|带领|重构|提升|降低|完成|独立|制定|'
+                           r'\b(led|built|designed|developed|implemented|optimized|improved|reduced|launched)\b', re.I)
+# 空洞的表述
+_FILLER = re.compile(r'等等|相关工作|其他工作|协助完成|参与了?一些|熟悉了解|一定的')
+_DATE = re.compile(r'(\d{4})\s*([./\-年])\s*\d{1,2}')
+_DEBRIS = re.compile(r'[│┃┆┊─━■◆●★☆▪►]')
+
+
+def _clamp(value: float) -> int:
+    return int(max(0, min(100, round(value))))
+
+
+def _completeness(text: str, contact: Dict, sections: Dict) -> Dict:
+    checks = [
+        (bool(contact['phone']), '缺少手机号', '在简历顶部补充手机号'),
+        (bool(contact['email']), '缺少邮箱', '补充常用邮箱'),
+        (bool(sections['education']), '未识别到教育背景', '增加"教育背景"章节，写明学校、专业、学历和时间'),
+        (bool(sections['work']), '未识别到工作经历', '增加"工作经历"章节，按时间倒序列出'),
+        (bool(sections['projects']), '未识别到项目经历', '补充1-3个与目标岗位相关的项目'),
+        (bool(extract_skills(text)), '未识别到技能关键词', '增加"专业技能"章节，列出掌握的技术和工具')
+    ]
+    passed = sum(1 for ok, _, _ in checks if ok)
+    return {
+        'score': _clamp(100 * passed / len(checks)),
+        'issues': [issue for ok, issue, _ in checks if not ok],
+        'suggestions': [suggestion for ok, _, suggestion in checks if not ok]
+    }
+
+
+def _quantifiable(lines: List[str]) -> Dict:
+    descriptions = [line for line in lines if len(line) >= 12]
+    quantified = [line for line in descriptions if QUANTIFIED.search(line)]
+    density = len(quantified) / len(descriptions) if descriptions else 0
+    issues = []
+    suggestions = []
+    if density < 0.2:
+        issues.append(f'只有{len(quantified)}条描述包含量化数据')
+        suggestions.append('用数字描述成果，如"接口响应时间降低40%"、"支撑日活50万用户"')
+    if density < 0.4:
+        suggestions.append('每段经历至少写出1-2个可量化的结果（规模、效率、收入、成本）')
+    return {'score': _clamp(30 + density * 175), 'issues': issues, 'suggestions': suggestions}
+
+
+def _content(lines: List[str]) -> Dict:
+    descriptions = [line for line in lines if len(line) >= 12]
+    total = len(descriptions) or 1
+    actions = sum(1 for line in descriptions if _ACTION_VERBS.search(line))
+    fillers = sum(1 for line in lines if _FILLER.search(line))
+    score = 50 + 45 * actions / total - 5 * fillers
+    issues = []
+    suggestions = []
+    if actions / total < 0.3:
+        issues.append('经历描述中缺少明确的行动动词')
+        suggestions.append('以"主导/设计/优化"等动词开头，说明你做了什么')
+    if fillers:
+        issues.append(f'有{fillers}处空洞表述（如"等等"、"相关工作"）')
+        suggestions.append('删掉空洞表述，换成具体的工作内容和结果')
+    return {'score': _clamp(score), 'issues': issues, 'suggestions': suggestions}
+
+
+def _format(text: str, lines: List[str]) -> Dict:
+    issues = []
+    suggestions = []
+    score = 90
+    length = len(text)
+    if length < 300:
+        score -= 25
+        issues.append('简历内容过少')
+        suggestions.append('补充经历细节，内容控制在1-2页')
+    elif length > 6000:
+        score -= 15
+        issues.append('简历篇幅过长')
+        suggestions.append('精简与目标岗位无关的内容，控制在2页以内')
+    long_lines = sum(1 for line in lines if len(line) > 150)
+    if long_lines:
+        score -= min(20, long_lines * 5)
+        issues.append(f'有{long_lines}段过长的描述')
+        suggestions.append('长段落拆成要点，每条一句话')
+    separators = {sep for _, sep in _DATE.findall(text)}
+    if len(separators) > 1:
+        score -= 10
+        issues.append('日期格式不统一')
+        suggestions.append('统一日期格式，如"2021.03 - 2023.06"')
+    return {'score': _clamp(score), 'issues': issues, 'suggestions': suggestions}
+
+
+def _ats_friendly(text: str, lines: List[str], contact: Dict, skills: List[str]) -> Dict:
+    issues = []
+    suggestions = []
+    headers = sum(
+        1 for patterns in SECTION_PATTERNS.values()
+        if any(re.search(pattern, text) for pattern in patterns[:3])
+    )
+    score = 40 + headers * 10
+    if headers < 3:
+        issues.append('缺少标准章节标题，招聘系统难以识别各部分内容')
+        suggestions.append('使用"工作经历"、"项目经历"、"教育背景"等标准标题')
+    debris = len(_DEBRIS.findall(text))
+    if debris > 10:
+        score -= 15
+        issues.append('包含较多特殊符号或表格线')
+        suggestions.append('避免复杂表格和图标，使用纯文本排版')
+    if len(skills) >= 5:
+        score += 10
+    else:
+        suggestions.append('在技能章节中使用岗位JD里的标准技术名称')
+    if not (contact['phone'] or contact['email']):
+        score -= 15
+        issues.append('未识别到联系方式')
+    return {'score': _clamp(score), 'issues': issues, 'suggestions': suggestions}
+
+
+def analyze_locally(resume_text: str) -> Dict:
+    """
+    本地规则分析简历
+
+    Args:
+        resume_text: 简历纯文本
+
+    Returns:
+        与AI分析结果结构一致的字典，source为local
+    """
+    text = resume_text or ''
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    contact = extract_contact_info(text)
+    sections = extract_work_experience(text)
+    skills = extract_skills(text)
+    positions = suggest_job_positions(skills, [])
+    
+    hard_skills = [s for s in skills if s not in SOFT_SKILLS]
+    soft_skills = [s for s in skills if s in SOFT_SKILLS]
+    missing_keywords = []
+    if positions:
+        missing_keywords = [s for s in POSITION_SKILLS[positions[0]['position']] if s not in skills][:5]
+    
+    dimensions = {
+        'completeness': _completeness(text, contact, sections),
+        'format': _format(text, lines),
+        'content': _content(lines),
+        'quantifiable': _quantifiable(lines),
+        'keywords': {
+            'hard_skills': hard_skills,
+            'soft_skills': soft_skills,
+            'missing_keywords': missing_keywords,
+            'suggestions': [f'可以补充：{", ".join(missing_keywords)}'] if missing_keywords else []
+        },
+        'ats_friendly': _ats_friendly(text, lines, contact, skills)
+    }
+    keyword_score = _clamp(40 + 6 * len(hard_skills) + 4 * len(soft_skills))
+    
+    weights = {'completeness': 0.2, 'format': 0.15, 'content': 0.2, 'quantifiable': 0.2, 'ats_friendly': 0.1}
+    score = _clamp(sum(dimensions[name]['score'] * w for name, w in weights.items()) + keyword_score * 0.15)
+    
+    names = {
+        'completeness': '信息完整性', 'format': '格式规范', 'content': '内容质量',
+        'quantifiable': '成果量化', 'ats_friendly': 'ATS友好度'
+    }
+    ranked = sorted(weights, key=lambda name: dimensions[name]['score'])
+    strengths = [f'{names[name]}较好' for name in reversed(ranked) if dimensions[name]['score'] >= 80]
+    if len(hard_skills) >= 5:
+        strengths.append(f'技能关键词丰富（{len(hard_skills)}项）')
+    weaknesses = [issue for name in ranked for issue in dimensions[name]['issues']]
+    suggestions = [s for name in ranked for s in dimensions[name]['suggestions']]
+    
+    if score >= 90:
+        assessment = '简历完整规范，可直接投递'
+    elif score >= 75:
+        assessment = '简历基础较好，针对性优化后可投递'
+    elif score >= 60:
+        assessment = '简历需要重点改进'
+    else:
+        assessment = '简历信息不足，建议大幅补充或重写'
+    
+    return {
+        'score': score,
+        'overall_assessment': assessment,
+        'dimensions': dimensions,
+        'strengths': strengths[:5],
+        'weaknesses': weaknesses[:5],
+        'suggestions': suggestions[:6],
+        'recommended_positions': [p['position'] for p in positions],
+        'priority_actions': [dimensions[name]['suggestions'][0] for name in ranked
+                             if dimensions[name]['suggestions']][:2],
+        'source': 'local'
+    }
+
+
+def match_locally(resume_text: str, jd_text: str) -> Dict:
+    """
+    按技能关键词覆盖率估算岗位匹配度
+
+    Returns:
+        与AI匹配结果结构一致的字典，source为local
+    """
+    resume_skills = extract_skills(resume_text or '')
+    jd_skills = extract_skills(jd_text or '')
+    matched = [s for s in jd_skills if s in resume_skills]
+    missing = [s for s in jd_skills if s not in resume_skills]
+    if jd_skills:
+        coverage = len(matched) / len(jd_skills)
+        score = _clamp(35 + 60 * coverage)
+        details = f'JD中的{len(jd_skills)}项技能关键词覆盖了{len(matched)}项'
+    else:
+        score = 60
+        details = '未从JD中识别到技能关键词，匹配度仅供参考'
+    return {
+        'match_score': score,
+        'matched_skills': matched,
+        'missing_skills': missing,
+        'matched_experiences': [],
+        'suggestions': ([f'在简历中体现{", ".join(missing[:3])}相关的经历'] if missing else [])
+                       + ['把与JD要求最相关的经历放在前面'],
+        'match_details': details,
+        'source': 'local'
+    }
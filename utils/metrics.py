@@ -0,0 +1,214 @@
+"""
+LLM调用指标模块
+按任务（analyze/match/interview/self-intro/test等）统计调用次数、错误数、token用量和延迟分布，
+供 /metrics（Prometheus文本格式）和 /api/status 使用
+"""
+import threading
+from typing import Optional, Dict, List
+
+# 延迟直方图分桶上界（秒）
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60, 90, 120)
+
+
+class Histogram:
+    """固定分桶直方图，分位数在桶内线性插值估算"""
+    
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个为+Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+    
+    def observe(self, value: float):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+    
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.max
+    
+    def cumulative_counts(self) -> List[int]:
+        result = []
+        total = 0
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+
+class _TaskMetrics:
+    """单个任务的计数器"""
+    
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency = Histogram()
+        self.first_token = Histogram()
+
+
+class LLMMetrics:
+    """LLM调用指标，所有计数在同一把锁内更新"""
+    
+    def __init__(self):
+        self._tasks = {}
+        self._lock = threading.Lock()
+    
+    def _task(self, task: str) -> _TaskMetrics:
+        # 调用方需持有self._lock
+        metrics = self._tasks.get(task)
+        if metrics is None:
+            metrics = _TaskMetrics()
+            self._tasks[task] = metrics
+        return metrics
+    
+    def record_call(self, task: str, latency: float, ok: bool, usage: Optional[dict] = None,
+                    first_token: Optional[float] = None):
+        """
+        记录一次provider调用
+
+        Args:
+            task: 任务名
+            latency: 总耗时（秒）
+            ok: 是否成功拿到结果
+            usage: provider返回的token用量
+            first_token: 流式调用的首个片段耗时（秒）
+        """
+        usage = usage or {}
+        with self._lock:
+            metrics = self._task(task)
+            metrics.calls += 1
+            if not ok:
+                metrics.errors += 1
+            metrics.prompt_tokens += usage.get('prompt_tokens', 0)
+            metrics.completion_tokens += usage.get('completion_tokens', 0)
+            metrics.latency.observe(latency)
+            if first_token is not None:
+                metrics.first_token.observe(first_token)
+    
+    def record_cache_hit(self, task: str):
+        with self._lock:
+            self._task(task).cache_hits += 1
+    
+    def record_coalesced(self, task: str):
+        """记录一次合并到进行中相同请求的调用"""
+        with self._lock:
+            self._task(task).coalesced += 1
+    
+    def latency_quantile(self, task: str, q: float, first_token: bool = False,
+                         min_samples: int = 1) -> Optional[float]:
+        """
+        某任务的延迟分位数（秒）
+
+        Args:
+            task: 任务名
+            q: 分位数（0-1）
+            first_token: 使用首个片段耗时（流式调用）而非总耗时
+            min_samples: 样本数不足时返回None
+        """
+        with self._lock:
+            metrics = self._tasks.get(task)
+            if metrics is None:
+                return None
+            histogram = metrics.first_token if first_token else metrics.latency
+            if histogram.count < min_samples:
+                return None
+            return histogram.quantile(q)
+    
+    def summary(self) -> Dict:
+        """按任务汇总，延迟单位为毫秒"""
+        def _ms(value):
+            return round(value * 1000) if value is not None else None
+        
+        with self._lock:
+            result = {}
+            for task, m in sorted(self._tasks.items()):
+                result[task] = {
+                    'calls': m.calls,
+                    'errors': m.errors,
+                    'cache_hits': m.cache_hits,
+                    'coalesced': m.coalesced,
+                    'prompt_tokens': m.prompt_tokens,
+                    'completion_tokens': m.completion_tokens,
+                    'p50_ms': _ms(m.latency.quantile(0.5)),
+                    'p95_ms': _ms(m.latency.quantile(0.95)),
+                    'p99_ms': _ms(m.latency.quantile(0.99))
+                }
+            return result
+    
+    def render_prometheus(self) -> str:
+        """导出Prometheus文本格式"""
+        lines = []
+        
+        def _header(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+        
+        def _histogram(name, help_text, attr):
+            _header(name, 'histogram', help_text)
+            for task, m in tasks:
+                histogram = getattr(m, attr)
+                bounds = [str(b) for b in histogram.buckets] + ['+Inf']
+                for bound, count in zip(bounds, histogram.cumulative_counts()):
+                    lines.append(f'{name}_bucket{{task="{task}",le="{bound}"}} {count}')
+                lines.append(f'{name}_sum{{task="{task}"}} {histogram.sum:.6f}')
+                lines.append(f'{name}_count{{task="{task}"}} {histogram.count}')
+        
+        with self._lock:
+            tasks = sorted(self._tasks.items())
+            
+            _header('llm_requests_total', 'counter', 'LLM provider calls by task and outcome')
+            for task, m in tasks:
+                lines.append(f'llm_requests_total{{task="{task}",status="ok"}} {m.calls - m.errors}')
+                lines.append(f'llm_requests_total{{task="{task}",status="error"}} {m.errors}')
+            
+            _header('llm_cache_hits_total', 'counter', 'LLM responses served from cache')
+            for task, m in tasks:
+                lines.append(f'llm_cache_hits_total{{task="{task}"}} {m.cache_hits}')
+            
+            _header('llm_coalesced_total', 'counter', 'LLM calls that shared an identical in-flight request')
+            for task, m in tasks:
+                lines.append(f'llm_coalesced_total{{task="{task}"}} {m.coalesced}')
+            
+            _header('llm_tokens_total', 'counter', 'Tokens reported by the provider')
+            for task, m in tasks:
+                lines.append(f'llm_tokens_total{{task="{task}",type="prompt"}} {m.prompt_tokens}')
+                lines.append(f'llm_tokens_total{{task="{task}",type="completion"}} {m.completion_tokens}')
+            
+            _histogram('llm_request_duration_seconds', 'LLM call latency', 'latency')
+            _histogram('llm_time_to_first_token_seconds', 'Streaming LLM time to first token', 'first_token')
+        
+        return '\n'.join(lines) + '\n'
+
+
+_llm_metrics = None
+_llm_metrics_lock = threading.Lock()
+
+
+def get_llm_metrics() -> LLMMetrics:
+    """获取全局LLM指标"""
+    global _llm_metrics
+    with _llm_metrics_lock:
+        if _llm_metrics is None:
+            _llm_metrics = LLMMetrics()
+        return _llm_metrics
@@ -0,0 +1,181 @@
+"""
+模型路由模块
+按 (任务, 会员等级) 从 MODEL_ROUTES 选择模型和最大输出token：免费用户的简单任务走小模型，
+付费用户的深度分析走大模型；各模型在provider池中独立限流，免费流量不再占用大模型的额度。
+同时按路由统计延迟和质量（JSON可解析率、输出被截断比例），用于调整路由表
+"""
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, Optional
+
+from config import (
+    DATABASE_PATH,
+    MODEL_ROUTING_ENABLED,
+    MODEL_ROUTES,
+    MODEL_ROUTE_TIER_TTL
+)
+from utils.metrics import Histogram
+from utils.usage_tracker import current_user
+
+# model为None表示使用主provider配置的模型，max_tokens为None表示不限制调用方的取值
+Route = namedtuple('Route', ['task', 'tier', 'model', 'max_tokens'])
+
+
+class _RouteMetrics:
+    """单条路由（任务 + 等级 + 实际模型）的计数器"""
+    
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.checked = 0  # 做过质量检查的成功调用
+        self.invalid = 0  # 结构化任务返回内容无法解析
+        self.truncated = 0  # 输出达到max_tokens被截断
+        self.completion_tokens = 0
+        self.latency = Histogram()
+
+
+class ModelRouter:
+    """路由表查询、用户会员等级缓存和按路由的指标"""
+    
+    def __init__(self, routes: dict = MODEL_ROUTES, enabled: bool = MODEL_ROUTING_ENABLED,
+                 db_path: str = DATABASE_PATH, tier_ttl: float = MODEL_ROUTE_TIER_TTL):
+        """
+        Args:
+            routes: 任务 -> {会员等级: (模型, 最大输出token)}，未列出的等级取较低等级中最接近的一项
+            enabled: 关闭时所有任务都使用主provider的模型
+            db_path: 主数据库路径（读取users.membership_level）
+            tier_ttl: 会员等级缓存时间（秒）
+        """
+        self.routes = routes
+        self.enabled = enabled
+        self.db_path = db_path
+        self.tier_ttl = tier_ttl
+        
+        self._tiers = {}  # user_id -> (等级, 过期时间)
+        self._metrics = {}  # (task, tier, model) -> _RouteMetrics
+        self._lock = threading.Lock()
+    
+    def user_tier(self, user_id: Optional[int]) -> int:
+        """用户的会员等级，未登录或查询失败时按免费用户处理"""
+        if not user_id:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            cached = self._tiers.get(user_id)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        
+        tier = 0
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            try:
+                row = conn.execute('SELECT membership_level FROM users WHERE id = ?', (user_id,)).fetchone()
+            finally:
+                conn.close()
+            if row and row[0]:
+                tier = int(row[0])
+        except sqlite3.Error as e:
+            print(f"Failed to load membership level for user {user_id}: {e}")
+        with self._lock:
+            self._tiers[user_id] = (tier, now + self.tier_ttl)
+        return tier
+    
+    def invalidate(self, user_id: Optional[int] = None):
+        """会员等级变化后清除缓存，user_id为None时清除全部"""
+        with self._lock:
+            if user_id is None:
+                self._tiers.clear()
+            else:
+                self._tiers.pop(user_id, None)
+    
+    def route(self, task: str, tier: Optional[int] = None) -> Route:
+        """
+        查询任务的路由
+
+        Args:
+            task: 任务名
+            tier: 会员等级，默认取当前上下文用户的等级
+
+        Returns:
+            Route，未配置路由的任务或路由关闭时model和max_tokens都为None（等级仍用于排队调度）
+        """
+        if tier is None:
+            tier = self.user_tier(current_user())
+        table = self.routes.get(task) if self.enabled else None
+        if not table:
+            return Route(task, tier, None, None)
+        levels = [level for level in table if level <= tier]
+        model, max_tokens = table[max(levels)] if levels else table[min(table)]
+        return Route(task, tier, model, max_tokens)
+    
+    def record(self, route: Route, model: str, latency: float, ok: bool,
+               valid: Optional[bool] = None, truncated: bool = False, usage: Optional[dict] = None):
+        """
+        记录一次按路由发出的调用
+
+        Args:
+            route: route() 返回的路由
+            model: 实际使用的模型（没有provider提供路由的模型时回退为主模型）
+            latency: 总耗时（秒）
+            ok: 是否成功拿到结果
+            valid: 结构化任务的结果能否解析，None表示不检查
+            truncated: 输出是否因达到max_tokens被截断
+            usage: provider返回的token用量
+        """
+        with self._lock:
+            key = (route.task, route.tier, model)
+            metrics = self._metrics.get(key)
+            if metrics is None:
+                metrics = self._metrics[key] = _RouteMetrics()
+            metrics.calls += 1
+            if not ok:
+                metrics.errors += 1
+                return
+            metrics.latency.observe(latency)
+            metrics.completion_tokens += (usage or {}).get('completion_tokens', 0) or 0
+            if truncated:
+                metrics.truncated += 1
+            if valid is not None:
+                metrics.checked += 1
+                if not valid:
+                    metrics.invalid += 1
+    
+    def summary(self) -> Dict:
+        """按路由汇总，键为 任务/等级/模型，延迟单位为毫秒"""
+        def _ms(value):
+            return round(value * 1000) if value is not None else None
+        
+        with self._lock:
+            result = {}
+            for (task, tier, model), m in sorted(self._metrics.items()):
+                ok_calls = m.calls - m.errors
+                result[f'{task}/{tier}/{model}'] = {
+                    'calls': m.calls,
+                    'errors': m.errors,
+                    'p50_ms': _ms(m.latency.quantile(0.5)),
+                    'p95_ms': _ms(m.latency.quantile(0.95)),
+                    'valid_rate': round(1 - m.invalid / m.checked, 3) if m.checked else None,
+                    'truncated_rate': round(m.truncated / ok_calls, 3) if ok_calls else None,
+                    'avg_completion_tokens': round(m.completion_tokens / ok_calls) if ok_calls else None
+                }
+            return result
+    
+    def get_stats(self) -> Dict:
+        with self._lock:
+            cached_users = len(self._tiers)
+        return {'enabled': self.enabled, 'cached_user_tiers': cached_users, 'routes': self.summary()}
+
+
+_model_router = None
+_model_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """获取全局模型路由"""
+    global _model_router
+    with _model_router_lock:
+        if _model_router is None:
+            _model_router = ModelRouter()
+        return _model_router
@@ -9,6 +9,8 @@ from datetime import datetime, timedelta
 from typing import Dict, Optional
 from dataclasses import dataclass
 
+from utils.model_router import get_model_router
+
 
 @dataclass
 class Order:
@@ -230,6 +232,8 @@ class PaymentService:
         )
         
         if success:
+            # 会员等级变化后立即按新等级路由模型和排队，不等缓存过期
+            get_model_router().invalidate(order['user_id'])
             return {
                 'success': True,
                 'message': '会员开通成功',
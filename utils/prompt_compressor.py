@@ -0,0 +1,190 @@
+"""
+提示词压缩模块
+按token预算压缩简历和JD文本：清理空白、重复行和表格残留，按章节与任务/JD的相关度排序后装入预算，
+替代按字符数直接截断（截断会浪费预算在空白上，并且静默丢掉后面的内容）
+"""
+import re
+from typing import List, Tuple
+
+from utils.rate_limiter import estimate_tokens
+from utils.file_parser import SECTION_PATTERNS
+from config import PROMPT_TOKEN_BUDGETS, JD_TOKEN_BUDGET
+
+# 章节标题（SECTION_PATTERNS 之外补充技能和求职意向），只匹配整行都是标题的短行，
+# 允许序号（一、/（一）/1.）、符号（■●◆）和括号（【工作经历】）包在标题外；
+# SECTION_PATTERNS['work'] 中的时间段模式用于识别经历条目，不作为标题，否则每条带时间的经历、教育都会被切成新章节
+_HEADER_PREFIX = r'(?:[（(]?[一二三四五六七八九十\d]{1,3}[)）]|[一二三四五六七八九十\d]{1,3}[、.．])?\s*[■●◆▶★•·]?\s*[【\[〔]?\s*'
+_HEADER_LINE = r'^\s*' + _HEADER_PREFIX.replace('{', '{{').replace('}', '}}') + r'(?:{})\s*[】\]〕]?[\s\-–—:：|]*$'
+_SECTION_HEADERS = [
+    (kind, re.compile(_HEADER_LINE.format(pattern), re.I))
+    for kind, patterns in list(SECTION_PATTERNS.items()) + [
+        ('skills', [r'专业技能|技能特长|技术栈|个人技能|技能清单', r'skills']),
+        ('intention', [r'求职意向|期望职位|应聘岗位'])
+    ]
+    for pattern in patterns
+    if not re.search(r'\\d', pattern)
+]
+
+# 各任务对章节的基础权重，JD相关度在此基础上加权
+TASK_SECTION_WEIGHTS = {
+    'analyze': {'basic': 3.0, 'work': 2.0, 'project': 1.8, 'skills': 1.8, 'education': 1.5,
+                'intention': 1.2, 'intro': 1.0, 'certificate': 0.8, 'award': 0.8, 'other': 0.6},
+    'match': {'basic': 3.0, 'skills': 2.2, 'work': 2.0, 'project': 1.8, 'intention': 1.5,
+              'education': 1.2, 'certificate': 1.0, 'award': 0.6, 'intro': 0.6, 'other': 0.5},
+    'interview': {'basic': 3.0, 'project': 2.2, 'work': 2.0, 'skills': 1.6, 'intro': 1.0,
+                  'education': 0.8, 'intention': 0.8, 'award': 0.6, 'certificate': 0.5, 'other': 0.5},
+    'self-intro': {'basic': 3.0, 'work': 2.0, 'project': 1.8, 'intro': 1.6, 'skills': 1.5,
+                   'education': 1.2, 'award': 1.0, 'intention': 1.0, 'certificate': 0.6, 'other': 0.5}
+}
+
+# 经历条目的起止时间，如 2016-01 - 2018-01、2020.03 - 至今；压缩时章节内按条目分块
+_ENTRY_PERIOD = re.compile(r'(?:19|20)\d{2}\s*[./\-年]?\s*\d{0,2}月?\s*[-–—~～至到]+\s*(?:(?:19|20)\d{2}|至今|现在|今)')
+
+# 只由标点、表格线组成的行
+_DEBRIS_LINE = re.compile(r'^[\s\-_=*·•|│┃┆┊─━—–.。,，:：;；/\\#~]*$')
+_SPACES = re.compile(r'[ \t　\xa0]+')
+_ASCII_WORD = re.compile(r'[A-Za-z][A-Za-z0-9+#.]*')
+_CJK_RUN = re.compile(r'[一-鿿]+')
+
+# 重复行去重的最短长度，太短的行（如"负责"、年份）在不同经历中重复是正常的
+_MIN_DEDUPE_LENGTH = 6
+
+
+def normalize_text(text: str) -> str:
+    """
+    清理文本：合并空白、去掉表格线和重复行、合并Word表格中合并单元格重复出现的内容
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        清理后的文本，每行一段内容
+    """
+    if not text:
+        return ''
+    
+    lines = []
+    seen = set()
+    for line in text.replace('\r', '\n').split('\n'):
+        line = _SPACES.sub(' ', line).strip()
+        if not line or _DEBRIS_LINE.match(line):
+            continue
+        
+        # 合并单元格在parse_word中会重复输出，如"张三 张三 张三"
+        words = line.split(' ')
+        line = ' '.join(w for i, w in enumerate(words) if i == 0 or w != words[i - 1])
+        
+        key = line.lower()
+        if len(key) >= _MIN_DEDUPE_LENGTH:
+            if key in seen:
+                continue
+            seen.add(key)
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def split_sections(text: str) -> List[Tuple[str, List[str]]]:
+    """
+    按章节标题切分简历，标题之前的内容（姓名、联系方式等）作为 basic 章节
+
+    Returns:
+        [(章节类型, 行列表), ...]，保持原文顺序
+    """
+    sections = [('basic', [])]
+    for line in text.split('\n'):
+        kind = None
+        for section_kind, pattern in _SECTION_HEADERS:
+            if pattern.search(line):
+                kind = section_kind
+                break
+        if kind is not None:
+            sections.append((kind, [line]))
+        else:
+            sections[-1][1].append(line)
+    return [(kind, lines) for kind, lines in sections if lines]
+
+
+def _split_entries(sections: List[Tuple[str, List[str]]]) -> List[Tuple[str, List[str]]]:
+    """章节内在带起止时间的行处再分块（块类型不变），相关度低的单条经历可以单独舍弃"""
+    blocks = []
+    for kind, lines in sections:
+        block = []
+        for line in lines:
+            if block and _ENTRY_PERIOD.search(line):
+                blocks.append((kind, block))
+                block = []
+            block.append(line)
+        blocks.append((kind, block))
+    return blocks
+
+
+def _terms(text: str) -> set:
+    """英文单词 + 中文二元组，用于粗略计算相关度"""
+    terms = {w.lower() for w in _ASCII_WORD.findall(text) if len(w) > 1}
+    for run in _CJK_RUN.findall(text):
+        terms.update(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def _fit_lines(lines: List[str], budget: int) -> List[str]:
+    """按行装入预算，单行超出时按比例截断"""
+    result = []
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if cost <= budget:
+            result.append(line)
+            budget -= cost
+            continue
+        if budget > 20:
+            result.append(line[:max(1, int(len(line) * budget / cost))])
+        break
+    return result
+
+
+def compress_resume(text: str, task: str = 'analyze', query: str = '', budget: int = None) -> str:
+    """
+    把简历压缩到任务的token预算内
+
+    Args:
+        text: 简历纯文本
+        task: 任务名，决定章节权重和默认预算（见 PROMPT_TOKEN_BUDGETS）
+        query: 用于计算相关度的文本，通常为JD
+        budget: token预算，默认按任务配置
+
+    Returns:
+        压缩后的简历文本，章节保持原文顺序
+    """
+    if budget is None:
+        budget = PROMPT_TOKEN_BUDGETS.get(task, PROMPT_TOKEN_BUDGETS['default'])
+    text = normalize_text(text)
+    if estimate_tokens(text) <= budget:
+        return text
+    
+    sections = _split_entries(split_sections(text))
+    weights = TASK_SECTION_WEIGHTS.get(task, TASK_SECTION_WEIGHTS['analyze'])
+    
+    # 相关度：章节覆盖的JD词项占比，归一化到0-1
+    query_terms = _terms(query) if query else set()
+    overlaps = [len(query_terms & _terms('\n'.join(lines))) for _, lines in sections]
+    max_overlap = max(overlaps) or 1
+    scores = [
+        weights.get(kind, weights['other']) * (1 + 2 * overlap / max_overlap)
+        for (kind, _), overlap in zip(sections, overlaps)
+    ]
+    
+    selected = {}
+    remaining = budget
+    for index in sorted(range(len(sections)), key=lambda i: -scores[i]):
+        if remaining <= 20:
+            break
+        lines = _fit_lines(sections[index][1], remaining)
+        if lines:
+            selected[index] = lines
+            remaining -= sum(estimate_tokens(line) + 1 for line in lines)
+    
+    return '\n'.join(line for index in sorted(selected) for line in selected[index])
+
+
+def compress_jd(text: str, budget: int = JD_TOKEN_BUDGET) -> str:
+    """清理JD文本并按行装入token预算"""
+    return '\n'.join(_fit_lines(normalize_text(text).split('\n'), budget))
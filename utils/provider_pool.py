@@ -0,0 +1,243 @@
+"""
+多provider路由模块
+按最近的p95延迟、错误率、在途请求数和剩余限额为每个请求挑选provider，
+某个provider变慢或出错时自动把流量转移到其他provider/key
+"""
+import re
+import time
+import threading
+from collections import deque
+from typing import Optional, List, Dict, Tuple
+
+from config import (
+    PROVIDER_STATS_WINDOW,
+    PROVIDER_DEFAULT_LATENCY,
+    AI_RATE_LIMIT_MAX_WAIT
+)
+from utils.resilience import get_circuit_breaker
+from utils.rate_limiter import get_rate_limiter, RateLimitExceeded
+
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    """解析限流重置时间，兼容 "12"、"1.5s"、"6m0s"、"20ms" 等格式"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    matched = False
+    for number, unit in re.findall(r'([\d.]+)(ms|h|m|s)', value):
+        matched = True
+        total += float(number) * {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}[unit]
+    return total if matched else None
+
+
+def _header_int(headers, name: str) -> Optional[int]:
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class ProviderState:
+    """单个provider（base URL + key）的连接信息和运行统计"""
+    
+    def __init__(self, config: dict):
+        self.id = config['id']
+        self.update_config(config)
+        self.latencies = deque(maxlen=PROVIDER_STATS_WINDOW)
+        self.outcomes = deque(maxlen=PROVIDER_STATS_WINDOW)
+        self.in_flight = 0
+        self.total_requests = 0
+        self.total_failures = 0
+        self.rate_limit_limit = None
+        self.rate_limit_remaining = None
+        self.rate_limit_reset_at = 0.0
+        self.throttled_until = 0.0
+    
+    def update_config(self, config: dict):
+        self.config = config
+        self.api_url = f"{config['api_base_url']}/chat/completions"
+        self.headers = {
+            "Authorization": f"Bearer {config['api_key']}",
+            "Content-Type": "application/json"
+        }
+        self.limiter = get_rate_limiter(self.id, config.get('rpm', 0), config.get('tpm', 0))
+    
+    def p95(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+    
+    def score(self, now: float) -> float:
+        """路由评分，越小越优先"""
+        latency = self.p95()
+        if latency is None:
+            latency = PROVIDER_DEFAULT_LATENCY
+        score = latency * (1 + self.in_flight) * (1 + 4 * self.error_rate())
+        
+        # 被限流或额度耗尽的provider排到最后，仍可作为兜底
+        if self.throttled_until > now:
+            score *= 100
+        elif self.rate_limit_remaining is not None and self.rate_limit_reset_at > now:
+            if self.rate_limit_remaining <= 0:
+                score *= 100
+            elif self.rate_limit_limit and self.rate_limit_remaining < self.rate_limit_limit * 0.1:
+                score *= 2
+        return score
+    
+    def get_stats(self) -> Dict:
+        p95 = self.p95()
+        return {
+            'id': self.id,
+            'provider_name': self.config['provider_name'],
+            'model': self.config['model_name'],
+            'p95_ms': round(p95 * 1000) if p95 is not None else None,
+            'error_rate': round(self.error_rate(), 3),
+            'in_flight': self.in_flight,
+            'total_requests': self.total_requests,
+            'total_failures': self.total_failures,
+            'rate_limit_remaining': self.rate_limit_remaining,
+            'rate_limiter': self.limiter.get_stats(),
+            'circuit': get_circuit_breaker(self.id).state
+        }
+
+
+class ProviderPool:
+    """provider池：挑选provider并记录每次请求的结果"""
+    
+    def __init__(self):
+        self._providers = []
+        self._lock = threading.Lock()
+    
+    def update(self, configs: List[dict]):
+        """同步最新配置，保留已有provider的统计数据"""
+        with self._lock:
+            existing = {p.id: p for p in self._providers}
+            providers = []
+            for config in configs:
+                state = existing.get(config['id'])
+                if state is None:
+                    state = ProviderState(config)
+                else:
+                    state.update_config(config)
+                providers.append(state)
+            self._providers = providers
+    
+    @property
+    def providers(self) -> List[ProviderState]:
+        with self._lock:
+            return list(self._providers)
+    
+    def select(self, exclude=(), tokens: int = 0, max_wait: float = AI_RATE_LIMIT_MAX_WAIT,
+               model: Optional[str] = None) -> Optional[Tuple[ProviderState, float]]:
+        """
+        按评分挑选provider并预约限流额度，跳过熔断中或排队过久的provider
+        
+        Args:
+            exclude: 本次请求已失败过的provider id
+            tokens: 本次请求预计消耗的token数
+            max_wait: 最多愿意排队等待的秒数
+            model: 模型路由选中的模型，优先在提供该模型的provider中挑选；
+                   为None或没有provider提供时使用各provider配置的模型（非路由条目）。
+                   提供该模型的provider都已熔断或本次已失败时回退到非路由条目，
+                   被限流时不回退，免费流量不占用主模型的额度
+        
+        Returns:
+            (选中的provider, 发送前需要等待的秒数)；所有provider都在熔断时返回None
+        
+        Raises:
+            RateLimitExceeded: 没有熔断之外的可用provider，且都因排队过久被拒绝
+        """
+        now = time.monotonic()
+        with self._lock:
+            routed = [p for p in self._providers if model and p.config['model_name'] == model]
+            fallback = [p for p in self._providers if not p.config.get('routed') and p not in routed]
+            groups = [routed, fallback] if routed else [fallback]
+            groups = [sorted((p for p in group if p.id not in exclude), key=lambda p: p.score(now))
+                      for group in groups]
+        
+        rate_limited = False
+        for candidates in groups:
+            for provider in candidates:
+                wait = provider.limiter.try_reserve(tokens, max_wait)
+                if wait is None:
+                    rate_limited = True
+                    continue
+                if get_circuit_breaker(provider.id).allow_request():
+                    return provider, wait
+                provider.limiter.release(tokens, requests=1)
+            if rate_limited:
+                break
+        
+        if rate_limited:
+            raise RateLimitExceeded(f"rate limit budget exceeded (max wait {max_wait}s)")
+        return None
+    
+    def begin(self, provider: ProviderState) -> float:
+        """请求开始，返回开始时间"""
+        with self._lock:
+            provider.in_flight += 1
+        return time.monotonic()
+    
+    def cancel(self, provider: ProviderState):
+        """请求被调用方放弃，不计入延迟和错误率"""
+        with self._lock:
+            provider.in_flight = max(0, provider.in_flight - 1)
+    
+    def finish(self, provider: ProviderState, started: float, ok: bool,
+               headers=None, retry_after: Optional[float] = None):
+        """
+        记录请求结果
+
+        Args:
+            provider: 发出请求的provider
+            started: begin() 返回的开始时间
+            ok: provider是否正常响应
+            headers: 响应头，用于读取剩余限额
+            retry_after: 被限流时服务端要求的等待时间
+        """
+        now = time.monotonic()
+        with self._lock:
+            provider.in_flight = max(0, provider.in_flight - 1)
+            provider.total_requests += 1
+            provider.outcomes.append(ok)
+            if ok:
+                provider.latencies.append(now - started)
+            else:
+                provider.total_failures += 1
+            if retry_after is not None:
+                provider.throttled_until = now + retry_after
+            if headers is not None:
+                remaining = _header_int(headers, 'x-ratelimit-remaining-requests')
+                if remaining is not None:
+                    provider.rate_limit_remaining = remaining
+                    provider.rate_limit_limit = _header_int(headers, 'x-ratelimit-limit-requests')
+                    reset = _parse_duration(headers.get('x-ratelimit-reset-requests'))
+                    provider.rate_limit_reset_at = now + (reset if reset is not None else 60)
+    
+    def get_stats(self) -> List[Dict]:
+        with self._lock:
+            return [p.get_stats() for p in self._providers]
+
+
+_provider_pool = None
+_provider_pool_lock = threading.Lock()
+
+
+def get_provider_pool() -> ProviderPool:
+    """获取全局provider池"""
+    global _provider_pool
+    with _provider_pool_lock:
+        if _provider_pool is None:
+            _provider_pool = ProviderPool()
+        return _provider_pool
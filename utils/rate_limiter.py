@@ -0,0 +1,144 @@
+"""
+客户端限流模块
+每个provider一组RPM/TPM令牌桶，多线程共享；超出额度的请求排队等待，
+预计等待超过上限时直接拒绝，避免把突发流量打到provider上换来一串429
+"""
+import re
+import time
+import threading
+from typing import Optional, Dict
+
+from config import AI_RATE_LIMIT_BURST_SECONDS
+
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：中日韩字符约1个token，其余字符约4个字符1个token"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class RateLimitExceeded(Exception):
+    """所有provider的排队等待都会超过上限"""
+    pass
+
+
+class TokenBucket:
+    """
+    令牌桶（预约式）
+
+    先按当前余额计算等待时间再扣除令牌，余额可以为负；
+    后到的线程据此排在后面，多个线程按预约顺序依次获得额度，等待期间不占用锁
+    """
+    
+    def __init__(self, per_minute: int, burst_seconds: float = AI_RATE_LIMIT_BURST_SECONDS):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+    
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+    
+    def wait_time(self, amount: float, now: float) -> float:
+        """扣除amount后需要等待的秒数（不扣除）"""
+        self._refill(now)
+        deficit = amount - self.tokens
+        return deficit / self.rate if deficit > 0 else 0.0
+    
+    def consume(self, amount: float):
+        self.tokens -= amount
+    
+    def refund(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """单个provider的RPM/TPM限流器，rpm/tpm为0表示不限制"""
+    
+    def __init__(self, name: str, rpm: int = 0, tpm: int = 0):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = TokenBucket(rpm) if rpm else None
+        self._tokens = TokenBucket(tpm) if tpm else None
+        self._lock = threading.Lock()
+        self._stats = {
+            'admitted': 0,
+            'rejected': 0,
+            'delayed': 0,
+            'total_wait_seconds': 0.0
+        }
+    
+    def try_reserve(self, tokens: int, max_wait: float) -> Optional[float]:
+        """
+        预约一次请求的额度
+
+        Args:
+            tokens: 预计消耗的token数
+            max_wait: 最多愿意等待的秒数
+
+        Returns:
+            需要等待的秒数；超过max_wait时不扣除额度并返回None
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self._requests:
+                wait = max(wait, self._requests.wait_time(1, now))
+            if self._tokens:
+                wait = max(wait, self._tokens.wait_time(tokens, now))
+            if wait > max_wait:
+                self._stats['rejected'] += 1
+                return None
+            if self._requests:
+                self._requests.consume(1)
+            if self._tokens:
+                self._tokens.consume(tokens)
+            self._stats['admitted'] += 1
+            if wait > 0:
+                self._stats['delayed'] += 1
+                self._stats['total_wait_seconds'] += wait
+            return wait
+    
+    def release(self, tokens: int, requests: int = 0):
+        """
+        校正已预约的额度
+
+        Args:
+            tokens: 退还的token数（实际用量少于预估）；为负时补扣（实际用量多于预估）
+            requests: 退还的请求数（预约后未发出请求）
+        """
+        with self._lock:
+            if self._requests and requests:
+                self._requests.refund(requests)
+            if self._tokens and tokens > 0:
+                self._tokens.refund(tokens)
+            elif self._tokens and tokens < 0:
+                self._tokens.consume(-tokens)
+    
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['total_wait_seconds'] = round(stats['total_wait_seconds'], 2)
+            stats['rpm'] = self.rpm
+            stats['tpm'] = self.tpm
+            return stats
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str, rpm: int = 0, tpm: int = 0) -> RateLimiter:
+    """获取指定provider的限流器，额度配置变化时重建"""
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(name)
+        if limiter is None or limiter.rpm != rpm or limiter.tpm != tpm:
+            limiter = RateLimiter(name, rpm, tpm)
+            _rate_limiters[name] = limiter
+        return limiter
@@ -0,0 +1,189 @@
+"""
+AI调用容错模块
+指数退避重试 + 按provider熔断，provider故障时快速失败而不是让请求线程堆积
+"""
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Optional, Dict
+
+from config import (
+    AI_CIRCUIT_FAILURE_THRESHOLD,
+    AI_CIRCUIT_RESET_TIMEOUT
+)
+
+# 可重试的HTTP状态码
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    closed: 正常放行，连续失败达到阈值后进入open
+    open: 直接拒绝，冷却时间过后进入half_open
+    half_open: 只放行一个探测请求，成功则closed，失败则重新open
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, name: str, failure_threshold: int = AI_CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = AI_CIRCUIT_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._stats = {
+            'total_failures': 0,
+            'rejected': 0,
+            'times_opened': 0
+        }
+    
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+    
+    def _current_state(self) -> str:
+        # 调用方需持有self._lock
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+    
+    def allow_request(self) -> bool:
+        """是否放行本次请求"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._stats['rejected'] += 1
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+    
+    def record_cancelled(self):
+        """请求被调用方放弃（如截止时间已到），不计入成功或失败，只释放探测名额"""
+        with self._lock:
+            self._probe_in_flight = False
+    
+    def record_failure(self):
+        with self._lock:
+            self._stats['total_failures'] += 1
+            self._consecutive_failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    self._stats['times_opened'] += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+    
+    def get_stats(self) -> Dict:
+        with self._lock:
+            state = self._current_state()
+            stats = dict(self._stats)
+            stats['state'] = state
+            stats['consecutive_failures'] = self._consecutive_failures
+            if state == self.OPEN:
+                stats['retry_in_seconds'] = round(
+                    max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)), 1
+                )
+            return stats
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After响应头（秒数或HTTP日期）"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def compute_backoff(attempt: int, base_delay: float, max_delay: float,
+                    retry_after: Optional[float] = None) -> Optional[float]:
+    """
+    计算第attempt次重试前的等待时间（full jitter指数退避）
+
+    Args:
+        attempt: 已失败次数，从0开始
+        base_delay: 基础等待时间（秒）
+        max_delay: 单次等待上限（秒）
+        retry_after: 服务端要求的等待时间
+
+    Returns:
+        等待秒数；服务端要求的等待超过上限时返回None，表示不再重试
+    """
+    if retry_after is not None:
+        if retry_after > max_delay:
+            return None
+        return retry_after + random.uniform(0, base_delay)
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+# 按provider划分的熔断器
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+# 重试统计
+retry_stats = {
+    'retries': 0,
+    'failovers': 0,
+    'retries_exhausted': 0,
+    'circuit_rejections': 0,
+    'rate_limit_rejections': 0,
+    'deadline_exceeded': 0,
+    'queue_timeouts': 0
+}
+_retry_stats_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """获取指定provider的熔断器"""
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name)
+            _circuit_breakers[name] = breaker
+        return breaker
+
+
+def record_retry_event(event: str):
+    """记录重试事件：retries / failovers / retries_exhausted / circuit_rejections / rate_limit_rejections / deadline_exceeded / queue_timeouts"""
+    with _retry_stats_lock:
+        retry_stats[event] += 1
+
+
+def get_resilience_stats() -> Dict:
+    """获取重试次数和各provider熔断器状态"""
+    with _retry_stats_lock:
+        stats = dict(retry_stats)
+    with _circuit_breakers_lock:
+        breakers = list(_circuit_breakers.values())
+    stats['circuit_breakers'] = {b.name: b.get_stats() for b in breakers}
+    return stats
@@ -0,0 +1,352 @@
+"""
+简历摘要模块
+每份简历文本（按规范化文本的哈希）只生成一次结构化摘要：工作经历、时间、量化成果和技能，
+保存在主数据库的resume_summaries表。匹配、面试题、自我介绍等下游任务用摘要代替简历原文，
+每次调用的提示词token减少数倍；简历文本变化后哈希随之变化，自动使用新的摘要
+"""
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from config import (
+    DATABASE_PATH,
+    RESUME_SUMMARY_SOURCE,
+    RESUME_SUMMARY_VERSION,
+    RESUME_SUMMARY_WORKERS,
+    RESUME_SUMMARY_RETRY_INTERVAL
+)
+from utils.file_parser import extract_skills
+from utils.prompt_compressor import normalize_text, split_sections
+from utils.local_analyzer import QUANTIFIED
+from utils.usage_tracker import current_user, user_scope
+
+# 经历起止时间，如 2020.03-2023.06、2021年3月 - 至今
+_PERIOD = re.compile(r'((?:19|20)\d{2}\s*[./\-年]\s*\d{1,2}月?)\s*(?:[-–—~～至到]+\s*((?:19|20)\d{2}\s*[./\-年]\s*\d{1,2}月?|至今|现在|今))?')
+_CONTACT = re.compile(r'@|1[3-9]\d{9}|电话|手机|邮箱|微信|地址', re.I)
+
+# 各部分最多保留的条目数，控制摘要长度
+MAX_ROLES = 6
+MAX_PROJECTS = 4
+MAX_HIGHLIGHTS = 3
+MAX_ACHIEVEMENTS = 6
+MAX_SKILLS = 25
+MAX_LINE_LENGTH = 120
+
+
+def summary_key(resume_text: str) -> str:
+    """摘要的键：规范化文本的哈希，格式版本变化时全部失效"""
+    text = normalize_text(resume_text or '')
+    return hashlib.sha256(f'{RESUME_SUMMARY_VERSION}\n{text}'.encode('utf-8')).hexdigest()
+
+
+def _clip(line: str) -> str:
+    line = line.strip(' \t-•·*')
+    return line if len(line) <= MAX_LINE_LENGTH else line[:MAX_LINE_LENGTH] + '…'
+
+
+def _entries(lines: List[str]) -> List[Dict]:
+    """按带时间的行切分经历条目，每条保留标题、时间和最多MAX_HIGHLIGHTS条要点（量化成果优先）"""
+    entries = []
+    for index, line in enumerate(lines):
+        match = _PERIOD.search(line)
+        if index == 0 and not match:
+            # 章节标题行
+            continue
+        if match or not entries:
+            title = _PERIOD.sub('', line).strip(' \t|｜-–—,，') if match else ''
+            period = ' - '.join(part for part in match.groups() if part) if match else ''
+            entries.append({'title': _clip(title), 'period': period, 'lines': []})
+            if match:
+                continue
+        entries[-1]['lines'].append(line)
+    
+    result = []
+    for entry in entries:
+        lines = [line for line in entry.pop('lines') if len(line) >= 6]
+        ranked = sorted(lines, key=lambda line: not QUANTIFIED.search(line))
+        entry['highlights'] = [_clip(line) for line in ranked[:MAX_HIGHLIGHTS]]
+        if entry['title'] or entry['highlights']:
+            result.append(entry)
+    return result
+
+
+def build_local_summary(resume_text: str) -> Dict:
+    """
+    用本地规则从简历中提取摘要（不调用AI）
+
+    Args:
+        resume_text: 简历纯文本
+
+    Returns:
+        与AI摘要结构一致的字典，source为local
+    """
+    text = normalize_text(resume_text or '')
+    sections = split_sections(text)
+    summary = {
+        'name': '',
+        'headline': '',
+        'roles': [],
+        'projects': [],
+        'education': [],
+        'skills': extract_skills(text)[:MAX_SKILLS],
+        'achievements': [],
+        'source': 'local'
+    }
+    
+    for kind, lines in sections:
+        lines = [line.strip() for line in lines if line.strip()]
+        if kind == 'basic':
+            info = [line for line in lines if not _CONTACT.search(line)]
+            if info:
+                summary['name'] = _clip(info[0])
+                summary['headline'] = ' '.join(_clip(line) for line in info[1:3])
+        elif kind == 'work':
+            summary['roles'].extend(_entries(lines))
+        elif kind == 'project':
+            summary['projects'].extend(_entries(lines))
+        elif kind == 'education':
+            summary['education'].extend(_clip(line) for line in lines[1:4])
+        elif kind == 'intention' and not summary['headline']:
+            summary['headline'] = ' '.join(_clip(line) for line in lines[:2])
+    
+    summary['roles'] = summary['roles'][:MAX_ROLES]
+    summary['projects'] = summary['projects'][:MAX_PROJECTS]
+    highlights = [h for entry in summary['roles'] + summary['projects'] for h in entry['highlights']]
+    summary['achievements'] = [h for h in highlights if QUANTIFIED.search(h)][:MAX_ACHIEVEMENTS]
+    return summary
+
+
+def is_valid_summary(summary) -> bool:
+    """AI返回的摘要至少要有经历或技能，否则视为无效"""
+    return isinstance(summary, dict) and bool(
+        summary.get('roles') or summary.get('projects') or summary.get('skills')
+    )
+
+
+def render_summary(summary: Dict) -> str:
+    """把摘要渲染为提示词中的紧凑文本"""
+    lines = []
+    if summary.get('name'):
+        lines.append(f"姓名：{summary['name']}")
+    if summary.get('headline'):
+        lines.append(f"概况：{summary['headline']}")
+    if summary.get('skills'):
+        lines.append(f"技能：{', '.join(str(s) for s in summary['skills'])}")
+    
+    for label, key in (('工作经历', 'roles'), ('项目经历', 'projects')):
+        entries = summary.get(key) or []
+        if entries:
+            lines.append(f'{label}：')
+        for entry in entries:
+            if not isinstance(entry, dict):
+                lines.append(f'- {entry}')
+                continue
+            header = ' '.join(str(entry[k]) for k in ('period', 'title') if entry.get(k))
+            lines.append(f'- {header}')
+            lines.extend(f'  · {highlight}' for highlight in entry.get('highlights') or [])
+    
+    if summary.get('education'):
+        lines.append(f"教育背景：{'；'.join(str(e) for e in summary['education'])}")
+    # 已在经历要点中出现的成果不重复
+    shown = {str(h) for key in ('roles', 'projects') for entry in summary.get(key) or []
+             if isinstance(entry, dict) for h in entry.get('highlights') or []}
+    achievements = [str(a) for a in summary.get('achievements') or [] if str(a) not in shown]
+    if achievements:
+        lines.append('量化成果：')
+        lines.extend(f'- {achievement}' for achievement in achievements)
+    return '\n'.join(lines)
+
+
+class ResumeSummaryStore:
+    """按简历文本哈希保存摘要（主数据库的resume_summaries表）"""
+    
+    def __init__(self, db_path: str = DATABASE_PATH):
+        self.db_path = db_path
+        self._stats = {'hits': 0, 'misses': 0, 'built': 0, 'build_failures': 0}
+        self._lock = threading.Lock()
+        self._init_db()
+    
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+    
+    def _init_db(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS resume_summaries (
+                text_hash TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                source TEXT NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.commit()
+        conn.close()
+    
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+    
+    def get(self, text_hash: str) -> Optional[Dict]:
+        conn = self._connect()
+        row = conn.execute('SELECT summary FROM resume_summaries WHERE text_hash = ?', (text_hash,)).fetchone()
+        conn.close()
+        self._count('hits' if row else 'misses')
+        return json.loads(row[0]) if row else None
+    
+    def is_older_than(self, text_hash: str, seconds: float) -> bool:
+        """摘要保存时间是否超过seconds秒"""
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT 1 FROM resume_summaries WHERE text_hash = ? AND created_at <= datetime('now', ?)",
+            (text_hash, f'-{int(seconds)} seconds')
+        ).fetchone()
+        conn.close()
+        return row is not None
+    
+    def exists(self, text_hash: str) -> bool:
+        conn = self._connect()
+        row = conn.execute('SELECT 1 FROM resume_summaries WHERE text_hash = ?', (text_hash,)).fetchone()
+        conn.close()
+        return row is not None
+    
+    def put(self, text_hash: str, summary: Dict):
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO resume_summaries (text_hash, summary, source) VALUES (?, ?, ?)',
+            (text_hash, json.dumps(summary, ensure_ascii=False), summary.get('source', 'ai'))
+        )
+        conn.commit()
+        conn.close()
+        self._count('built')
+    
+    def record_build_failure(self):
+        self._count('build_failures')
+    
+    def delete(self, text_hash: str):
+        conn = self._connect()
+        conn.execute('DELETE FROM resume_summaries WHERE text_hash = ?', (text_hash,))
+        conn.commit()
+        conn.close()
+    
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+_summary_store = None
+_summary_store_lock = threading.Lock()
+
+# 后台生成AI摘要的线程池，同一份简历只提交一次
+_summary_executor = ThreadPoolExecutor(max_workers=RESUME_SUMMARY_WORKERS, thread_name_prefix='resume-summary')
+_pending_summaries = set()
+_pending_summaries_lock = threading.Lock()
+
+
+def get_summary_store() -> ResumeSummaryStore:
+    """获取简历摘要存储单例"""
+    global _summary_store
+    with _summary_store_lock:
+        if _summary_store is None:
+            _summary_store = ResumeSummaryStore()
+        return _summary_store
+
+
+def _build_summary(text_hash: str, resume_text: str):
+    store = get_summary_store()
+    try:
+        summary = None
+        try:
+            from utils.ai_client import get_ai_client
+            summary = get_ai_client().summarize_resume(resume_text)
+        except Exception as e:
+            print(f"Resume summary failed: {e}")
+        if is_valid_summary(summary):
+            summary['source'] = 'ai'
+            store.put(text_hash, summary)
+        else:
+            # AI失败时保存本地摘要，RESUME_SUMMARY_RETRY_INTERVAL后才再次尝试AI；
+            # 否则provider故障期间每次下游调用都会多发一次摘要请求
+            store.record_build_failure()
+            store.put(text_hash, build_local_summary(resume_text))
+    except Exception as e:
+        print(f"Failed to save resume summary: {e}")
+    finally:
+        with _pending_summaries_lock:
+            _pending_summaries.discard(text_hash)
+
+
+def _submit(text_hash: str, resume_text: str) -> bool:
+    with _pending_summaries_lock:
+        if text_hash in _pending_summaries:
+            return False
+        _pending_summaries.add(text_hash)
+    
+    # 用量记到上传的用户
+    user_id = current_user()
+    
+    def _run():
+        with user_scope(user_id):
+            _build_summary(text_hash, resume_text)
+    
+    _summary_executor.submit(_run)
+    return True
+
+
+def schedule_summary(resume_text: str) -> bool:
+    """
+    在后台生成AI简历摘要（上传后调用），已有摘要或正在生成时不重复提交
+
+    Returns:
+        是否提交了新的生成任务；RESUME_SUMMARY_SOURCE为local时摘要在使用时生成，返回False
+    """
+    if RESUME_SUMMARY_SOURCE != 'ai' or not resume_text or not resume_text.strip():
+        return False
+    text_hash = summary_key(resume_text)
+    if get_summary_store().exists(text_hash):
+        return False
+    return _submit(text_hash, resume_text)
+
+
+def get_resume_summary(resume_text: str) -> Optional[Dict]:
+    """
+    获取简历摘要，不会为等待AI摘要而阻塞
+
+    RESUME_SUMMARY_SOURCE为local时没有摘要则立即用本地规则生成并保存；
+    为ai时没有摘要返回None（调用方使用简历原文），同时在后台生成AI摘要；
+    AI失败后保存的本地摘要超过RESUME_SUMMARY_RETRY_INTERVAL时在后台重试AI
+    """
+    if not resume_text or not resume_text.strip():
+        return None
+    store = get_summary_store()
+    text_hash = summary_key(resume_text)
+    summary = store.get(text_hash)
+    if summary is not None:
+        if (RESUME_SUMMARY_SOURCE == 'ai' and summary.get('source') == 'local'
+                and store.is_older_than(text_hash, RESUME_SUMMARY_RETRY_INTERVAL)):
+            _submit(text_hash, resume_text)
+        return summary
+    
+    if RESUME_SUMMARY_SOURCE == 'local':
+        summary = build_local_summary(resume_text)
+        store.put(text_hash, summary)
+        return summary
+    _submit(text_hash, resume_text)
+    return None
+
+
+def remove_resume_summary(resume_text: str):
+    """删除简历文本对应的摘要（简历被删除且没有其他简历使用相同文本时）"""
+    get_summary_store().delete(summary_key(resume_text))
+
+
+def get_summary_stats() -> Dict:
+    stats = get_summary_store().get_stats()
+    with _pending_summaries_lock:
+        stats['pending'] = len(_pending_summaries)
+    return stats
@@ -0,0 +1,296 @@
+"""
+近似重复检测模块
+对规范化文本计算MinHash签名，用LSH分桶快速找出相似度超过阈值的历史简历/JD，
+轻微修改后重新上传的简历和几乎相同的JD可以复用已有分析结果，不再调用provider
+"""
+import os
+import json
+import random
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from config import (
+    DATABASE_PATH,
+    MINHASH_PERMUTATIONS,
+    LSH_BANDS,
+    SHINGLE_SIZE,
+    SIMILARITY_THRESHOLDS
+)
+from utils.prompt_compressor import normalize_text
+
+# 梅森素数，哈希排列 (a*x + b) mod P
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _permutations(count: int) -> List[Tuple[int, int]]:
+    # 固定种子：签名会持久化，各进程必须使用相同的排列
+    rng = random.Random(20240601)
+    return [(rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1)) for _ in range(count)]
+
+
+_PERMUTATIONS = _permutations(MINHASH_PERMUTATIONS)
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """规范化后去掉空白和大小写差异，按字符取size-gram（对中文不依赖分词）"""
+    text = ''.join(normalize_text(text).lower().split())
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def minhash_signature(text: str, num_perm: int = MINHASH_PERMUTATIONS) -> List[int]:
+    """
+    计算MinHash签名
+
+    Args:
+        text: 原始文本
+        num_perm: 签名长度（哈希排列数）
+
+    Returns:
+        签名列表，空文本返回空列表
+    """
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little')
+        for s in shingles(text)
+    ]
+    if not hashes:
+        return []
+    return [
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes) & _MAX_HASH
+        for a, b in _PERMUTATIONS[:num_perm]
+    ]
+
+
+def estimate_similarity(sig1: List[int], sig2: List[int]) -> float:
+    """两个签名相同位置取值相等的比例，即Jaccard相似度的估计"""
+    if not sig1 or len(sig1) != len(sig2):
+        return 0.0
+    return sum(1 for x, y in zip(sig1, sig2) if x == y) / len(sig1)
+
+
+class SimilarityIndex:
+    """
+    MinHash LSH索引，签名持久化在主数据库的text_signatures表
+
+    签名分成bands段，任意一段完全相同即成为候选，再按完整签名估算相似度过滤；
+    新增的签名在查询前按自增ID增量加载，其他进程写入的签名也能被查到
+    """
+    
+    def __init__(self, kind: str, threshold: float, db_path: str = DATABASE_PATH,
+                 bands: int = LSH_BANDS):
+        """
+        Args:
+            kind: 文本类型（resume / jd），同类文本才互相比较
+            threshold: 相似度阈值（0-1）
+            db_path: 主数据库路径
+            bands: LSH分段数，签名长度需能被整除
+        """
+        self.kind = kind
+        self.threshold = threshold
+        self.db_path = db_path
+        self.bands = bands
+        self.rows = MINHASH_PERMUTATIONS // bands
+        
+        self._signatures = {}  # ref_id -> signature
+        self._buckets = [{} for _ in range(bands)]  # band -> {band值: set(ref_id)}
+        self._last_row_id = 0
+        self._lock = threading.Lock()
+        self._init_db()
+    
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+    
+    def _init_db(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS text_signatures (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                ref_id INTEGER NOT NULL,
+                signature TEXT NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_text_signatures_kind ON text_signatures (kind, ref_id)')
+        conn.commit()
+        conn.close()
+    
+    def _band_keys(self, signature: List[int]):
+        for band in range(self.bands):
+            yield band, tuple(signature[band * self.rows:(band + 1) * self.rows])
+    
+    def _insert(self, ref_id: int, signature: List[int]):
+        self._signatures[ref_id] = signature
+        for band, key in self._band_keys(signature):
+            self._buckets[band].setdefault(key, set()).add(ref_id)
+    
+    def _discard(self, ref_id: int):
+        signature = self._signatures.pop(ref_id, None)
+        if signature is None:
+            return
+        for band, key in self._band_keys(signature):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(ref_id)
+                if not bucket:
+                    del self._buckets[band][key]
+    
+    def _sync(self):
+        """加载其他进程（或本进程）新写入的签名"""
+        conn = self._connect()
+        rows = conn.execute(
+            'SELECT id, ref_id, signature FROM text_signatures WHERE kind = ? AND id > ? ORDER BY id',
+            (self.kind, self._last_row_id)
+        ).fetchall()
+        conn.close()
+        for row_id, ref_id, signature in rows:
+            signature = json.loads(signature)
+            if len(signature) == MINHASH_PERMUTATIONS:
+                self._insert(ref_id, signature)
+            self._last_row_id = row_id
+    
+    def add(self, ref_id: int, text: str = '', signature: Optional[List[int]] = None) -> List[int]:
+        """
+        计算并保存文本签名
+
+        Args:
+            ref_id: 简历ID或JD ID
+            text: 文本（已有签名时可省略）
+            signature: 已计算好的签名
+
+        Returns:
+            签名，空文本不保存并返回空列表
+        """
+        if signature is None:
+            signature = minhash_signature(text)
+        if not signature:
+            return signature
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                'INSERT INTO text_signatures (kind, ref_id, signature) VALUES (?, ?, ?)',
+                (self.kind, ref_id, json.dumps(signature))
+            )
+            conn.commit()
+            conn.close()
+            self._sync()
+        return signature
+    
+    def signature(self, ref_id: int) -> Optional[List[int]]:
+        """已保存的签名，尚未建立索引时返回None"""
+        with self._lock:
+            self._sync()
+            return self._signatures.get(ref_id)
+    
+    def find(self, text: Optional[str] = None, signature: Optional[List[int]] = None,
+             exclude=()) -> List[Tuple[int, float]]:
+        """
+        查找相似度不低于阈值的文本
+
+        Args:
+            text: 查询文本（已有签名时可省略）
+            signature: 查询文本的签名
+            exclude: 不参与比较的ref_id
+
+        Returns:
+            [(ref_id, 相似度), ...]，按相似度从高到低排序
+        """
+        if signature is None:
+            signature = minhash_signature(text or '')
+        if not signature:
+            return []
+        with self._lock:
+            self._sync()
+            candidates = set()
+            for band, key in self._band_keys(signature):
+                candidates.update(self._buckets[band].get(key, ()))
+            scored = [
+                (ref_id, estimate_similarity(signature, self._signatures[ref_id]))
+                for ref_id in candidates if ref_id not in exclude
+            ]
+        matches = [(ref_id, score) for ref_id, score in scored if score >= self.threshold]
+        return sorted(matches, key=lambda item: (-item[1], -item[0]))
+    
+    def remove(self, ref_ids: List[int]):
+        """删除签名（简历或JD被删除时）"""
+        if not ref_ids:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                'DELETE FROM text_signatures WHERE kind = ? AND ref_id = ?',
+                [(self.kind, ref_id) for ref_id in ref_ids]
+            )
+            conn.commit()
+            conn.close()
+            for ref_id in ref_ids:
+                self._discard(ref_id)
+    
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {'kind': self.kind, 'entries': len(self._signatures), 'threshold': self.threshold}
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+# 签名计算是纯Python的CPU密集操作（8000字的简历约0.3秒），在单个后台线程中执行，不占用请求线程
+_index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='similarity-index')
+_pending_index = {}  # (kind, ref_id) -> Future
+_pending_index_lock = threading.Lock()
+
+
+def get_similarity_index(kind: str) -> SimilarityIndex:
+    """获取指定文本类型的索引单例（resume / jd）"""
+    with _indexes_lock:
+        index = _indexes.get(kind)
+        if index is None:
+            index = _indexes[kind] = SimilarityIndex(kind, SIMILARITY_THRESHOLDS[kind])
+        return index
+
+
+def schedule_index(kind: str, ref_ids: List[int], text: str = '',
+                   signature: Optional[List[int]] = None) -> Future:
+    """
+    在后台计算签名并加入索引，同一文本的多个ref_id只计算一次
+
+    Args:
+        kind: 文本类型（resume / jd）
+        ref_ids: 简历ID或JD ID列表
+        text: 文本（已有签名时可省略）
+        signature: 请求中已计算好的签名
+
+    Returns:
+        结果为签名的Future；同一条目正在建立索引时返回进行中的Future
+    """
+    keys = [(kind, ref_id) for ref_id in ref_ids]
+    with _pending_index_lock:
+        for key in keys:
+            if key in _pending_index:
+                return _pending_index[key]
+        
+        def _run():
+            try:
+                sig = signature if signature is not None else minhash_signature(text)
+                index = get_similarity_index(kind)
+                for ref_id in ref_ids:
+                    index.add(ref_id, signature=sig)
+                return sig
+            except Exception as e:
+                print(f"Failed to index {kind} {ref_ids}: {e}")
+                return []
+            finally:
+                with _pending_index_lock:
+                    for key in keys:
+                        _pending_index.pop(key, None)
+        
+        future = _index_executor.submit(_run)
+        for key in keys:
+            _pending_index[key] = future
+        return future
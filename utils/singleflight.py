@@ -0,0 +1,89 @@
+"""
+请求合并模块（single-flight）
+相同请求键的并发调用只执行一次，其余调用方等待并共享同一个结果
+"""
+import threading
+from typing import Callable, Any, Tuple
+
+from utils.deadline import remaining as deadline_remaining
+
+
+class Call:
+    """一次进行中的调用"""
+    
+    def __init__(self):
+        self._event = threading.Event()
+        self.value = None
+        self.abandoned = False  # 发起方中途放弃（如流式请求的客户端断开），等待方需自行请求
+    
+    def wait(self) -> Any:
+        """
+        等待发起方完成，最多等到当前请求的截止时间（未设置截止时间时一直等待）
+
+        Raises:
+            TimeoutError: 截止时间前发起方仍未完成
+        """
+        budget = deadline_remaining()
+        if not self._event.wait(None if budget is None else max(0.0, budget)):
+            raise TimeoutError('request deadline exceeded while waiting for an identical in-flight call')
+        return self.value
+
+
+class SingleFlight:
+    """按键合并并发调用"""
+    
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+    
+    def begin(self, key: str) -> Tuple[Call, bool]:
+        """
+        登记一次调用
+
+        Returns:
+            (调用对象, 是否为发起方)；发起方完成后必须调用 finish()，等待方调用 call.wait()
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = Call()
+            self._calls[key] = call
+            return call, True
+    
+    def finish(self, key: str, call: Call, value: Any = None, abandoned: bool = False):
+        """发起方完成调用，唤醒所有等待方"""
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.value = value
+        call.abandoned = abandoned
+        call._event.set()
+    
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        执行fn，相同key的并发调用共享结果；发起方中途放弃时等待方自行执行fn
+
+        Returns:
+            (结果, 是否共享了其他调用方的结果)
+
+        Raises:
+            TimeoutError: 等待方在自己的截止时间前没有等到结果
+        """
+        call, leader = self.begin(key)
+        if not leader:
+            value = call.wait()
+            if not call.abandoned:
+                return value, True
+            return fn(), False
+        
+        value = None
+        try:
+            value = fn()
+            return value, False
+        finally:
+            self.finish(key, call, value)
+    
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,250 @@
+"""
+用户用量统计模块
+每次LLM调用的token用量按 (用户, 日期, 任务, 模型) 在内存中累加，
+后台线程定期用一条批量UPSERT写入token_usage表，调用路径上没有数据库操作
+"""
+import os
+import atexit
+import sqlite3
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import (
+    DATABASE_PATH,
+    USAGE_FLUSH_INTERVAL,
+    USAGE_FLUSH_MAX_KEYS,
+    MODEL_PRICES
+)
+
+# 未登录用户的用量记在 user_id = 0
+ANONYMOUS_USER_ID = 0
+
+_current_user = contextvars.ContextVar('usage_user_id', default=None)
+
+
+def set_current_user(user_id: Optional[int]) -> contextvars.Token:
+    """设置当前上下文的用户，返回用于 reset_current_user() 的token"""
+    return _current_user.set(user_id)
+
+
+def reset_current_user(token: contextvars.Token):
+    _current_user.reset(token)
+
+
+@contextmanager
+def user_scope(user_id: Optional[int]):
+    """在with块内把LLM用量记到指定用户（后台worker执行任务时使用）"""
+    token = set_current_user(user_id)
+    try:
+        yield
+    finally:
+        reset_current_user(token)
+
+
+def current_user() -> Optional[int]:
+    return _current_user.get()
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """按 MODEL_PRICES 估算费用（元），未配置价格的模型按0计"""
+    input_price, output_price = MODEL_PRICES.get(model, (0, 0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+class UsageTracker:
+    """内存汇总 + 定期批量写入的用量统计"""
+    
+    def __init__(self, db_path: str = DATABASE_PATH, flush_interval: float = USAGE_FLUSH_INTERVAL,
+                 max_pending_keys: int = USAGE_FLUSH_MAX_KEYS):
+        """
+        Args:
+            db_path: 主数据库路径
+            flush_interval: 后台写入间隔（秒），0表示不启动后台线程（只在手动flush时写入）
+            max_pending_keys: 待写入的汇总条目超过该值时立即唤醒后台线程
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_pending_keys = max_pending_keys
+        
+        self._pending = {}  # (user_id, date, task, model) -> [calls, prompt_tokens, completion_tokens, cost]
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stats = {'recorded_calls': 0, 'flushes': 0, 'flushed_rows': 0, 'flush_errors': 0}
+        self._init_db()
+        
+        if flush_interval > 0:
+            threading.Thread(target=self._run, daemon=True).start()
+    
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+    
+    def _init_db(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS token_usage (
+                user_id INTEGER NOT NULL,
+                date DATE NOT NULL,
+                task TEXT NOT NULL,
+                model TEXT NOT NULL,
+                calls INTEGER DEFAULT 0,
+                prompt_tokens INTEGER DEFAULT 0,
+                completion_tokens INTEGER DEFAULT 0,
+                cost REAL DEFAULT 0,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, date, task, model)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_token_usage_date ON token_usage (date)')
+        conn.commit()
+        conn.close()
+    
+    def record(self, task: str, model: str, usage: dict, user_id: Optional[int] = None):
+        """
+        累加一次调用的用量（只操作内存）
+
+        Args:
+            task: 任务名
+            model: 模型名
+            usage: provider返回的usage（prompt_tokens / completion_tokens）
+            user_id: 用户ID，默认取当前上下文的用户
+        """
+        if user_id is None:
+            user_id = current_user()
+        prompt_tokens = usage.get('prompt_tokens', 0) or 0
+        completion_tokens = usage.get('completion_tokens', 0) or 0
+        key = (
+            user_id if user_id is not None else ANONYMOUS_USER_ID,
+            datetime.now().strftime('%Y-%m-%d'),
+            task,
+            model
+        )
+        with self._lock:
+            entry = self._pending.setdefault(key, [0, 0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += prompt_tokens
+            entry[2] += completion_tokens
+            entry[3] += estimate_cost(model, prompt_tokens, completion_tokens)
+            self._stats['recorded_calls'] += 1
+            backlog = len(self._pending)
+        if backlog >= self.max_pending_keys:
+            self._wakeup.set()
+    
+    def flush(self) -> int:
+        """
+        把内存中的汇总写入数据库
+
+        Returns:
+            写入的行数，失败时数据合并回内存等待下次写入
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            
+            rows = [key + tuple(values) for key, values in pending.items()]
+            try:
+                conn = self._connect()
+                try:
+                    conn.executemany('''
+                        INSERT INTO token_usage (user_id, date, task, model, calls, prompt_tokens, completion_tokens, cost)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (user_id, date, task, model) DO UPDATE SET
+                            calls = calls + excluded.calls,
+                            prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                            completion_tokens = completion_tokens + excluded.completion_tokens,
+                            cost = cost + excluded.cost,
+                            updated_at = CURRENT_TIMESTAMP
+                    ''', rows)
+                    conn.commit()
+                finally:
+                    conn.close()
+            except Exception as e:
+                print(f"Failed to flush token usage ({len(rows)} rows): {e}")
+                with self._lock:
+                    for key, values in pending.items():
+                        entry = self._pending.setdefault(key, [0, 0, 0, 0.0])
+                        for i, value in enumerate(values):
+                            entry[i] += value
+                    self._stats['flush_errors'] += 1
+                return 0
+            
+            with self._lock:
+                self._stats['flushes'] += 1
+                self._stats['flushed_rows'] += len(rows)
+            return len(rows)
+    
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+    
+    def query(self, start_date: str, end_date: str, group_by: str = 'user',
+              user_id: Optional[int] = None, limit: int = 100) -> List[Dict]:
+        """
+        查询汇总用量（先写入内存中的数据，结果包含最新调用）
+
+        Args:
+            start_date: 开始日期（含），YYYY-MM-DD
+            end_date: 结束日期（含）
+            group_by: user / date / task / model
+            user_id: 只查询指定用户
+            limit: 最多返回行数，按日期分组时按日期排序，否则按token总数倒序
+
+        Returns:
+            [{分组字段, calls, prompt_tokens, completion_tokens, total_tokens, cost}, ...]
+
+        Raises:
+            ValueError: 不支持的分组字段
+        """
+        columns = {'user': 'user_id', 'date': 'date', 'task': 'task', 'model': 'model'}
+        if group_by not in columns:
+            raise ValueError(f'不支持的分组: {group_by}')
+        column = columns[group_by]
+        order = 'date' if group_by == 'date' else 'total_tokens DESC'
+        
+        self.flush()
+        where = 'date >= ? AND date <= ?'
+        params = [start_date, end_date]
+        if user_id is not None:
+            where += ' AND user_id = ?'
+            params.append(user_id)
+        
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(f'''
+            SELECT {column}, SUM(calls) AS calls, SUM(prompt_tokens) AS prompt_tokens,
+                   SUM(completion_tokens) AS completion_tokens,
+                   SUM(prompt_tokens + completion_tokens) AS total_tokens, ROUND(SUM(cost), 4) AS cost
+            FROM token_usage WHERE {where}
+            GROUP BY {column} ORDER BY {order} LIMIT ?
+        ''', params + [limit]).fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+    
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending_keys'] = len(self._pending)
+        return stats
+
+
+_usage_tracker = None
+_usage_tracker_lock = threading.Lock()
+
+
+def get_usage_tracker() -> UsageTracker:
+    """获取用量统计单例，进程退出时写入剩余数据"""
+    global _usage_tracker
+    if _usage_tracker is None:
+        with _usage_tracker_lock:
+            if _usage_tracker is None:
+                _usage_tracker = UsageTracker()
+                atexit.register(_usage_tracker.flush)
+    return _usage_tracker
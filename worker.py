@@ -0,0 +1,86 @@
+"""
+后台任务worker
+执行 /api/tasks 及 async=true 提交的LLM分析任务，与Web服务器分开运行：
+
+    python worker.py                       # 2个进程 x 4个线程
+    python worker.py --processes 4 --threads 8
+"""
+import argparse
+import multiprocessing
+import signal
+import threading
+import time
+
+from config import JOB_LEASE_TIMEOUT, JOB_RESULT_TTL
+
+# 定期维护间隔（秒）
+MAINTENANCE_INTERVAL = 60
+
+
+def run_worker_process(threads: int, maintenance: bool):
+    """单个worker进程：多个线程并发领取任务（任务大部分时间在等待provider响应）"""
+    from app import ANALYSIS_TASKS, run_analysis_task
+    from utils.job_queue import JobWorker, get_job_backend
+    from utils.deadline import deadline_scope
+    from utils.usage_tracker import user_scope
+    
+    def make_handler(task):
+        def handler(params):
+            # 租约到期后任务会被其他worker重新领取，此前必须结束
+            with deadline_scope(JOB_LEASE_TIMEOUT - MAINTENANCE_INTERVAL), user_scope(params.get('user_id')):
+                return run_analysis_task(task, params, sla=None)
+        return handler
+    
+    handlers = {task: make_handler(task) for task in ANALYSIS_TASKS}
+    backend = get_job_backend()
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    
+    workers = [
+        threading.Thread(target=JobWorker(handlers, backend).run_forever, args=(stop_event,), daemon=True)
+        for _ in range(threads)
+    ]
+    for t in workers:
+        t.start()
+    
+    try:
+        while not stop_event.is_set():
+            if maintenance:
+                requeued = backend.requeue_stale(JOB_LEASE_TIMEOUT)
+                purged = backend.purge(JOB_RESULT_TTL)
+                if requeued or purged:
+                    print(f"Job maintenance: requeued {requeued}, purged {purged}")
+            stop_event.wait(MAINTENANCE_INTERVAL)
+    except KeyboardInterrupt:
+        stop_event.set()
+    
+    for t in workers:
+        t.join(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='后台LLM任务worker')
+    parser.add_argument('--processes', type=int, default=2, help='worker进程数')
+    parser.add_argument('--threads', type=int, default=4, help='每个进程的并发线程数')
+    args = parser.parse_args()
+    
+    print(f"Starting {args.processes} worker process(es) x {args.threads} thread(s)")
+    processes = [
+        multiprocessing.Process(target=run_worker_process, args=(args.threads, i == 0))
+        for i in range(max(1, args.processes))
+    ]
+    for p in processes:
+        p.start()
+    
+    try:
+        while any(p.is_alive() for p in processes):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for p in processes:
+            p.terminate()
+    for p in processes:
+        p.join()
+
+
+if __name__ == '__main__':
+    main()